@@ -0,0 +1,245 @@
+import json
+import os
+import time
+
+
+class BatteryEstimator:
+    '''
+    Learns how fast the GoPro battery drains while recording
+
+    Fits the discharge rate of the battery for every combination of camera
+    model, resolution, frame rate, and field of view from the battery
+    percentages polled while recording. Each pair of polls taken during the
+    same recording gives a drop in battery over an elapsed time, and the rate
+    is fit to those drops with an online least squares regression through the
+    origin. Older drops are slowly forgotten so the rates follow the battery as
+    it ages or as the weather changes. The learned rates are saved to a file
+    at the end of each recording and when the estimator is closed, so they
+    carry over between runs of the app without writing the file on every
+    poll.
+
+    Attributes
+    ----------
+    FORGETTING_FACTOR: float
+        How much weight the previous drops keep each time a new drop is added
+    MIN_SAMPLES: int
+        The number of drops needed before a learned rate is trusted
+    MIN_MINUTES: float
+        The minutes of recording needed before a learned rate is trusted
+    MIN_INTERVAL: float
+        The fewest seconds between two polls for them to count as a drop
+    path: str
+        The file the learned rates are saved to
+    fallback_table: Dict[Dict[int]]
+        Battery life times in minutes for a full battery to use when there is
+        not enough data for a setting combination
+    rates: Dict[str, Dict[float]]
+        The regression sums for each setting combination
+
+    Methods
+    -------
+    __init__(fallback_table, path)
+        Loads any previously learned rates
+    key(model, resolution, fps, fov)
+        Makes the name a setting combination is saved under
+    observe(key, battery_percent, timestamp)
+        Adds a polled battery percentage taken while recording
+    end_segment()
+        Marks the end of a recording so idle time is not learned, and saves
+        what it learned
+    rate(key)
+        The learned discharge rate for a setting combination
+    estimate(key, battery_percent)
+        The minutes of recording left on the battery
+    save()
+        Saves the learned rates to a file
+    close()
+        Saves the rates learned since the last save
+
+    See Also
+    --------
+    BatteryIndicator
+
+    Notes
+    -----
+    Battery percentages from the GoPro are whole numbers, so short drops are
+    not used until enough time has passed for the battery to fall.
+    '''
+    FORGETTING_FACTOR = 0.98
+    MIN_SAMPLES = 3
+    MIN_MINUTES = 5.0
+    MIN_INTERVAL = 30.0
+
+    def __init__(self, fallback_table: dict,
+                 path: str = "../State/battery_rates.json") -> None:
+        '''
+        Loads any previously learned rates
+
+        Parameters
+        ----------
+        fallback_table: Dict[Dict[int]]
+            Battery life times in minutes by resolution and then frame rate
+        path: str, default="../State/battery_rates.json"
+            The file to load and save the learned rates
+        '''
+        self.path = path
+        self.fallback_table = fallback_table
+        self.rates = {}
+        self._last_sample = None
+        self._unsaved = False
+        try:
+            with open(self.path, "r") as rate_file:
+                self.rates = json.load(rate_file)
+        except (OSError, ValueError):
+            self.rates = {}
+
+    @staticmethod
+    def key(model: str, resolution: str, fps: str, fov: str) -> str:
+        '''
+        Makes the name a setting combination is saved under
+
+        Parameters
+        ----------
+        model: str
+            The model name of the GoPro
+        resolution: str
+            The selected resolution
+        fps: str
+            The selected frame rate
+        fov: str
+            The selected field of view
+
+        Returns
+        -------
+        str
+            The setting combination joined by "|"
+        '''
+        return "|".join([model, resolution, fps, fov])
+
+    def observe(self, key: str, battery_percent: float,
+                timestamp: float | None = None) -> None:
+        '''
+        Adds a polled battery percentage taken while recording
+
+        Compares the poll to the last poll of the same recording and adds the
+        drop in battery to the fit for the setting combination. If the setting
+        combination changed, this poll starts a new segment.
+
+        Parameters
+        ----------
+        key: str
+            The setting combination from key()
+        battery_percent: float
+            The battery percentage from 0 to 1
+        timestamp: float, optional
+            The monotonic time of the poll in seconds. Defaults to now.
+        '''
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self._last_sample is None or self._last_sample[0] != key:
+            self._last_sample = (key, timestamp, battery_percent)
+            return
+
+        _, last_time, last_percent = self._last_sample
+        elapsed = timestamp - last_time
+        if elapsed < self.MIN_INTERVAL:
+            return
+        self._last_sample = (key, timestamp, battery_percent)
+        drop = last_percent - battery_percent
+        # A rise in battery means the GoPro was charging, which says nothing
+        # about how fast it drains
+        if drop < 0:
+            return
+
+        minutes = elapsed / 60
+        fit = self.rates.setdefault(
+            key, {"sxx": 0.0, "sxy": 0.0, "minutes": 0.0, "samples": 0})
+        fit["sxx"] = self.FORGETTING_FACTOR * fit["sxx"] + minutes ** 2
+        fit["sxy"] = self.FORGETTING_FACTOR * fit["sxy"] + minutes * drop
+        fit["minutes"] = self.FORGETTING_FACTOR * fit["minutes"] + minutes
+        fit["samples"] += 1
+        self._unsaved = True
+
+    def end_segment(self) -> None:
+        '''
+        Marks the end of a recording so idle time is not learned, and saves
+        what it learned
+        '''
+        self._last_sample = None
+        self.close()
+
+    def close(self) -> None:
+        '''
+        Saves the rates learned since the last save
+        '''
+        if self._unsaved:
+            self.save()
+
+    def rate(self, key: str) -> float | None:
+        '''
+        The learned discharge rate for a setting combination
+
+        Parameters
+        ----------
+        key: str
+            The setting combination from key()
+
+        Returns
+        -------
+        float or None
+            The fraction of the battery used per minute of recording or None
+            if there is not enough data to trust the fit
+        '''
+        fit = self.rates.get(key)
+        if fit is None or fit["samples"] < self.MIN_SAMPLES or\
+                fit["minutes"] < self.MIN_MINUTES or fit["sxy"] <= 0:
+            return None
+        return fit["sxy"] / fit["sxx"]
+
+    def estimate(self, key: str, battery_percent: float) -> float | None:
+        '''
+        The minutes of recording left on the battery
+
+        Uses the learned discharge rate when there is enough data for the
+        setting combination and the fallback table otherwise.
+
+        Parameters
+        ----------
+        key: str
+            The setting combination from key()
+        battery_percent: float
+            The battery percentage from 0 to 1
+
+        Returns
+        -------
+        float or None
+            The minutes of recording left or None if the setting combination
+            has neither a learned rate nor a value in the fallback table
+        '''
+        rate = self.rate(key)
+        if rate is not None:
+            return battery_percent / rate
+
+        _, resolution, fps, _ = key.split("|")
+        try:
+            return self.fallback_table[resolution][fps] * battery_percent
+        except KeyError:
+            return None
+
+    def save(self) -> None:
+        '''
+        Saves the learned rates to a file
+
+        Notes
+        -----
+        The rates are written to a temporary file first so a crash while
+        saving does not lose the rates that were already learned.
+        '''
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as rate_file:
+            json.dump(self.rates, rate_file, indent=4)
+        os.replace(temporary_path, self.path)
+        self._unsaved = False
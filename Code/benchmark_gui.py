@@ -0,0 +1,345 @@
+import argparse
+import contextlib
+import datetime as dt
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+from instrumentation import append_csv_row
+
+
+# Simulated GoPro that answers at once, so only the GUI is timed
+SIMULATOR_OPTIONS = {"ble_latency": 0.0, "http_latency": 0.0,
+                     "connect_latency": 0.0, "jitter": 0.0,
+                     "failure_rate": 0.0, "seed": 0}
+# The CustomTkinter methods counted, each one a redraw or widget change
+COUNTED_METHODS = {"_draw": "draws", "configure": "configures",
+                   "_add_menu_commands": "menu_rebuilds"}
+# The committed baseline the results are compared with
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "Benchmarks", "gui_benchmark_baseline.json")
+
+
+class RedrawCounter:
+    '''
+    Counts the redraws and widget changes of a window
+
+    Every CustomTkinter widget in the window gets its redraw, configure, and
+    dropdown menu rebuild methods replaced with ones that count their calls.
+    Calls from inside CustomTkinter count too, so a configure that redraws
+    the widget counts as one configure and one draw.
+
+    Attributes
+    ----------
+    counts: Dict[str, int]
+        The number of calls of each counted method since the last reset
+
+    Methods
+    -------
+    __init__(root)
+        Starts counting the calls of every widget in the window
+    reset()
+        Sets every count back to 0
+    '''
+    def __init__(self, root) -> None:
+        '''
+        Starts counting the calls of every widget in the window
+
+        Parameters
+        ----------
+        root: CTk
+            The window
+        '''
+        self.counts = dict.fromkeys(COUNTED_METHODS.values(), 0)
+        widgets = [root]
+        while widgets:
+            widget = widgets.pop()
+            widgets.extend(widget.winfo_children())
+            if not any(cls.__module__.startswith("customtkinter")
+                       for cls in type(widget).__mro__):
+                # A plain Tk widget inside a CustomTkinter one
+                continue
+            for method, name in COUNTED_METHODS.items():
+                if hasattr(widget, method):
+                    setattr(widget, method,
+                            self._counted(getattr(widget, method), name))
+
+    def reset(self) -> None:
+        '''
+        Sets every count back to 0
+        '''
+        for name in self.counts:
+            self.counts[name] = 0
+
+    def _counted(self, function, name: str):
+        '''
+        A function that counts its calls before calling function
+        '''
+        def counted(*args, **kwargs):
+            self.counts[name] += 1
+            return function(*args, **kwargs)
+        return counted
+
+
+@contextlib.contextmanager
+def virtual_display():
+    '''
+    Runs the code inside on a virtual X display if there is no display
+
+    Starts Xvfb on a free display number and stops it afterwards. If
+    DISPLAY is already set, that display is used instead.
+
+    Raises
+    ------
+    RuntimeError
+        If there is no display and Xvfb is not installed or did not start
+    '''
+    if os.environ.get("DISPLAY"):
+        yield
+        return
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        raise RuntimeError("No display is set and Xvfb is not installed")
+    number = 99
+    while os.path.exists(f"/tmp/.X11-unix/X{number}"):
+        number += 1
+    server = subprocess.Popen(
+        [xvfb, f":{number}", "-screen", "0", "1280x1024x24", "-nolisten",
+         "tcp"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 10
+        while not os.path.exists(f"/tmp/.X11-unix/X{number}"):
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("Xvfb did not start")
+            time.sleep(0.05)
+        os.environ["DISPLAY"] = f":{number}"
+        yield
+    finally:
+        os.environ.pop("DISPLAY", None)
+        server.terminate()
+        server.wait()
+
+
+def make_app():
+    '''
+    Makes the app connected to a simulated GoPro that answers at once
+
+    Returns
+    -------
+    GoProApp
+        The drawn app with its controls enabled
+    '''
+    import recording_app
+    app = recording_app.GoProApp(SIMULATOR_OPTIONS)
+    app.session.connect()
+    app.load_capabilities(app.session.camera_model)
+    app.set_controls_state("normal")
+    app.update()
+    return app
+
+
+def scenarios(app) -> dict:
+    '''
+    The GUI update paths to time, each a function called once per iteration
+
+    Parameters
+    ----------
+    app: GoProApp
+        The connected app
+
+    Returns
+    -------
+    Dict[str, Callable[[int], None]]
+        Each path by name, called with the iteration number
+    '''
+    capabilities = app.session.capabilities
+    indicator = app.battery_indicator
+    resolutions = capabilities.resolutions
+    model = app.session.camera_model
+    resolution = app.resolution_dropdown.get()
+    fps = app.frame_rate_dropdown.get()
+    fov = app.fov_dropdown.get()
+
+    def battery_idle(iteration: int) -> None:
+        # A poll that reads the same values as the last one
+        indicator.update(0.8, resolution, fps, 3600, fov, model)
+
+    def battery_changing(iteration: int) -> None:
+        # A battery draining through every color with the card filling up
+        indicator.update(1 - iteration % 100 / 100, resolution, fps,
+                         3600 - iteration, fov, model)
+
+    def frame_rate_values(iteration: int) -> None:
+        app.frame_rate_dropdown.configure(values=capabilities.frame_rates(
+            resolutions[iteration % len(resolutions)]))
+
+    def set_resolution(iteration: int) -> None:
+        app.set_resolution(resolutions[iteration % len(resolutions)])
+
+    def poll_battery(iteration: int) -> None:
+        app.poll_battery_callback()
+
+    return {
+        "battery_update.idle": battery_idle,
+        "battery_update.changing": battery_changing,
+        "frame_rate_dropdown.values": frame_rate_values,
+        "set_resolution": set_resolution,
+        "poll_battery_callback": poll_battery,
+    }
+
+
+def measure(iterations: int, warmup: int = 10) -> dict:
+    '''
+    Times every GUI update path and counts its redraws
+
+    Each call is timed together with drawing its changes, and the redraws
+    are counted over the timed calls.
+
+    Parameters
+    ----------
+    iterations: int
+        The number of timed calls of each path
+    warmup: int, default=10
+        The number of calls of each path before timing it
+
+    Returns
+    -------
+    Dict[str, dict]
+        The median and p95 microseconds per call and the draws,
+        configures, and menu rebuilds per call of each path by name
+    '''
+    app = make_app()
+    try:
+        counter = RedrawCounter(app)
+        results = {}
+        for name, path in scenarios(app).items():
+            for iteration in range(warmup):
+                path(iteration)
+                app.update_idletasks()
+            counter.reset()
+            times = []
+            for iteration in range(iterations):
+                start = time.perf_counter()
+                path(iteration)
+                # Draw the changes, which is where most of the time goes
+                app.update_idletasks()
+                times.append((time.perf_counter() - start) * 1e6)
+            times.sort()
+            results[name] = {
+                "median_us": statistics.median(times),
+                "p95_us": times[int(len(times) * 0.95) - 1],
+                **{count: value / iterations
+                   for count, value in counter.counts.items()},
+            }
+        return results
+    finally:
+        app.loop_monitor.stop()
+        app.session.close()
+        app.destroy()
+
+
+def record(results: dict, path: str) -> None:
+    '''
+    Adds the results to the CSV file that tracks the GUI benchmark
+
+    Parameters
+    ----------
+    results: Dict[str, dict]
+        The results from measure
+    path: str
+        The CSV file to add a row for each path to
+    '''
+    header = ["timestamp", "path"] + list(next(iter(results.values())))
+    timestamp = dt.datetime.now().isoformat()
+    for name, result in results.items():
+        append_csv_row(path, header,
+                       [timestamp, name] + list(result.values()))
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    '''
+    The ways the results are worse than a baseline
+
+    The redraw counts do not change between runs, so any increase is a
+    regression. The times do, so only a median slower than the tolerance
+    allows is one, and only if the baseline has a time for the path. A path
+    that is not in the baseline is a failure too, since it would otherwise
+    never be checked.
+
+    Parameters
+    ----------
+    results: Dict[str, dict]
+        The results from measure
+    baseline: Dict[str, dict]
+        Earlier results from measure
+    tolerance: float
+        The fraction the median time can be slower than the baseline by
+
+    Returns
+    -------
+    List[str]
+        A description of each regression
+    '''
+    failures = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            failures.append(f"{name} is not in the baseline, run with "
+                            "--save-baseline to add it")
+            continue
+        for count in COUNTED_METHODS.values():
+            if result[count] > before.get(count, result[count]):
+                failures.append(f"{name} {count} per call went from "
+                                f"{before[count]:g} to {result[count]:g}")
+        if "median_us" in before and\
+                result["median_us"] > before["median_us"] * (1 + tolerance):
+            failures.append(f"{name} took {result['median_us']:.0f} us, "
+                            f"up from {before['median_us']:.0f} us")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time the GUI update paths and count their redraws "
+        "with a simulated GoPro. Starts Xvfb if there is no display.")
+    parser.add_argument("--iterations", type=int, default=200,
+                        help="number of timed calls of each path")
+    parser.add_argument("--baseline", default=BASELINE_PATH,
+                        help="JSON file of earlier results to compare with")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="save these results as the baseline, which is "
+                        "needed if there is no baseline yet")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="fraction a median time can be slower than the "
+                        "baseline before failing")
+    parser.add_argument("--output", default="../Metrics/gui_benchmark.csv",
+                        help="CSV file to track the results in")
+    arguments = parser.parse_args()
+
+    with virtual_display():
+        results = measure(arguments.iterations)
+    record(results, arguments.output)
+    for name, result in results.items():
+        print(f"{name}: {result['median_us']:.0f} us median, "
+              f"{result['p95_us']:.0f} us p95, "
+              f"{result['draws']:g} draws, "
+              f"{result['configures']:g} configures, "
+              f"{result['menu_rebuilds']:g} menu rebuilds per call")
+
+    if os.path.exists(arguments.baseline):
+        with open(arguments.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+        failures = regressions(results, baseline, arguments.tolerance)
+    else:
+        failures = [f"There is no baseline at {arguments.baseline}, run "
+                    "with --save-baseline to save one"]
+    if arguments.save_baseline:
+        with open(arguments.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=4)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures and not arguments.save_baseline else 0)
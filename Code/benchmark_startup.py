@@ -0,0 +1,138 @@
+import argparse
+import datetime as dt
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from instrumentation import append_csv_row
+
+
+def measure_child() -> None:
+    '''
+    Measures one cold start of the app in this process
+
+    Times importing recording_app, making the GoProApp window, and drawing it
+    for the first time, then prints the times as JSON and closes the app.
+    '''
+    start = time.perf_counter()
+    import recording_app
+    imported = time.perf_counter()
+    app = recording_app.GoProApp()
+    constructed = time.perf_counter()
+    # Process every pending draw so the window is fully shown
+    app.update()
+    painted = time.perf_counter()
+    app.destroy()
+    print(json.dumps({
+        "import_ms": (imported - start) * 1000,
+        "construct_ms": (constructed - imported) * 1000,
+        "first_paint_ms": (painted - start) * 1000,
+        "sdk_imported": "open_gopro" in sys.modules,
+    }))
+
+
+def measure(repeat: int) -> list:
+    '''
+    Measures several cold starts, each in a new Python process
+
+    Parameters
+    ----------
+    repeat: int
+        The number of cold starts
+
+    Returns
+    -------
+    List[dict]
+        The times of each cold start in milliseconds, including the time for
+        the whole process to start, draw the window, and exit
+    '''
+    runs = []
+    code_directory = os.path.dirname(os.path.abspath(__file__))
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child"],
+            cwd=code_directory, capture_output=True, text=True, check=True)
+        run = json.loads(output.stdout.strip().splitlines()[-1])
+        run["process_ms"] = (time.perf_counter() - start) * 1000
+        runs.append(run)
+    return runs
+
+
+def summarize(runs: list) -> dict:
+    '''
+    The median of each time over the cold starts
+
+    Parameters
+    ----------
+    runs: List[dict]
+        The times of each cold start
+
+    Returns
+    -------
+    dict
+        The median times in milliseconds and if any run imported the SDK
+    '''
+    summary = {key: statistics.median(run[key] for run in runs)
+               for key in ("import_ms", "construct_ms", "first_paint_ms",
+                           "process_ms")}
+    summary["sdk_imported"] = any(run["sdk_imported"] for run in runs)
+    return summary
+
+
+def record(summary: dict, path: str) -> None:
+    '''
+    Adds a summary to the CSV file that tracks startup times
+
+    Parameters
+    ----------
+    summary: dict
+        The median times from summarize
+    path: str
+        The CSV file to add a row to
+    '''
+    append_csv_row(path, ["timestamp"] + list(summary),
+                   [dt.datetime.now().isoformat()] + list(summary.values()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time how long the app takes to import and first draw "
+        "its window. Needs a display, such as Xvfb on a headless machine.")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of cold starts to take the median of")
+    parser.add_argument("--max-import-ms", type=float, default=None,
+                        help="fail if the median import time is above this")
+    parser.add_argument("--max-paint-ms", type=float, default=None,
+                        help="fail if the median first paint is above this")
+    parser.add_argument("--output", default="../Metrics/startup.csv",
+                        help="CSV file to track the results in")
+    parser.add_argument("--child", action="store_true",
+                        help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.child:
+        measure_child()
+        sys.exit(0)
+
+    summary = summarize(measure(arguments.repeat))
+    record(summary, arguments.output)
+    for key, value in summary.items():
+        print(f"{key}: {value:.1f}" if isinstance(value, float)
+              else f"{key}: {value}")
+
+    failures = []
+    if summary["sdk_imported"]:
+        failures.append("the Open GoPro SDK was imported at startup")
+    if arguments.max_import_ms is not None and\
+            summary["import_ms"] > arguments.max_import_ms:
+        failures.append(f"import took {summary['import_ms']:.1f} ms")
+    if arguments.max_paint_ms is not None and\
+            summary["first_paint_ms"] > arguments.max_paint_ms:
+        failures.append(f"first paint took {summary['first_paint_ms']:.1f} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
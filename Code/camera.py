@@ -0,0 +1,192 @@
+import argparse
+import functools
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from instrumentation import CommandMetrics, InstrumentedGoPro
+
+
+# The address of a GoPro's wifi access point
+CAMERA_URL = "http://10.5.5.9:8080"
+
+
+@functools.cache
+def open_gopro_sdk():
+    '''
+    Imports the Open GoPro SDK the first time it is needed
+
+    The SDK pulls in the bluetooth and wifi libraries, which take a long time
+    to import, so it is only imported once a GoPro is connected to instead of
+    when the app starts.
+
+    Returns
+    -------
+    module
+        The open_gopro module
+    '''
+    import open_gopro
+    return open_gopro
+
+
+def gopro_params(simulated: bool = False):
+    '''
+    The Open GoPro parameters
+
+    Parameters
+    ----------
+    simulated: bool, default=False
+        If the parameters are for a simulated GoPro, which only needs their
+        names, so the SDK is not imported
+
+    Returns
+    -------
+    module or SimulatedParams
+        open_gopro.Params with the enums of every setting and command value
+
+    See Also
+    --------
+    open_gopro_sdk
+    '''
+    if simulated:
+        from gopro_simulator import SimulatedParams
+        return SimulatedParams()
+    return open_gopro_sdk().Params
+
+
+def make_gopro(target: str | None, metrics: CommandMetrics,
+               simulator_options: dict | None = None,
+               enable_wifi: bool = True) -> InstrumentedGoPro:
+    '''
+    Makes a GoPro object with its commands timed
+
+    Parameters
+    ----------
+    target: str or None
+        The name of the GoPro, such as "GoPro 5990", or None for the first
+        available GoPro
+    metrics: CommandMetrics
+        Where the command latencies are recorded
+    simulator_options: dict, optional
+        Keyword arguments for a SimulatedGoPro. If given, a simulated GoPro
+        is made instead of a WirelessGoPro and the SDK is not imported.
+    enable_wifi: bool, default=True
+        If the GoPro should also connect over wifi. Only one GoPro can use
+        the computer's wifi at a time, so GoPros in a fleet only use
+        bluetooth.
+
+    Returns
+    -------
+    InstrumentedGoPro
+        The unconnected GoPro
+    '''
+    if simulator_options is None:
+        gopro = open_gopro_sdk().WirelessGoPro(target=target,
+                                               enable_wifi=enable_wifi)
+    else:
+        from gopro_simulator import SimulatedGoPro
+        gopro = SimulatedGoPro(target=target, enable_wifi=enable_wifi,
+                               **simulator_options)
+    return InstrumentedGoPro(gopro, metrics)
+
+
+def delete_media(path: str, url: str = CAMERA_URL,
+                 timeout: float = 10.0) -> None:
+    '''
+    Deletes a file from the GoPro's SD card over wifi
+
+    The Open GoPro SDK this app is pinned to has no delete command, so the
+    GoPro's gopro/media/delete/file HTTP endpoint is called directly.
+
+    Parameters
+    ----------
+    path: str
+        The folder and name of the file on the SD card, such as
+        "100GOPRO/GX010001.MP4"
+    url: str, default=CAMERA_URL
+        The base URL of the GoPro's wifi access point
+    timeout: float, default=10.0
+        The most seconds to wait for the GoPro to answer
+
+    Raises
+    ------
+    RuntimeError
+        If the GoPro did not delete the file
+
+    See Also
+    --------
+    CameraSession.delete_media
+    '''
+    query = urllib.parse.urlencode({"path": path})
+    try:
+        with urllib.request.urlopen(
+                f"{url}/gopro/media/delete/file?{query}",
+                timeout=timeout) as response:
+            response.read()
+    except (urllib.error.URLError, OSError) as error:
+        raise RuntimeError(f"The GoPro did not delete {path}: {error}")\
+            from error
+
+
+def add_simulator_arguments(parser: argparse.ArgumentParser) -> None:
+    '''
+    Adds the options to control a simulated GoPro to a command line parser
+
+    Parameters
+    ----------
+    parser: ArgumentParser
+        The parser to add the options to
+
+    See Also
+    --------
+    simulator_options_from
+    '''
+    parser.add_argument("--simulate", action="store_true",
+                        help="control a simulated GoPro instead of a real one")
+    parser.add_argument("--ble-latency", type=float, default=0.05,
+                        help="seconds each simulated bluetooth command takes")
+    parser.add_argument("--http-latency", type=float, default=0.02,
+                        help="seconds each simulated wifi command takes")
+    parser.add_argument("--idle-timeout", type=float, default=0.0,
+                        help="seconds without a command before the simulated "
+                        "GoPro saves power, 0 to stay awake")
+    parser.add_argument("--wake-latency", type=float, default=0.5,
+                        help="extra seconds the first simulated command "
+                        "after saving power takes")
+    parser.add_argument("--jitter", type=float, default=0.01,
+                        help="most seconds a simulated latency changes by")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="chance a simulated command is rejected")
+    parser.add_argument("--media-count", type=int, default=0,
+                        help="videos already on the simulated SD card")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed to make the simulated GoPro repeatable")
+
+
+def simulator_options_from(arguments: argparse.Namespace) -> dict | None:
+    '''
+    The simulated GoPro options from parsed command line arguments
+
+    Parameters
+    ----------
+    arguments: Namespace
+        The arguments parsed with the options from add_simulator_arguments
+
+    Returns
+    -------
+    dict or None
+        Keyword arguments for a SimulatedGoPro, or None if --simulate was
+        not given
+    '''
+    if not arguments.simulate:
+        return None
+    return {
+        "ble_latency": arguments.ble_latency,
+        "http_latency": arguments.http_latency,
+        "idle_timeout": arguments.idle_timeout,
+        "wake_latency": arguments.wake_latency,
+        "jitter": arguments.jitter,
+        "failure_rate": arguments.failure_rate,
+        "media_count": arguments.media_count,
+        "seed": arguments.seed,
+    }
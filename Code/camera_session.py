@@ -0,0 +1,1178 @@
+import datetime as dt
+import os
+import threading
+import time
+import uuid
+
+from capabilities import CapabilityLibrary
+from clock_sync import ClockSync
+from instrumentation import CommandMetrics, InstrumentedGoPro
+from camera import delete_media, gopro_params, make_gopro
+from command_gate import CommandGate
+from connection_cache import ConnectionCache
+from event_journal import EventJournal
+from fleet import CameraFleet
+from hilight_index import HilightIndex
+from offload import DiskBandwidthBalancer, OffloadScheduler, load_endpoints
+from photo_pipeline import PhotoPipeline
+
+
+class CameraSession:
+    '''
+    Everything needed to control a GoPro or a fleet of GoPros without a GUI
+
+    Holds the connection, the video settings, and the saved file records so
+    the desktop app, the headless command line, and the control server all
+    send the same commands the same way. Nothing here imports tkinter, so
+    it can run on a machine without a display.
+
+    Attributes
+    ----------
+    SETTING_PARAMETERS: Dict[str, Tuple[str, str]]
+        The ble_setting name and Params enum of each setting type
+    ALL_GOPROS: str
+        The GoPro name that connects to every GoPro in FLEET at once
+    FLEET: List[str]
+        The names of the GoPros controlled together
+    FIRST_AVAILABLE: str
+        The GoPro name that connects to the first available GoPro
+    OFFLOAD_DISK_LIMIT: float
+        The most bytes per second written to the disk while saving files from
+        every GoPro in the fleet, which is shared evenly between them
+    MEDIA_FOLDER: str
+        The folder on the SD card of a file whose folder is not in the media
+        list
+    session_id: str
+        A random ID of the session, used to match its events, metrics, and
+        profiles
+    gopro_name: str or None
+        The name of the GoPro to connect to, ALL_GOPROS for the fleet, or
+        None for the first available GoPro
+    simulator_options: dict or None
+        The settings of the simulated GoPro to use instead of a real one
+    command_metrics: CommandMetrics
+        The latency, error, and retry counts of every GoPro command
+    connection_cache: ConnectionCache
+        The saved information of every GoPro connected to before
+    gopro: InstrumentedGoPro, CameraFleet, or None
+        The GoPro or fleet being controlled. It is made when the connection
+        is opened.
+    gopros: Dict[str or None, InstrumentedGoPro or CameraFleet]
+        Every GoPro object made so far by GoPro name so they can be reused
+    capability_library: CapabilityLibrary
+        Loads the video settings possible on each GoPro model
+    capabilities: CameraCapabilities
+        The video settings possible on the connected GoPro model
+    camera_model: str
+        The model name of the connected GoPro
+    applied_settings: Dict[str, str]
+        The last video settings the GoPro accepted by setting type
+    desired_settings: Dict[str, str]
+        The video settings that were asked for by setting type, which are
+        sent again after reconnecting
+    recording: bool
+        If the GoPro is recording, as of the last recording command or
+        status check
+    recording_lock: Lock
+        Held while a recording is started or stopped, since recording is only
+        updated once the GoPro answers. Background threads such as the
+        ReadinessManager only send commands when they can take it.
+    armed: bool
+        If pre_arm found the GoPro ready in video mode and nothing has been
+        sent since that would change it, so starting a recording only sends
+        the shutter
+    command_gate: CommandGate
+        Holds recording and photo commands until the GoPro is ready
+    photo_pipeline: PhotoPipeline
+        Takes queued photos back to back
+    hilight_index: HilightIndex
+        The HiLight offsets of each recording, attached to its video when it
+        is saved
+    clock_sync: ClockSync
+        Sets the GoPro's clock and measures its offset
+    clock_offset: float or None
+        The seconds the creation times of the GoPro's media are ahead of
+        time.time(), or None until the clock is synced
+    journal: EventJournal
+        The record of every connection, setting, recording, photo, save, and
+        failed command of the session
+    data_directory: str
+        The folder files are saved into
+    previously_saved_files: List[str]
+        The name of every file already saved in the data directory
+    previously_saved_camera_files: Set[Tuple[str, str]]
+        The folder and name of every previously saved file, used to find the
+        files already saved from each GoPro in the fleet by serial number
+    offload_endpoints: Dict[str, CameraEndpoint]
+        Where to download the files of each GoPro in the fleet from
+    media_folders: Dict[Tuple[str or None, str], str]
+        The folder on the SD card of each file seen in a media list, by the
+        serial number of its fleet GoPro, or None for the selected GoPro,
+        and its name
+    delete_media: Callable[[str], None]
+        Deletes a file from the selected GoPro's SD card by its folder and
+        name, such as "100GOPRO/GX010001.MP4", and raises RuntimeError if
+        it was not deleted. camera.delete_media for a real GoPro, since the
+        SDK cannot delete files, or the simulated GoPro's stand-in for it.
+
+    Methods
+    -------
+    __init__(simulator_options, command_metrics, data_directory)
+        Sets up the session without connecting
+    select(name)
+        Selects the GoPro to connect to
+    is_fleet()
+        Check if the session controls the fleet instead of one GoPro
+    new_gopro(target)
+        Makes a GoPro object for a GoPro name
+    connect()
+        Connects to the selected GoPro or fleet
+    close()
+        Disconnects from the GoPro
+    is_connected()
+        Check if the GoPro is connected without sending a command
+    reconnect()
+        Try once to reconnect to the GoPro and restore its settings
+    sleep()
+        Puts the GoPro to sleep to save battery
+    keep_alive()
+        Tells the GoPro not to save power between takes
+    pre_arm()
+        Gets the GoPro ready so the next recording starts right away
+    sync_clock(set_time)
+        Sets the GoPro's clock and measures how far it is from the computer's
+    capture_time(created)
+        The computer's time a file was started from its creation time
+    load_capabilities(model)
+        Loads the video settings possible on a GoPro model
+    resolve_settings(resolution, fps, fov)
+        Picks the closest valid video settings and remembers them
+    send_setting(setting_type, label)
+        Sends one video setting to the GoPro if it has changed
+    apply_settings(resolution, fps, fov)
+        Sends a valid combination of video settings to the GoPro
+    start_recording()
+        Starts recording video
+    stop_recording()
+        Stops recording video
+    sync_recording()
+        Check with the GoPro if it is recording
+    take_photo(count)
+        Take images with the current settings
+    tag_hilight(at)
+        Marks the current moment of the recording as a HiLight
+    read_battery_percent()
+        Poll the GoPro for its battery percentage
+    read_card_seconds()
+        Poll the GoPro for the seconds of video that fit on its SD card
+    status()
+        The connection, settings, battery, and SD card status
+    save_directory(group_name, add_timestamp)
+        Makes the folder to save files into
+    offload_files(local_directory, timestamp)
+        Download every new file from the GoPro
+    offload_fleet(local_directory, timestamp)
+        Download every new file from every GoPro in the fleet at once
+    delete_files(file_names, serial)
+        Deletes saved files from the GoPro's SD card
+    card_files()
+        The files on the SD card of every GoPro
+    is_saved(serial, file_name)
+        Checks if a file from a GoPro has been saved
+    can_offload()
+        Check if files can be saved from the selected GoPro
+
+    See Also
+    --------
+    GoProApp
+    '''
+    SETTING_PARAMETERS = {
+        "resolution": ("resolution", "Resolution"),
+        "fps": ("fps", "FPS"),
+        "fov": ("video_field_of_view", "VideoFOV"),
+    }
+    ALL_GOPROS = "All GoPros"
+    FLEET = ["GoPro 5990", "GoPro 8194"]
+    FIRST_AVAILABLE = "Connect to First Available"
+    OFFLOAD_DISK_LIMIT = 100e6
+    MEDIA_FOLDER = "100GOPRO"
+
+    def __init__(self, simulator_options: dict | None = None,
+                 command_metrics: CommandMetrics | None = None,
+                 data_directory: str = "../Data") -> None:
+        '''
+        Sets up the session without connecting
+
+        Parameters
+        ----------
+        simulator_options: dict, optional
+            Keyword arguments for a SimulatedGoPro. If given, a simulated
+            GoPro is controlled instead of a real one.
+        command_metrics: CommandMetrics, optional
+            Where the command latencies are recorded. Defaults to new metrics.
+        data_directory: str, default="../Data"
+            The folder files are saved into
+        '''
+        self.session_id = uuid.uuid4().hex[:12]
+        self.gopro_name = "GoPro 5990"
+        self.simulator_options = simulator_options
+        self.command_metrics = command_metrics or CommandMetrics()
+        self.connection_cache = ConnectionCache()
+        # The GoPro and the SDK are only loaded when connecting so startup is
+        # quick
+        self.gopro = None
+        self.gopros = {}
+        self.capability_library = CapabilityLibrary()
+        self.capabilities = self.capability_library.get(
+            CapabilityLibrary.DEFAULT_MODEL)
+        self.camera_model = self.capabilities.model
+        self.applied_settings = {}
+        self.desired_settings = {}
+        self.recording = False
+        self.recording_lock = threading.Lock()
+        self.armed = False
+        self.command_gate = CommandGate(self.command_metrics)
+        self.photo_pipeline = PhotoPipeline(self)
+        self.hilight_index = HilightIndex()
+        self.clock_sync = ClockSync()
+        self.clock_offset = None
+        self.journal = EventJournal()
+        self.journal.log("session_start", session_id=self.session_id,
+                         simulated=simulator_options is not None)
+        self.command_metrics.add_failure_listener(self._journal_failure)
+
+        self.data_directory = data_directory
+        if not os.path.exists(data_directory):
+            os.makedirs(data_directory)
+        self.previously_saved_files = []
+        self.previously_saved_camera_files = set()
+        for (directory, _, filenames) in os.walk(data_directory):
+            files = [parts.split("_")[-1] for parts in filenames]
+            self.previously_saved_files.extend(files)
+            self.previously_saved_camera_files.update(
+                (os.path.basename(directory), file) for file in files)
+        self.offload_endpoints = load_endpoints()
+        self.media_folders = {}
+        self.delete_media = delete_media if simulator_options is None\
+            else lambda path: self.gopro.delete_media(path)
+
+    @property
+    def params(self):
+        '''
+        The Open GoPro parameters, imported when first used
+
+        See Also
+        --------
+        gopro_params
+        '''
+        return gopro_params(simulated=self.simulator_options is not None)
+
+    def select(self, name: str) -> None:
+        '''
+        Selects the GoPro to connect to
+
+        Switches to the GoPro object of the name if one was already made for
+        it. Otherwise a new object is made when the connection is opened.
+
+        Parameters
+        ----------
+        name: str
+            A GoPro name such as "GoPro 5990", FIRST_AVAILABLE, or ALL_GOPROS
+        '''
+        self.gopro_name = None if name == self.FIRST_AVAILABLE else name
+        self.gopro = self.gopros.get(self.gopro_name)
+
+    def is_fleet(self) -> bool:
+        '''
+        Check if the session controls the fleet instead of one GoPro
+
+        Returns
+        -------
+        bool
+            True if ALL_GOPROS is selected
+        '''
+        return self.gopro_name == self.ALL_GOPROS
+
+    def new_gopro(self, target: str | None = "") -> InstrumentedGoPro:
+        '''
+        Makes a GoPro object for a GoPro name
+
+        Parameters
+        ----------
+        target: str or None, optional
+            The name of the GoPro or None for the first available GoPro.
+            Defaults to the selected GoPro name.
+
+        Returns
+        -------
+        InstrumentedGoPro
+            A WirelessGoPro, or a SimulatedGoPro if there are simulator
+            options, with its commands timed
+
+        See Also
+        --------
+        make_gopro
+        '''
+        if target == "":
+            target = self.gopro_name
+        return make_gopro(target, self.command_metrics,
+                          self.simulator_options,
+                          enable_wifi=not self.is_fleet())
+
+    def connect(self) -> list:
+        '''
+        Connects to the selected GoPro or fleet
+
+        Switches the GoPro to video mode and loads the video settings of its
+        model once it connects.
+
+        Returns
+        -------
+        List[str]
+            The names of the fleet GoPros that did not connect, which is
+            always empty for a single GoPro
+
+        Raises
+        ------
+        ConnectionError
+            If no GoPro connected
+        '''
+        missing = []
+        if self.is_fleet():
+            fleet = CameraFleet(self.connection_cache, self.new_gopro,
+                                self.command_metrics)
+            missing = fleet.connect(self.FLEET)
+            if not fleet.cameras:
+                fleet.close()
+                self.journal.log("connect_failed", gopro=self.ALL_GOPROS)
+                raise ConnectionError("None of the GoPros connected")
+            self.gopro = self.gopros[self.ALL_GOPROS] = fleet
+            model = fleet.model
+        else:
+            if self.gopro is None or not self.gopro.is_ble_connected:
+                self.gopro = self.connection_cache.connect(
+                    self.gopro_name, self.new_gopro, self.gopro,
+                    self.command_metrics)
+                self.gopros[self.gopro_name] = self.gopro
+            if not self.gopro.is_ble_connected:
+                self.journal.log("connect_failed", gopro=self.gopro_name)
+                raise ConnectionError("The GoPro did not connect")
+            model = self.connection_cache.remember(
+                self.gopro_name, self.gopro, self.command_metrics)["model"]
+        self.armed = False
+        self.gopro.ble_command.load_preset_group(
+            group=self.params.PresetGroup.VIDEO)
+        self.load_capabilities(model)
+        self.journal.log("connect", gopro=self._journal_name(), model=model,
+                         missing=missing)
+        return missing
+
+    def close(self) -> bool:
+        '''
+        Disconnects from the GoPro
+
+        Returns
+        -------
+        bool
+            True if the GoPro is disconnected
+        '''
+        if self.gopro is None:
+            self.journal.flush()
+            return True
+        if self.is_fleet() or self.gopro.is_ble_connected:
+            self.gopro.close()
+        self.journal.log("disconnect", gopro=self._journal_name())
+        self.journal.flush()
+        return not self.gopro.is_ble_connected
+
+    def is_connected(self) -> bool:
+        '''
+        Check if the GoPro is connected without sending a command
+
+        Returns
+        -------
+        bool
+            True if there is a GoPro with a bluetooth connection
+        '''
+        return self.gopro is not None and self.gopro.is_ble_connected
+
+    def reconnect(self) -> bool:
+        '''
+        Try once to reconnect to the GoPro and restore its settings
+
+        The desired video settings are sent again once the GoPro reconnects,
+        and the recording state is checked again.
+
+        Returns
+        -------
+        bool
+            True if the GoPro reconnected
+        '''
+        if self.is_fleet():
+            if not self.gopro.reconnect():
+                self.journal.log("reconnect", gopro=self.ALL_GOPROS,
+                                 connected=False)
+                return False
+        else:
+            try:
+                self.gopro.close()
+            except Exception:
+                # The old connection is already broken
+                pass
+            gopro = self.connection_cache.connect(
+                self.gopro_name, self.new_gopro,
+                metrics=self.command_metrics)
+            if not gopro.is_ble_connected:
+                self.journal.log("reconnect", gopro=self._journal_name(),
+                                 connected=False)
+                return False
+            self.gopro = self.gopros[self.gopro_name] = gopro
+        self.journal.log("reconnect", gopro=self._journal_name(),
+                         connected=True)
+
+        # Replay the desired settings on the new connection
+        self.armed = False
+        self.applied_settings = {}
+        for setting_type, label in self.desired_settings.items():
+            self.send_setting(setting_type, label)
+        self.sync_recording()
+        return True
+
+    def sleep(self) -> None:
+        '''
+        Puts the GoPro to sleep to save battery
+
+        The GoPro closes the bluetooth connection when it goes to sleep, and
+        reconnect wakes it up again.
+
+        See Also
+        --------
+        RecordingScheduler
+        '''
+        self.armed = False
+        self.journal.log("sleep", gopro=self._journal_name())
+        self.gopro.ble_command.sleep()
+
+    def keep_alive(self) -> bool:
+        '''
+        Tells the GoPro not to save power between takes
+
+        Has to be sent at least every 30 seconds, or the GoPro starts saving
+        power and the next command waits for it to wake up. The Open GoPro
+        SDK's WirelessGoPro already sends the same keep-alive every 28
+        seconds from its own thread while it is connected, so this is only
+        needed to keep a simulated GoPro awake or to send them more often.
+
+        Returns
+        -------
+        bool
+            True if the GoPro accepted the keep-alive
+
+        See Also
+        --------
+        ReadinessManager
+        '''
+        return self.gopro.ble_setting.led.set(
+            self.params.LED.BLE_KEEP_ALIVE).is_ok
+
+    def pre_arm(self) -> None:
+        '''
+        Gets the GoPro ready so the next recording starts right away
+
+        Switches to video mode and waits until the GoPro is not busy or
+        recording, so start_recording only has to send the shutter. Taking a
+        photo, stopping a recording, sleeping, or reconnecting disarms it.
+
+        Raises
+        ------
+        TimeoutError
+            If the GoPro stayed busy
+        RuntimeError
+            If the GoPro rejected the video mode every time it was tried
+
+        See Also
+        --------
+        ReadinessManager
+        CameraFleet.pre_arm
+        '''
+        if self.is_fleet():
+            if not self.gopro.pre_arm(self.params.PresetGroup.VIDEO):
+                raise TimeoutError("The GoPros were not ready to record")
+        else:
+            self.command_gate.send(
+                self.gopro, "ble_command.load_preset_group",
+                lambda: self.gopro.ble_command.load_preset_group(
+                    group=self.params.PresetGroup.VIDEO), encoding=False)
+            self.command_gate.wait_ready(self.gopro, "pre_arm",
+                                         encoding=False)
+        self.armed = True
+
+    def sync_clock(self, set_time: bool = True) -> dict:
+        '''
+        Sets the GoPro's clock and measures how far it is from the computer's
+
+        Takes about two seconds. The offset is kept for the session, so the
+        creation times of the media can be turned into the computer's time
+        without reading the files. For the fleet, every GoPro's clock is set
+        to the same time and measured, and the offset measured most
+        precisely is kept.
+
+        Parameters
+        ----------
+        set_time: bool, default=True
+            If the GoPro's clock is set to the computer's before measuring
+
+        Returns
+        -------
+        dict
+            The offset, uncertainty, and fastest round trip in seconds, or
+            for the fleet, those of each GoPro by name
+
+        Raises
+        ------
+        RuntimeError
+            If the GoPro did not accept the time or did not send its time
+
+        See Also
+        --------
+        ClockSync
+        '''
+        if self.is_fleet():
+            results = {name: self.clock_sync.sync(gopro, name, set_time)
+                       for name, gopro in self.gopro.cameras.items()}
+            for name, result in results.items():
+                self.journal.log("clock_sync", gopro=name, set_time=set_time,
+                                 **result)
+            self.clock_offset = min(
+                results.values(),
+                key=lambda result: result["uncertainty"])["offset"]
+            self.hilight_index.clock_offset = self.clock_offset
+            return results
+        result = self.clock_sync.sync(
+            self.gopro, self.gopro_name or self.FIRST_AVAILABLE, set_time)
+        self.clock_offset = result["offset"]
+        self.hilight_index.clock_offset = self.clock_offset
+        self.journal.log("clock_sync", gopro=self._journal_name(),
+                         set_time=set_time, **result)
+        return result
+
+    def capture_time(self, created: str | float) -> dt.datetime | None:
+        '''
+        The computer's time a file was started from its creation time
+
+        Parameters
+        ----------
+        created: str or float
+            The creation time "cre" of the file in the GoPro's media list
+
+        Returns
+        -------
+        datetime or None
+            The computer's local time, or None if the clock is not synced
+        '''
+        if self.clock_offset is None:
+            return None
+        return dt.datetime.fromtimestamp(float(created) - self.clock_offset)
+
+    def load_capabilities(self, model: str) -> bool:
+        '''
+        Loads the video settings possible on a GoPro model
+
+        Parameters
+        ----------
+        model: str
+            The model name of the GoPro. If there is no capability file for
+            the model, the default model is used.
+
+        Returns
+        -------
+        bool
+            False if the default model was used instead
+        '''
+        known = self.capability_library.has_model(model)
+        if not known:
+            model = CapabilityLibrary.DEFAULT_MODEL
+        self.capabilities = self.capability_library.get(model)
+        self.camera_model = self.capabilities.model
+        self.applied_settings = {}
+        return known
+
+    def resolve_settings(self, resolution: str, fps: str, fov: str) -> tuple:
+        '''
+        Picks the closest valid video settings and remembers them
+
+        Parameters
+        ----------
+        resolution: str
+            The resolution label
+        fps: str
+            The wanted frame rate label
+        fov: str
+            The wanted field of view label
+
+        Returns
+        -------
+        Tuple[str, str, str]
+            The resolution, frame rate, and field of view to use
+
+        See Also
+        --------
+        CameraCapabilities.resolve
+        '''
+        resolution, fps, fov = self.capabilities.resolve(resolution, fps, fov)
+        self.desired_settings = {"resolution": resolution, "fps": fps,
+                                 "fov": fov}
+        return resolution, fps, fov
+
+    def send_setting(self, setting_type: str, label: str) -> bool:
+        '''
+        Sends one video setting to the GoPro if it has changed
+
+        Parameters
+        ----------
+        setting_type: str
+            Either "resolution", "fps", or "fov"
+        label: str
+            The label of the setting from the capability index
+
+        Returns
+        -------
+        bool
+            True if the GoPro has the setting
+        '''
+        if self.applied_settings.get(setting_type) == label:
+            return True
+        setting_name, parameter_name = self.SETTING_PARAMETERS[setting_type]
+        value = getattr(getattr(self.params, parameter_name),
+                        self.capabilities.setting(setting_type, label))
+        response = getattr(self.gopro.ble_setting, setting_name).set(value)
+        self.journal.log("setting", setting=setting_type, label=label,
+                         accepted=response.is_ok)
+        if not response.is_ok:
+            self.applied_settings.pop(setting_type, None)
+            return False
+        self.applied_settings[setting_type] = label
+        return True
+
+    def apply_settings(self, resolution: str, fps: str, fov: str) -> tuple:
+        '''
+        Sends a valid combination of video settings to the GoPro
+
+        Parameters
+        ----------
+        resolution: str
+            The resolution label
+        fps: str
+            The wanted frame rate label. If it is not possible at the
+            resolution, the first possible frame rate is used.
+        fov: str
+            The wanted field of view label. If it is not possible at the
+            resolution and frame rate, the first possible field of view is
+            used.
+
+        Returns
+        -------
+        Tuple[Tuple[str, str, str], str or None]
+            The settings that were used and the label of the first setting
+            the GoPro rejected, or None if it accepted all of them
+        '''
+        settings = self.resolve_settings(resolution, fps, fov)
+        for setting_type, label in zip(("resolution", "fps", "fov"),
+                                       settings):
+            if not self.send_setting(setting_type, label):
+                return settings, label
+        return settings, None
+
+    def start_recording(self):
+        '''
+        Starts recording video
+
+        The fleet is started with a synchronized start and the skew between
+        the GoPros is saved to the Metrics folder. One GoPro is sent the
+        commands through the command gate once it is not busy, and nothing is
+        sent if it is already recording. If the GoPro is armed, only the
+        shutter is sent. The time to start is recorded as
+        "record_start.armed" or "record_start.cold" so the two can be
+        compared.
+
+        Returns
+        -------
+        TakeTiming or None
+            The timing of each GoPro in the fleet, or None for one GoPro
+
+        Raises
+        ------
+        TimeoutError
+            If the GoPro stayed busy
+        RuntimeError
+            If the GoPro rejected a command every time it was tried
+        '''
+        with self.recording_lock:
+            return self._start_recording()
+
+    def _start_recording(self):
+        '''
+        Starts recording video while holding the recording lock
+        '''
+        armed = self.armed
+        self.armed = False
+        metric = "record_start.armed" if armed else "record_start.cold"
+        started = time.perf_counter()
+        if self.is_fleet():
+            take = self.gopro.synchronized_start(
+                self.params.PresetGroup.VIDEO, self.params.Toggle.ENABLE,
+                pre_armed=armed)
+            self.command_metrics.record(metric, time.perf_counter() - started,
+                                        failed=bool(take.errors))
+            self.journal.log("record_start", gopro=self.ALL_GOPROS,
+                             armed=armed,
+                             seconds=round(time.perf_counter() - started, 3),
+                             errors=take.errors)
+            self.hilight_index.start_take()
+            self.gopro.log_take(take)
+            self.recording = True
+            return take
+        try:
+            # An armed GoPro was already checked, so only the shutter is sent
+            if not armed:
+                if self.sync_recording():
+                    return None
+                # Make sure the GoPro is in video mode
+                self.command_gate.send(
+                    self.gopro, "ble_command.load_preset_group",
+                    lambda: self.gopro.ble_command.load_preset_group(
+                        group=self.params.PresetGroup.VIDEO))
+            self.command_gate.send(
+                self.gopro, "ble_command.set_shutter",
+                lambda: self.gopro.ble_command.set_shutter(
+                    shutter=self.params.Toggle.ENABLE), check_first=False)
+        except Exception:
+            self.command_metrics.record(metric, time.perf_counter() - started,
+                                        failed=True)
+            raise
+        self.command_metrics.record(metric, time.perf_counter() - started)
+        self.journal.log("record_start", gopro=self._journal_name(),
+                         armed=armed,
+                         seconds=round(time.perf_counter() - started, 3))
+        self.hilight_index.start_take()
+        self.recording = True
+        return None
+
+    def stop_recording(self) -> None:
+        '''
+        Stops recording video
+
+        Nothing is sent if the GoPro is not recording.
+
+        Raises
+        ------
+        TimeoutError
+            If the GoPro stayed busy when the command was retried
+        RuntimeError
+            If the GoPro rejected the command every time it was tried
+        '''
+        with self.recording_lock:
+            self.armed = False
+            if not self.sync_recording():
+                self.hilight_index.end_take()
+                return
+            self.command_gate.send(
+                self.gopro, "ble_command.set_shutter",
+                lambda: self.gopro.ble_command.set_shutter(
+                    shutter=self.params.Toggle.DISABLE), check_first=False)
+            self.recording = False
+            self.journal.log("record_stop", gopro=self._journal_name())
+            self.hilight_index.end_take()
+
+    def sync_recording(self) -> bool:
+        '''
+        Check with the GoPro if it is recording
+
+        Updates recording so it matches the GoPro, such as after a
+        reconnection or a recording started on the GoPro itself.
+
+        Returns
+        -------
+        bool
+            True if the GoPro is recording
+        '''
+        self.recording = self.command_gate.is_encoding(self.gopro)
+        return self.recording
+
+    def take_photo(self, count: int = 1) -> list:
+        '''
+        Take images with the current settings
+
+        The photos are queued on the photo pipeline, which switches to photo
+        mode, takes them back to back with any other queued photos, and
+        switches back to video mode.
+
+        Parameters
+        ----------
+        count: int, default=1
+            The number of photos to take
+
+        Returns
+        -------
+        List[float]
+            The milliseconds from the request to the GoPro's answer of each
+            photo
+
+        See Also
+        --------
+        PhotoPipeline
+        '''
+        futures = self.photo_pipeline.request(count)
+        return [future.result() for future in futures]
+
+    def tag_hilight(self, at: float | None = None) -> float | None:
+        '''
+        Marks the current moment of the recording as a HiLight
+
+        The seconds into the recording are added to the HiLight index before
+        the command is sent, so the offset is not delayed by the GoPro.
+
+        Parameters
+        ----------
+        at: float, optional
+            The time.perf_counter time the HiLight was asked for, such as when
+            a key was pressed. Defaults to now.
+
+        Returns
+        -------
+        float or None
+            The seconds into the recording, or None if the app did not start
+            the recording
+
+        See Also
+        --------
+        HilightIndex
+        '''
+        offset = self.hilight_index.tag(at)
+        self.journal.log("hilight", gopro=self._journal_name(),
+                         offset=offset)
+        self.gopro.ble_command.tag_hilight()
+        if offset is not None:
+            self.hilight_index.save()
+        return offset
+
+    def read_battery_percent(self) -> float:
+        '''
+        Poll the GoPro for its battery percentage
+
+        Returns
+        -------
+        float
+            The battery percentage from 0 to 1
+        '''
+        battery_percent_dict = self.gopro.ble_status.int_batt_per.get_value()
+        return list(battery_percent_dict.values())[0] / 100
+
+    def read_card_seconds(self) -> int:
+        '''
+        Poll the GoPro for the seconds of video that fit on its SD card
+
+        Returns
+        -------
+        int
+            The seconds left to record with the current settings
+        '''
+        time_remaining_dict = self.gopro.ble_status.video_rem.get_value().data
+        return list(time_remaining_dict.values())[0]
+
+    def status(self) -> dict:
+        '''
+        The connection, settings, battery, and SD card status
+
+        The battery and SD card are only polled if the GoPro is connected.
+
+        Returns
+        -------
+        dict
+            The GoPro name, model, if it is connected and recording, the
+            desired settings, and the battery percent and SD card seconds if
+            connected
+        '''
+        status = {
+            "gopro": self.gopro_name or self.FIRST_AVAILABLE,
+            "model": self.camera_model,
+            "connected": self.is_connected(),
+            "recording": self.recording,
+            "settings": dict(self.desired_settings),
+        }
+        if status["connected"]:
+            status["battery_percent"] = self.read_battery_percent()
+            status["card_seconds"] = self.read_card_seconds()
+            if self.is_fleet():
+                status["fleet"] = self.gopro.status_summary()
+        return status
+
+    def save_directory(self, group_name: str = "",
+                       add_timestamp: bool = False) -> tuple:
+        '''
+        Makes the folder to save files into
+
+        Parameters
+        ----------
+        group_name: str, default=""
+            The name of the folder in the data directory. If empty, files are
+            saved in the data directory directly.
+        add_timestamp: bool, default=False
+            If a timestamp of now is added to the front of the file names in
+            the form of YYYYMMDD_HHMMSS
+
+        Returns
+        -------
+        Tuple[str, str]
+            The folder and the timestamp, which is empty if not added
+        '''
+        timestamp = ""
+        if add_timestamp:
+            timestamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S") + "_"
+        local_directory = f"{self.data_directory}/{group_name}/"
+        if not os.path.exists(local_directory):
+            os.makedirs(local_directory)
+        return local_directory, timestamp
+
+    def offload_files(self, local_directory: str, timestamp: str) -> list:
+        '''
+        Download every new file from the GoPro
+
+        The HiLights tagged in each saved video are written next to it. Once
+        the clock is synced, the modified time of each saved file is set to
+        when it was started on the computer's clock.
+
+        Parameters
+        ----------
+        local_directory: str
+            The folder to save the files into
+        timestamp: str
+            The timestamp to add to the front of the file names
+
+        Returns
+        -------
+        List[str]
+            The names of the files that were saved
+
+        Raises
+        ------
+        Exception
+            Any error from the GoPro. Files saved before the error are not
+            saved again.
+        '''
+        saved = {}
+        # Get all of the files on the GoPro
+        gopro_file_list =\
+            self.gopro.http_command.get_media_list().data["files"]
+        # Save out any new files
+        try:
+            for media in gopro_file_list:
+                file = media["n"]
+                self.media_folders[(None, file)] = media.get(
+                    "d", self.MEDIA_FOLDER)
+                if file not in self.previously_saved_files:
+                    local_file = local_directory + timestamp + file
+                    self.gopro.http_command.download_file(
+                        camera_file=file, local_file=local_file)
+                    self.previously_saved_files.append(file)
+                    saved[file] = local_file
+                    captured = self.capture_time(media["cre"])
+                    if captured is not None:
+                        os.utime(local_file, (captured.timestamp(),) * 2)
+        finally:
+            self.journal.log("offload", gopro=self._journal_name(),
+                             directory=local_directory, files=list(saved))
+            self.hilight_index.attach(gopro_file_list, saved)
+        return list(saved)
+
+    def offload_fleet(self, local_directory: str, timestamp: str) -> list:
+        '''
+        Download every new file from every GoPro in the fleet at once
+
+        Each GoPro is downloaded through its own endpoint at the same time,
+        so saving takes about as long as the slowest GoPro.
+
+        Parameters
+        ----------
+        local_directory: str
+            The folder to make a folder for each GoPro in
+        timestamp: str
+            The timestamp to add to the front of the file names
+
+        Returns
+        -------
+        List[str]
+            The errors of the GoPros that did not finish, each starting with
+            the GoPro's serial number
+
+        See Also
+        --------
+        OffloadScheduler
+        '''
+        scheduler = OffloadScheduler(
+            self._fleet_endpoints(),
+            DiskBandwidthBalancer(self.OFFLOAD_DISK_LIMIT))
+        report = scheduler.offload(
+            local_directory, timestamp,
+            lambda serial, name:
+                (serial, name) in self.previously_saved_camera_files)
+        errors = []
+        for serial, result in report.items():
+            self.previously_saved_camera_files.update(
+                (serial, name) for name in result["saved"])
+            self.media_folders.update(
+                ((serial, name), folder)
+                for name, folder in result["folders"].items())
+            self.command_metrics.record("offload.camera", result["seconds"],
+                                        failed=result["error"] is not None)
+            self.journal.log("offload", gopro=serial,
+                             directory=local_directory,
+                             files=result["saved"], error=result["error"])
+            if result["error"] is not None:
+                errors.append(f"{serial}: {result['error']}")
+        return errors
+
+    def delete_files(self, file_names: list,
+                     serial: str | None = None) -> None:
+        '''
+        Deletes saved files from the GoPro's SD card
+
+        Each file is deleted from the folder the media list showed it in.
+        Each delete is timed as "http_command.delete_file".
+
+        Parameters
+        ----------
+        file_names: List[str]
+            The names of the files to delete, which must already be saved
+        serial: str, optional
+            The serial number of the fleet GoPro to delete the files from,
+            through its offload endpoint. The selected GoPro if not given.
+
+        Raises
+        ------
+        ValueError
+            If a file has not been saved yet
+        RuntimeError
+            If the GoPro did not delete a file
+
+        See Also
+        --------
+        delete_media
+        '''
+        endpoints = {endpoint.serial: endpoint
+                     for endpoint in self._fleet_endpoints()}\
+            if serial is not None else {}
+        for file in file_names:
+            if not self.is_saved(serial, file):
+                raise ValueError(f"{file} has not been saved")
+            folder = self.media_folders.get((serial, file), self.MEDIA_FOLDER)
+            started = time.perf_counter()
+            try:
+                if serial is None:
+                    self.delete_media(f"{folder}/{file}")
+                elif serial in endpoints:
+                    endpoints[serial].delete(folder, file)
+                else:
+                    raise RuntimeError(f"{serial} has no offload endpoint")
+            except Exception as error:
+                self.command_metrics.record(
+                    "http_command.delete_file",
+                    time.perf_counter() - started, failed=True, error=error)
+                raise
+            self.command_metrics.record("http_command.delete_file",
+                                        time.perf_counter() - started)
+            self.journal.log("delete", gopro=serial or self._journal_name(),
+                             file=file)
+
+    def card_files(self) -> set:
+        '''
+        The files on the SD card of every GoPro
+
+        For a fleet, the files of each GoPro with an offload endpoint are
+        listed through it.
+
+        Returns
+        -------
+        Set[Tuple[str or None, str]]
+            The serial number of the fleet GoPro, or None for the selected
+            GoPro, and the name of each file
+
+        Raises
+        ------
+        Exception
+            Any error from a GoPro
+        '''
+        files = set()
+        if not self.is_fleet():
+            for media in\
+                    self.gopro.http_command.get_media_list().data["files"]:
+                self.media_folders[(None, media["n"])] = media.get(
+                    "d", self.MEDIA_FOLDER)
+                files.add((None, media["n"]))
+            return files
+        for endpoint in self._fleet_endpoints():
+            for folder, media in endpoint.media_list():
+                self.media_folders[(endpoint.serial, media["n"])] = folder
+                files.add((endpoint.serial, media["n"]))
+        return files
+
+    def is_saved(self, serial: str | None, file_name: str) -> bool:
+        '''
+        Checks if a file from a GoPro has been saved
+
+        Parameters
+        ----------
+        serial: str or None
+            The serial number of the fleet GoPro, or None for the selected
+            GoPro
+        file_name: str
+            The name of the file on the SD card
+
+        Returns
+        -------
+        bool
+            True if the file is in the data directory
+        '''
+        if serial is None:
+            return file_name in self.previously_saved_files
+        return (serial, file_name) in self.previously_saved_camera_files
+
+    def can_offload(self) -> bool:
+        '''
+        Check if files can be saved from the selected GoPro
+
+        Returns
+        -------
+        bool
+            False for a fleet with no offload endpoints
+        '''
+        return not self.is_fleet() or any(
+            name in self.offload_endpoints for name in self.FLEET)
+
+    def _fleet_endpoints(self) -> list:
+        '''
+        The offload endpoints of the fleet GoPros, with their serial numbers
+        '''
+        endpoints = []
+        for name, info in self.gopro.camera_info.items():
+            endpoint = self.offload_endpoints.get(name)
+            if endpoint is None:
+                continue
+            if not endpoint.serial:
+                endpoint.serial = info.get("serial_number") or name
+            endpoints.append(endpoint)
+        return endpoints
+
+    def _journal_name(self) -> str:
+        '''
+        The name of the selected GoPro for the journal
+        '''
+        return self.gopro_name or self.FIRST_AVAILABLE
+
+    def _journal_failure(self, command: str,
+                         error: Exception | None) -> None:
+        '''
+        Adds a failed command to the journal
+        '''
+        self.journal.log("command_failed", command=command,
+                         error="rejected" if error is None else repr(error))
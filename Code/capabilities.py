@@ -0,0 +1,310 @@
+import json
+import os
+import sys
+
+
+class CameraCapabilities:
+    '''
+    The video settings one GoPro model can use
+
+    Holds the resolution, frame rate, and field of view combinations a GoPro
+    model can record with and an index of them that is made once when the
+    model is loaded. The index is used to fill the dropdown menus and to check
+    a combination before it is sent to the GoPro.
+
+    Attributes
+    ----------
+    model: str
+        The model name of the GoPro
+    settings: Dict[str, Dict[str, str]]
+        The Open GoPro parameter name of each resolution, frame rate, and field
+        of view label by setting type
+    combinations: FrozenSet[Tuple[str, str, str]]
+        Every valid resolution, frame rate, and field of view combination
+    resolutions: List[str]
+        The resolutions of the GoPro in the order of the table
+
+    Methods
+    -------
+    __init__(table)
+        Builds the index of valid combinations from a capability table
+    frame_rates(resolution)
+        The frame rates possible at a resolution
+    fovs(resolution, fps)
+        The fields of view possible at a resolution and frame rate
+    is_valid(resolution, fps, fov)
+        Checks if a combination can be used
+    resolve(resolution, fps, fov)
+        The closest valid combination that keeps the resolution
+    setting(setting_type, label)
+        The Open GoPro parameter name for a setting label
+
+    See Also
+    --------
+    CapabilityLibrary
+    '''
+    def __init__(self, table: dict) -> None:
+        '''
+        Builds the index of valid combinations from a capability table
+
+        Parameters
+        ----------
+        table: dict
+            The loaded capability table with the model name, the parameter
+            names of each setting, and the combinations as resolution to frame
+            rate to a list of fields of view
+
+        Raises
+        ------
+        KeyError
+            If a combination uses a label without a parameter name
+        '''
+        self.model = table["model"]
+        self.settings = table["settings"]
+        self.resolutions = list(table["combinations"])
+        self._frame_rates = {}
+        self._fovs = {}
+        combinations = set()
+        for resolution, frame_rates in table["combinations"].items():
+            self._frame_rates[resolution] = list(frame_rates)
+            for fps, fovs in frame_rates.items():
+                self._fovs[(resolution, fps)] = list(fovs)
+                for fov in fovs:
+                    # Make sure every label can be sent to the GoPro
+                    self.settings["resolution"][resolution]
+                    self.settings["fps"][fps]
+                    self.settings["fov"][fov]
+                    combinations.add((resolution, fps, fov))
+        self.combinations = frozenset(combinations)
+
+    def frame_rates(self, resolution: str) -> list:
+        '''
+        The frame rates possible at a resolution
+
+        Parameters
+        ----------
+        resolution: str
+            The resolution label
+
+        Returns
+        -------
+        List[str]
+            The frame rate labels, or an empty list for an unknown resolution
+        '''
+        return list(self._frame_rates.get(resolution, []))
+
+    def fovs(self, resolution: str, fps: str) -> list:
+        '''
+        The fields of view possible at a resolution and frame rate
+
+        Parameters
+        ----------
+        resolution: str
+            The resolution label
+        fps: str
+            The frame rate label
+
+        Returns
+        -------
+        List[str]
+            The field of view labels, or an empty list for an unknown
+            combination
+        '''
+        return list(self._fovs.get((resolution, fps), []))
+
+    def is_valid(self, resolution: str, fps: str, fov: str) -> bool:
+        '''
+        Checks if a combination can be used
+
+        Parameters
+        ----------
+        resolution: str
+            The resolution label
+        fps: str
+            The frame rate label
+        fov: str
+            The field of view label
+
+        Returns
+        -------
+        bool
+            True if the GoPro can record with the combination
+        '''
+        return (resolution, fps, fov) in self.combinations
+
+    def resolve(self, resolution: str, fps: str, fov: str) -> tuple:
+        '''
+        The closest valid combination that keeps the resolution
+
+        Keeps the frame rate and field of view if they are possible at the
+        resolution and otherwise uses the first possible option.
+
+        Parameters
+        ----------
+        resolution: str
+            The resolution label
+        fps: str
+            The wanted frame rate label
+        fov: str
+            The wanted field of view label
+
+        Returns
+        -------
+        Tuple[str, str, str]
+            A valid resolution, frame rate, and field of view
+
+        Raises
+        ------
+        KeyError
+            If the resolution is not available on this model
+        '''
+        if resolution not in self._frame_rates:
+            raise KeyError(resolution)
+        frame_rates = self._frame_rates[resolution]
+        if fps not in frame_rates:
+            fps = frame_rates[0]
+        fovs = self._fovs[(resolution, fps)]
+        if fov not in fovs:
+            fov = fovs[0]
+        return resolution, fps, fov
+
+    def setting(self, setting_type: str, label: str) -> str:
+        '''
+        The Open GoPro parameter name for a setting label
+
+        Parameters
+        ----------
+        setting_type: str
+            Either "resolution", "fps", or "fov"
+        label: str
+            The label shown in the dropdown menu
+
+        Returns
+        -------
+        str
+            The name of the parameter in Params.Resolution, Params.FPS, or
+            Params.VideoFOV
+
+        Raises
+        ------
+        KeyError
+            If the label is not available on this model
+        '''
+        return self.settings[setting_type][label]
+
+
+class CapabilityLibrary:
+    '''
+    Loads the capability tables of GoPro models from data files
+
+    Each GoPro model has a JSON file in the Capabilities folder named after
+    the model in lower case with spaces replaced by underscores. A file is
+    only read the first time its model is asked for so unused models cost
+    nothing. Adding a new GoPro model only needs a new file.
+
+    Attributes
+    ----------
+    DEFAULT_MODEL: str
+        The model to use when a GoPro's model is unknown
+    directory: str
+        The folder with the capability files
+
+    Methods
+    -------
+    __init__(directory)
+        Sets the folder to load capability files from
+    file_name(model)
+        The name of the capability file for a model
+    get(model)
+        The capabilities of a GoPro model
+    has_model(model)
+        Checks if a model has a capability file
+
+    See Also
+    --------
+    CameraCapabilities
+    '''
+    DEFAULT_MODEL = "HERO10 Black"
+
+    def __init__(self, directory: str | None = None) -> None:
+        '''
+        Sets the folder to load capability files from
+
+        Parameters
+        ----------
+        directory: str, optional
+            The folder with the capability files. Defaults to the Capabilities
+            folder next to this file, or in the unpacked data of the
+            executable built by pyinstaller.
+        '''
+        if directory is None:
+            # pyinstaller unpacks the data added with --add-data to
+            # sys._MEIPASS, which is not always the folder of this module
+            root = getattr(sys, "_MEIPASS",
+                           os.path.dirname(os.path.abspath(__file__)))
+            directory = os.path.join(root, "Capabilities")
+        self.directory = directory
+        self._loaded = {}
+
+    @staticmethod
+    def file_name(model: str) -> str:
+        '''
+        The name of the capability file for a model
+
+        Parameters
+        ----------
+        model: str
+            The model name of the GoPro
+
+        Returns
+        -------
+        str
+            The file name, such as "hero10_black.json"
+        '''
+        return model.strip().lower().replace(" ", "_") + ".json"
+
+    def has_model(self, model: str) -> bool:
+        '''
+        Checks if a model has a capability file
+
+        Parameters
+        ----------
+        model: str
+            The model name of the GoPro
+
+        Returns
+        -------
+        bool
+            True if the model can be loaded
+        '''
+        return model in self._loaded or os.path.exists(
+            os.path.join(self.directory, self.file_name(model)))
+
+    def get(self, model: str) -> CameraCapabilities:
+        '''
+        The capabilities of a GoPro model
+
+        Parameters
+        ----------
+        model: str
+            The model name of the GoPro
+
+        Returns
+        -------
+        CameraCapabilities
+            The loaded and indexed capabilities of the model
+
+        Raises
+        ------
+        KeyError
+            If there is no capability file for the model
+        '''
+        if model not in self._loaded:
+            path = os.path.join(self.directory, self.file_name(model))
+            try:
+                with open(path, "r") as capability_file:
+                    table = json.load(capability_file)
+            except FileNotFoundError:
+                raise KeyError(model) from None
+            self._loaded[model] = CameraCapabilities(table)
+        return self._loaded[model]
@@ -0,0 +1,201 @@
+import datetime as dt
+import time
+
+from instrumentation import append_csv_row
+
+
+# The start of the GoPro's media creation times, which count the seconds of
+# its local clock as if it were UTC
+_EPOCH = dt.datetime(1970, 1, 1)
+
+
+class ClockSync:
+    '''
+    Sets the GoPro's clock and measures how far it is from the computer's
+
+    The GoPro's clock only reports whole seconds, so one reading only says
+    the offset between the clocks is somewhere in a window a second plus one
+    round trip wide. The clock is read several times at different points
+    within the computer's second, and the windows of the readings are
+    intersected, which narrows the offset down to about one round trip. Like
+    NTP, readings much slower than the fastest one are dropped since they say
+    little about when the GoPro read its clock.
+
+    The offset is in the same units as the creation time "cre" of the GoPro's
+    media list, which counts the GoPro's local clock as if it were UTC, so a
+    creation time minus the offset is the time.time() the file was started
+    on the computer.
+
+    Attributes
+    ----------
+    SAMPLES: int
+        The number of times the clock is read, spread over one second
+    RTT_LIMIT: float
+        Readings whose round trip took more than this many times the fastest
+        one are dropped
+    log_path: str
+        The CSV file every sync is added to
+
+    Methods
+    -------
+    __init__(log_path)
+        Sets up the clock sync
+    set_clock(gopro)
+        Sets the GoPro's clock to the computer's local time
+    measure(gopro)
+        Measures the offset between the GoPro's clock and the computer's
+    sync(gopro, name, set_time)
+        Sets the clock if asked, measures the offset, and logs it
+
+    See Also
+    --------
+    CameraSession.sync_clock
+    '''
+    SAMPLES = 12
+    RTT_LIMIT = 2.0
+
+    def __init__(self, log_path: str = "../Metrics/clock_sync.csv") -> None:
+        '''
+        Sets up the clock sync
+
+        Parameters
+        ----------
+        log_path: str, default="../Metrics/clock_sync.csv"
+            The CSV file every sync is added to
+        '''
+        self.log_path = log_path
+
+    def set_clock(self, gopro) -> None:
+        '''
+        Sets the GoPro's clock to the computer's local time
+
+        The GoPro drops the fraction of a second, so the command is sent just
+        before a new second starts on the computer with that second.
+
+        Parameters
+        ----------
+        gopro: InstrumentedGoPro
+            The connected GoPro
+
+        Raises
+        ------
+        RuntimeError
+            If the GoPro rejected the time
+        '''
+        rtt = self._round_trip(gopro)
+        second = int(time.time() + rtt) + 1
+        # Aim for the command to arrive as the second starts
+        time.sleep(max(0.0, second - time.time() - rtt / 2))
+        response = gopro.ble_command.set_date_time(
+            date_time=dt.datetime.fromtimestamp(second))
+        if not response.is_ok:
+            raise RuntimeError("The GoPro did not accept the time")
+
+    def measure(self, gopro, samples: int | None = None) -> dict:
+        '''
+        Measures the offset between the GoPro's clock and the computer's
+
+        Parameters
+        ----------
+        gopro: InstrumentedGoPro
+            The connected GoPro
+        samples: int, optional
+            The number of times to read the clock. Defaults to SAMPLES.
+
+        Returns
+        -------
+        dict
+            "offset", the seconds the GoPro's creation time clock is ahead of
+            time.time(), "uncertainty", the most seconds the offset can be
+            off by, and the "min_rtt" and "samples" used
+
+        Raises
+        ------
+        RuntimeError
+            If the GoPro did not answer with its time
+        '''
+        samples = samples or self.SAMPLES
+        readings = []
+        start = time.time()
+        for index in range(samples):
+            # Read at a different point within the second each time
+            phase = start + index / samples
+            time.sleep(max(0.0, phase - time.time()))
+            sent = time.time()
+            response = gopro.ble_command.get_date_time()
+            answered = time.time()
+            if not response.is_ok:
+                raise RuntimeError("The GoPro did not send its time")
+            camera = (_camera_datetime(response.data) - _EPOCH)\
+                .total_seconds()
+            # The GoPro read its clock between sending and answering, and
+            # the clock was somewhere within the second it reported
+            readings.append((answered - sent, camera - answered,
+                             camera + 1 - sent))
+        readings.sort()
+        kept = [reading for reading in readings
+                if reading[0] <= readings[0][0] * self.RTT_LIMIT]
+        low = max(reading[1] for reading in kept)
+        high = min(reading[2] for reading in kept)
+        if low > high:
+            # The readings disagree, such as from a clock change, so only
+            # trust the fastest one
+            _, low, high = kept[0]
+        return {"offset": (low + high) / 2, "uncertainty": (high - low) / 2,
+                "min_rtt": kept[0][0], "samples": len(kept)}
+
+    def sync(self, gopro, name: str, set_time: bool = True) -> dict:
+        '''
+        Sets the clock if asked, measures the offset, and logs it
+
+        Parameters
+        ----------
+        gopro: InstrumentedGoPro
+            The connected GoPro
+        name: str
+            The name of the GoPro for the log
+        set_time: bool, default=True
+            If the GoPro's clock is set to the computer's first
+
+        Returns
+        -------
+        dict
+            The measurement from measure
+        '''
+        if set_time:
+            self.set_clock(gopro)
+        result = self.measure(gopro)
+        self._log(name, set_time, result)
+        return result
+
+    def _round_trip(self, gopro) -> float:
+        '''
+        The seconds one clock reading takes
+        '''
+        sent = time.perf_counter()
+        gopro.ble_command.get_date_time()
+        return time.perf_counter() - sent
+
+    def _log(self, name: str, set_time: bool, result: dict) -> None:
+        '''
+        Adds a sync to the CSV file
+        '''
+        append_csv_row(
+            self.log_path, ["time", "gopro", "set", "offset", "uncertainty",
+                            "min_rtt", "samples"],
+            [dt.datetime.now().isoformat(), name, set_time,
+             f"{result['offset']:.3f}", f"{result['uncertainty']:.3f}",
+             f"{result['min_rtt']:.3f}", result["samples"]])
+
+
+def _camera_datetime(data) -> dt.datetime:
+    '''
+    The GoPro's local time from a get_date_time response
+
+    Depending on the SDK version, the time is the response itself or in a
+    dictionary, and may have a time zone, which is dropped since the
+    creation times of the media do not have one either.
+    '''
+    if isinstance(data, dict):
+        data = data.get("date_time", next(iter(data.values())))
+    return data.replace(tzinfo=None)
@@ -0,0 +1,176 @@
+import random
+import time
+
+
+class CommandGate:
+    '''
+    Holds commands until the GoPro is ready and retries rejected ones
+
+    A GoPro that is busy saving a file or still encoding rejects or delays
+    shutter and mode commands, which leaves the app thinking the GoPro is
+    recording when it is not. The gate checks the busy and encoding
+    statuses before each command and waits until the GoPro is ready. A
+    rejected command is tried again after a random wait that grows with
+    each attempt, up to a set number of attempts. The time every command
+    spent waiting is recorded.
+
+    Attributes
+    ----------
+    READY_TIMEOUT: float
+        The most seconds to wait for the GoPro to be ready
+    POLL: float
+        The seconds between status checks while waiting
+    MAX_ATTEMPTS: int
+        The most times a command is sent
+    BASE_DELAY: float
+        The longest wait in seconds before the second attempt
+    MAX_DELAY: float
+        The longest wait in seconds between attempts
+    metrics: CommandMetrics
+        Where the waits are recorded as "gate.<name>" and retries are counted
+
+    Methods
+    -------
+    __init__(metrics, seed)
+        Sets up the gate
+    wait_ready(gopro, name, encoding, timeout)
+        Waits until the GoPro is not busy and is or is not encoding
+    send(gopro, name, command, encoding, check_first)
+        Sends a command once the GoPro is ready, retrying if it is rejected
+    is_encoding(gopro)
+        Check if the GoPro is recording
+
+    See Also
+    --------
+    CameraSession.start_recording
+    PhotoPipeline
+    '''
+    READY_TIMEOUT = 5.0
+    POLL = 0.02
+    MAX_ATTEMPTS = 3
+    BASE_DELAY = 0.1
+    MAX_DELAY = 1.0
+
+    def __init__(self, metrics, seed: int | None = None) -> None:
+        '''
+        Sets up the gate
+
+        Parameters
+        ----------
+        metrics: CommandMetrics
+            Where the waits and retries are recorded
+        seed: int, optional
+            The seed for the random waits between attempts
+        '''
+        self.metrics = metrics
+        self._random = random.Random(seed)
+
+    def wait_ready(self, gopro, name: str, encoding: bool | None = None,
+                   timeout: float | None = None) -> float:
+        '''
+        Waits until the GoPro is not busy and is or is not encoding
+
+        Parameters
+        ----------
+        gopro: InstrumentedGoPro or CameraFleet
+            The GoPro to check. For a fleet, every GoPro must be ready.
+        name: str
+            The name of the command waiting, for the metrics
+        encoding: bool, optional
+            If given, also wait until the GoPro is or is not encoding
+        timeout: float, optional
+            The most seconds to wait. Defaults to READY_TIMEOUT.
+
+        Returns
+        -------
+        float
+            The seconds spent waiting
+
+        Raises
+        ------
+        TimeoutError
+            If the GoPro is not ready in time
+        '''
+        started = time.monotonic()
+        give_up = started + (self.READY_TIMEOUT if timeout is None
+                             else timeout)
+        while True:
+            busy = gopro.ble_status.system_busy.get_value()
+            ready = busy.is_ok and not any(busy.values())
+            if ready and encoding is not None:
+                ready = self.is_encoding(gopro) == encoding
+            if ready:
+                waited = time.monotonic() - started
+                self.metrics.record(f"gate.{name}", waited)
+                return waited
+            if time.monotonic() > give_up:
+                self.metrics.record(f"gate.{name}",
+                                    time.monotonic() - started, failed=True)
+                raise TimeoutError(f"The GoPro was not ready for {name}")
+            time.sleep(self.POLL)
+
+    def send(self, gopro, name: str, command, encoding: bool | None = None,
+             check_first: bool = True) -> float:
+        '''
+        Sends a command once the GoPro is ready, retrying if it is rejected
+
+        Parameters
+        ----------
+        gopro: InstrumentedGoPro or CameraFleet
+            The GoPro the command is sent to
+        name: str
+            The name of the command for the metrics
+        command: Callable[[], response]
+            Sends the command and returns the GoPro's response
+        encoding: bool, optional
+            If given, the GoPro must be or not be encoding before the command
+            is sent
+        check_first: bool, default=True
+            If the GoPro is checked before the first attempt. Turn off when
+            it was just checked or just accepted a command, so the first
+            attempt is not delayed. It is always checked before a retry.
+
+        Returns
+        -------
+        float
+            The seconds spent waiting for the GoPro, including the waits
+            between attempts
+
+        Raises
+        ------
+        TimeoutError
+            If the GoPro is not ready in time
+        RuntimeError
+            If the GoPro rejected every attempt
+        '''
+        waited = 0.0
+        for attempt in range(self.MAX_ATTEMPTS):
+            if attempt > 0:
+                self.metrics.record_retry(name)
+                delay = self._random.uniform(
+                    0, min(self.MAX_DELAY, self.BASE_DELAY * 2 ** attempt))
+                time.sleep(delay)
+                waited += delay
+            if attempt > 0 or check_first:
+                waited += self.wait_ready(gopro, name, encoding)
+            if command().is_ok:
+                return waited
+        raise RuntimeError(f"The GoPro rejected {name} {self.MAX_ATTEMPTS} "
+                           "times")
+
+    def is_encoding(self, gopro) -> bool:
+        '''
+        Check if the GoPro is recording
+
+        Parameters
+        ----------
+        gopro: InstrumentedGoPro or CameraFleet
+            The GoPro to check. A fleet is encoding if any GoPro is.
+
+        Returns
+        -------
+        bool
+            True if the GoPro reports that it is encoding
+        '''
+        encoding = gopro.ble_status.encoding_active.get_value()
+        return encoding.is_ok and any(encoding.values())
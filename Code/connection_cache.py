@@ -0,0 +1,228 @@
+import json
+import os
+import threading
+import time
+
+
+class ConnectionCache:
+    '''
+    Remembers each GoPro that was connected to so reconnecting is faster
+
+    Saves the identifier, model, and serial number of every GoPro after it
+    connects. When the same GoPro is connected to again, the app first tries
+    a short connection aimed at the exact GoPro it found last time and only
+    falls back to a full scan with retries if that does not work. The model
+    is taken from the cache so it does not need to be asked for again. The
+    time each phase of the connection took is saved with the GoPro and added
+    to the command metrics. Several GoPros can be connected to at the same
+    time from different threads.
+
+    Attributes
+    ----------
+    DIRECT_TIMEOUT: int
+        The seconds to try the direct connection for
+    DIRECT_RETRIES: int
+        The number of direct connection attempts before scanning
+    FIRST_AVAILABLE: str
+        The name the first available GoPro is saved under
+    path: str
+        The file the cache is saved to
+    entries: Dict[str, dict]
+        The saved information of each GoPro by the name it was selected with
+    last_timings: Dict[str, float]
+        The seconds each phase of the last connection made on the calling
+        thread took
+
+    Methods
+    -------
+    __init__(path)
+        Loads the saved GoPros
+    get(name)
+        The saved information of a GoPro
+    connect(name, make_gopro, gopro, metrics)
+        Connects to a GoPro, trying a direct connection first
+    remember(name, gopro, metrics)
+        Saves the information of a connected GoPro
+    save()
+        Saves the cache to a file
+
+    See Also
+    --------
+    GoProApp.connect_callback
+
+    Notes
+    -----
+    The Open GoPro SDK always scans for the GoPro it is given, so the direct
+    connection is a scan for only the exact GoPro from last time with a short
+    timeout and a single try.
+    '''
+    DIRECT_TIMEOUT = 5
+    DIRECT_RETRIES = 1
+    FIRST_AVAILABLE = "First Available"
+
+    def __init__(self, path: str = "../State/connection_cache.json") -> None:
+        '''
+        Loads the saved GoPros
+
+        Parameters
+        ----------
+        path: str, default="../State/connection_cache.json"
+            The file to load and save the cache
+        '''
+        self.path = path
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        try:
+            with open(self.path, "r") as cache_file:
+                self.entries = json.load(cache_file)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, name: str | None) -> dict | None:
+        '''
+        The saved information of a GoPro
+
+        Parameters
+        ----------
+        name: str or None
+            The selected GoPro name, or None for the first available GoPro
+
+        Returns
+        -------
+        dict or None
+            The saved information, or None if the GoPro was never connected
+        '''
+        with self._lock:
+            return self.entries.get(name or self.FIRST_AVAILABLE)
+
+    @property
+    def last_timings(self) -> dict:
+        if not hasattr(self._local, "timings"):
+            self._local.timings = {}
+        return self._local.timings
+
+    @last_timings.setter
+    def last_timings(self, timings: dict) -> None:
+        self._local.timings = timings
+
+    def connect(self, name: str | None, make_gopro, gopro=None,
+                metrics=None):
+        '''
+        Connects to a GoPro, trying a direct connection first
+
+        Parameters
+        ----------
+        name: str or None
+            The selected GoPro name, or None for the first available GoPro
+        make_gopro: Callable[[str or None], WirelessGoPro]
+            Makes a GoPro object that connects to a target name
+        gopro: WirelessGoPro, optional
+            An unconnected GoPro object for the name that can be used instead
+            of making a new one
+        metrics: CommandMetrics, optional
+            Where the time of each connection phase is recorded
+
+        Returns
+        -------
+        WirelessGoPro
+            The GoPro object that was opened. Check is_ble_connected to see if
+            the connection worked.
+        '''
+        self.last_timings = {}
+        entry = self.get(name)
+        if entry is not None:
+            target = entry["target"]
+            direct = gopro if gopro is not None and name == target\
+                else make_gopro(target)
+            start = time.perf_counter()
+            try:
+                direct.open(timeout=self.DIRECT_TIMEOUT,
+                            retries=self.DIRECT_RETRIES)
+            except Exception:
+                # Any failure here is handled by the full scan below
+                pass
+            self._time_phase("direct", start, metrics)
+            if direct.is_ble_connected:
+                return direct
+            try:
+                # Let go of what the failed attempt opened before scanning
+                direct.close()
+            except Exception:
+                # Nothing was left open
+                pass
+            if gopro is None or direct is gopro:
+                gopro = make_gopro(name)
+
+        if gopro is None:
+            gopro = make_gopro(name)
+        start = time.perf_counter()
+        try:
+            gopro.open()
+        finally:
+            self._time_phase("scan", start, metrics)
+        return gopro
+
+    def remember(self, name: str | None, gopro, metrics=None) -> dict:
+        '''
+        Saves the information of a connected GoPro
+
+        Asks the GoPro for its model and serial number only if they are not
+        already saved for it.
+
+        Parameters
+        ----------
+        name: str or None
+            The selected GoPro name, or None for the first available GoPro
+        gopro: WirelessGoPro
+            The connected GoPro
+        metrics: CommandMetrics, optional
+            Where the time of asking for the information is recorded
+
+        Returns
+        -------
+        dict
+            The saved information with the target, identifier, model, serial
+            number, last connection time, and the connection phase timings
+        '''
+        entry = self.get(name)
+        identifier = gopro.identifier
+        if entry is None or entry.get("identifier") != identifier:
+            start = time.perf_counter()
+            hardware_info = gopro.ble_command.get_hardware_info()
+            info = hardware_info.data if hardware_info.is_ok else {}
+            self._time_phase("describe", start, metrics)
+            entry = {
+                "target": f"GoPro {identifier}",
+                "identifier": identifier,
+                "model": info.get("model_name", ""),
+                "serial_number": info.get("serial_number", ""),
+            }
+        entry["last_connected"] = time.time()
+        entry["timings"] = dict(self.last_timings)
+        with self._lock:
+            self.entries[name or self.FIRST_AVAILABLE] = entry
+        self.save()
+        return entry
+
+    def save(self) -> None:
+        '''
+        Saves the cache to a file
+        '''
+        directory = os.path.dirname(self.path)
+        if directory:
+            # Several GoPros connecting at once can save at the same time
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = self.path + ".tmp"
+        with self._lock:
+            with open(temporary_path, "w") as cache_file:
+                json.dump(self.entries, cache_file, indent=4)
+            os.replace(temporary_path, self.path)
+
+    def _time_phase(self, phase: str, start: float, metrics) -> None:
+        '''
+        Records how long a connection phase took
+        '''
+        seconds = time.perf_counter() - start
+        self.last_timings[phase] = seconds
+        if metrics is not None:
+            metrics.record(f"connect.{phase}", seconds)
@@ -0,0 +1,172 @@
+import random
+import threading
+import time
+
+
+class ConnectionSupervisor:
+    '''
+    Watches the GoPro connection and reconnects in the background
+
+    Checks the connection every few seconds and right away whenever a command
+    fails. When the connection is lost, it keeps trying to reconnect on its
+    own thread, waiting a random time that grows after each failed attempt so
+    a GoPro that is out of range is not flooded with connection attempts.
+    Once it reconnects, it lets the app restore its settings and resume any
+    paused work.
+
+    Attributes
+    ----------
+    CHECK_INTERVAL: float
+        The seconds between connection checks
+    BASE_DELAY: float
+        The longest wait in seconds before the second reconnection attempt
+    MAX_DELAY: float
+        The longest wait in seconds between reconnection attempts
+    state: str
+        "stopped", "connected", or "reconnecting"
+    reconnections: int
+        The number of times the connection was restored
+    last_outage: float
+        The seconds the last lost connection took to restore
+
+    Methods
+    -------
+    __init__(is_connected, reconnect, on_lost, on_recovered, seed)
+        Sets up the supervisor without starting it
+    start()
+        Starts watching the connection
+    stop()
+        Stops watching the connection
+    notify_failure(*args)
+        Checks the connection right away after a command failed
+    backoff_delay(attempt)
+        The random wait before a reconnection attempt
+
+    See Also
+    --------
+    GoProApp.reconnect
+    '''
+    CHECK_INTERVAL = 2.0
+    BASE_DELAY = 0.5
+    MAX_DELAY = 30.0
+
+    def __init__(self, is_connected, reconnect, on_lost=None,
+                 on_recovered=None, seed: int | None = None) -> None:
+        '''
+        Sets up the supervisor without starting it
+
+        Parameters
+        ----------
+        is_connected: Callable[[], bool]
+            Checks if the GoPro is connected without sending a command
+        reconnect: Callable[[], bool]
+            Tries once to reconnect and returns if it worked
+        on_lost: Callable[[], None], optional
+            Called on the supervisor thread when the connection is lost
+        on_recovered: Callable[[float], None], optional
+            Called on the supervisor thread with the seconds the outage took
+            once the connection is restored
+        seed: int, optional
+            The seed for the random waits between attempts
+        '''
+        self.is_connected = is_connected
+        self.reconnect = reconnect
+        self.on_lost = on_lost
+        self.on_recovered = on_recovered
+        self.state = "stopped"
+        self.reconnections = 0
+        self.last_outage = 0.0
+        self._random = random.Random(seed)
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        '''
+        Starts watching the connection
+        '''
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self.state = "connected"
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="connection-supervisor")
+        self._thread.start()
+
+    def stop(self) -> None:
+        '''
+        Stops watching the connection
+        '''
+        self._stopped.set()
+        self._wake.set()
+        self.state = "stopped"
+
+    def notify_failure(self, *args) -> None:
+        '''
+        Checks the connection right away after a command failed
+
+        Parameters
+        ----------
+        *args
+            Details of the failure, which are not used, so this can be given
+            directly as a failure listener
+        '''
+        self._wake.set()
+
+    def backoff_delay(self, attempt: int) -> float:
+        '''
+        The random wait before a reconnection attempt
+
+        Parameters
+        ----------
+        attempt: int
+            The number of attempts that have already failed
+
+        Returns
+        -------
+        float
+            A random number of seconds between 0 and the smaller of MAX_DELAY
+            and BASE_DELAY doubled for every failed attempt
+        '''
+        return self._random.uniform(
+            0, min(self.MAX_DELAY, self.BASE_DELAY * 2 ** attempt))
+
+    def _run(self) -> None:
+        '''
+        Checks the connection until stopped
+        '''
+        while not self._stopped.is_set():
+            self._wake.wait(self.CHECK_INTERVAL)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            if not self.is_connected():
+                self._recover()
+
+    def _recover(self) -> None:
+        '''
+        Reconnects with growing random waits between attempts
+        '''
+        outage_start = time.monotonic()
+        self.state = "reconnecting"
+        if self.on_lost is not None:
+            self.on_lost()
+        attempt = 0
+        while not self._stopped.is_set():
+            try:
+                reconnected = self.reconnect()
+            except Exception:
+                reconnected = False
+            if reconnected:
+                break
+            if self._stopped.wait(self.backoff_delay(attempt)):
+                return
+            attempt += 1
+        else:
+            return
+
+        self.state = "connected"
+        self.reconnections += 1
+        self.last_outage = time.monotonic() - outage_start
+        if self.on_recovered is not None:
+            self.on_recovered(self.last_outage)
@@ -0,0 +1,610 @@
+import argparse
+import base64
+import concurrent.futures
+import hashlib
+import http.server
+import itertools
+import json
+import queue
+import struct
+import threading
+import time
+import urllib.parse
+
+from session_commands import run_command
+
+# The host names of the web pages allowed to send commands
+LOCAL_HOSTS = ("127.0.0.1", "localhost")
+
+
+class CommandQueue:
+    '''
+    Runs GoPro commands one at a time in the order they were sent
+
+    Commands from every client are run on one worker thread, so they reach
+    the GoPro in order and never run at the same time, while the threads that
+    sent them are free to keep serving other clients. The time each command
+    waited in the queue and took to run is measured.
+
+    Nothing waits on the worker thread. A recording started for a number of
+    seconds is stopped by a stop command added to the queue by a timer once
+    the seconds are up, so other commands keep running while it records.
+
+    Attributes
+    ----------
+    metrics: CommandMetrics
+        Where the total time of each command is recorded as "api.<name>"
+
+    Methods
+    -------
+    __init__(metrics)
+        Starts the worker thread
+    submit(name, function, *args)
+        Adds a command to the end of the queue
+    submit_command(session, arguments, **fields)
+        Adds a parsed GoPro command to the end of the queue
+    add_result_listener(listener)
+        Calls a function with the result of every GoPro command
+    close()
+        Stops the worker thread after the queued commands finish
+    '''
+    def __init__(self, metrics) -> None:
+        '''
+        Starts the worker thread
+
+        Parameters
+        ----------
+        metrics: CommandMetrics
+            Where the total time of each command is recorded
+        '''
+        self.metrics = metrics
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="control-queue")
+        self._ids = itertools.count(1)
+        self._listeners = []
+        self._timers = set()
+        self._timers_lock = threading.Lock()
+
+    def submit(self, name: str, function, *args) -> concurrent.futures.Future:
+        '''
+        Adds a command to the end of the queue
+
+        Parameters
+        ----------
+        name: str
+            The name of the command for the metrics
+        function: Callable
+            Runs the command and returns a dictionary result
+        *args
+            The arguments to run the function with
+
+        Returns
+        -------
+        Future
+            Finishes with the result, which has "latency" added with the
+            milliseconds the command was queued for, ran for, and took in
+            total
+        '''
+        queued = time.perf_counter()
+
+        def run():
+            started = time.perf_counter()
+            failed = True
+            try:
+                result = function(*args)
+                failed = not result.get("ok", True)
+            except Exception as error:
+                result = {"command": name, "ok": False, "error": str(error)}
+            finally:
+                finished = time.perf_counter()
+                self.metrics.record(f"api.{name}", finished - queued,
+                                    failed=failed)
+            result["latency"] = {
+                "queued_ms": (started - queued) * 1000,
+                "run_ms": (finished - started) * 1000,
+                "total_ms": (finished - queued) * 1000,
+            }
+            return result
+        return self._executor.submit(run)
+
+    def submit_command(self, session, arguments: argparse.Namespace,
+                       **fields) -> tuple:
+        '''
+        Adds a parsed GoPro command to the end of the queue
+
+        A recording started with seconds is started straight away, and a
+        stop command is added to the queue once the seconds are up. The stop's
+        result has the ID of the start as "stop_of".
+
+        Parameters
+        ----------
+        session: CameraSession
+            The session the command is run on
+        arguments: Namespace
+            The parsed command, as from build_command_parser
+        **fields
+            Values added to the result
+
+        Returns
+        -------
+        Tuple[int, Future]
+            The ID of the command and a future that finishes with its result,
+            which has the ID as "id"
+
+        See Also
+        --------
+        run_command
+        '''
+        command_id = next(self._ids)
+        seconds = None
+        if arguments.command == "record" and arguments.action == "start":
+            seconds = getattr(arguments, "seconds", None)
+            arguments = argparse.Namespace(**{**vars(arguments),
+                                              "seconds": None})
+
+        def run():
+            result = run_command(session, arguments)
+            result["id"] = command_id
+            result.update(fields)
+            if seconds is not None and result["ok"]:
+                self._stop_later(session, seconds, command_id)
+                result["stops_after"] = seconds
+            return result
+        future = self.submit(arguments.command, run)
+        future.add_done_callback(self._announce)
+        return command_id, future
+
+    def add_result_listener(self, listener) -> None:
+        '''
+        Calls a function with the result of every GoPro command
+
+        Parameters
+        ----------
+        listener: Callable[[dict], None]
+            Called on the queue thread with the result of every command added
+            with submit_command, including the stops added by timers
+        '''
+        self._listeners.append(listener)
+
+    def close(self) -> None:
+        '''
+        Stops the worker thread after the queued commands finish
+
+        Stops that are still waiting for their timer are not sent.
+        '''
+        with self._timers_lock:
+            timers, self._timers = self._timers, set()
+        for timer in timers:
+            timer.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _stop_later(self, session, seconds: float, command_id: int) -> None:
+        '''
+        Adds a record stop command to the queue after a number of seconds
+        '''
+        def stop():
+            with self._timers_lock:
+                if timer not in self._timers:
+                    # The queue was closed
+                    return
+                self._timers.discard(timer)
+            self.submit_command(session, argparse.Namespace(
+                command="record", action="stop", seconds=None),
+                stop_of=command_id)
+        timer = threading.Timer(seconds, stop)
+        timer.daemon = True
+        timer.name = "control-stop-timer"
+        with self._timers_lock:
+            self._timers.add(timer)
+        timer.start()
+
+    def _announce(self, future: concurrent.futures.Future) -> None:
+        '''
+        Calls the result listeners with a finished command's result
+        '''
+        result = future.result()
+        for listener in self._listeners:
+            listener(result)
+
+
+class ControlServer:
+    '''
+    A localhost HTTP and WebSocket server to control the GoPro from other
+    programs
+
+    REST endpoints send recording, photo, settings, and offload commands
+    through an ordered command queue, and a WebSocket at /events streams the
+    parts of the GoPro status that changed. Every client is served on its
+    own thread, so slow clients do not block each other or the GUI.
+
+    Only programs on the same computer can send commands. Requests must be
+    addressed to 127.0.0.1 or localhost, so a web page cannot reach the
+    server through a DNS name pointed at 127.0.0.1, requests from a web page
+    that is not served from localhost are refused, and POST bodies must be
+    sent as application/json, which a web page can only send after the
+    browser checks with the server first.
+
+    Attributes
+    ----------
+    STATUS_INTERVAL: float
+        The seconds between status checks for the WebSocket
+    CLIENT_BACKLOG: int
+        The most messages waiting to be sent to one WebSocket client before
+        it is dropped as too slow
+    session: CameraSession
+        The session the commands are run on
+    queue: CommandQueue
+        Runs the commands in order, and can be shared with other sources of
+        commands
+    port: int
+        The port the server listens on
+    on_command: Callable[[dict], None] or None
+        Called on the queue thread with the result of every command, including
+        the stop of a recording started with seconds
+
+    Methods
+    -------
+    __init__(session, port, on_command, command_queue)
+        Starts the server
+    close()
+        Stops the server
+    broadcast(message)
+        Sends a message to every WebSocket client
+
+    See Also
+    --------
+    run_command
+
+    Notes
+    -----
+    - GET /status: The full status of the GoPro
+    - POST /record: {"action": "start" or "stop", "seconds": float}, where
+      seconds queues a stop command once they are up
+    - POST /photo: Takes a photo
+    - POST /hilight: Tags a HiLight timed from when the request arrived
+    - POST /settings: {"resolution": str, "fps": str, "fov": str}
+    - POST /offload: {"group": str, "timestamp": bool}
+    - GET /events: A WebSocket of {"event": "status", "changes": {...}}
+      messages and {"event": "result", ...} messages for every command
+
+    Body values other than the record action are optional, and POST requests
+    need the "Content-Type: application/json" header even without a body.
+    Requests with another Host than 127.0.0.1:<port> or localhost:<port>, or
+    an Origin that is not on 127.0.0.1 or localhost, are answered with 403.
+    Commands wait for their result unless ?wait=0 is added, which answers
+    with 202 and the command id right away so the result can be read from
+    the WebSocket.
+    Every result has the milliseconds it was queued for, ran for, and took in
+    total.
+    '''
+    STATUS_INTERVAL = 1.0
+    CLIENT_BACKLOG = 100
+
+    def __init__(self, session, port: int = 8765, on_command=None,
+                 command_queue: CommandQueue | None = None) -> None:
+        '''
+        Starts the server
+
+        Parameters
+        ----------
+        session: CameraSession
+            The session the commands are run on
+        port: int, default=8765
+            The port to listen on, or 0 for any free port
+        on_command: Callable[[dict], None], optional
+            Called on the queue thread with the result of every command, for
+            example to update the GUI
+        command_queue: CommandQueue, optional
+            The queue to run the commands on, so commands from elsewhere are
+            run in order with them. A new queue is used if not given, and
+            only that queue is closed with the server.
+        '''
+        self.session = session
+        self._owns_queue = command_queue is None
+        self.queue = command_queue or CommandQueue(session.command_metrics)
+        self.queue.add_result_listener(self._announce)
+        self.on_command = on_command
+        self._clients = set()
+        self._clients_lock = threading.Lock()
+        self._last_status = {}
+        self._stopped = threading.Event()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server._handle(self, "GET")
+
+            def do_POST(self):
+                server._handle(self, "POST")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", port),
+                                                       Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True,
+                         name="control-server").start()
+        threading.Thread(target=self._watch_status, daemon=True,
+                         name="control-status").start()
+
+    def close(self) -> None:
+        '''
+        Stops the server
+        '''
+        self._stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+        if self._owns_queue:
+            self.queue.close()
+
+    def broadcast(self, message: dict) -> None:
+        '''
+        Sends a message to every WebSocket client
+
+        The message is only queued for each client, so a slow client never
+        holds up the command queue. Clients that fall too far behind are
+        dropped.
+
+        Parameters
+        ----------
+        message: dict
+            The message, sent as JSON
+        '''
+        frame = _websocket_frame(json.dumps(message, default=str).encode())
+        with self._clients_lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.put_nowait(frame)
+            except queue.Full:
+                with self._clients_lock:
+                    self._clients.discard(client)
+                # Wake the client's thread so it closes the connection
+                with client.mutex:
+                    client.queue.clear()
+                client.put_nowait(None)
+
+    def _handle(self, request, method: str) -> None:
+        '''
+        Answers one request
+        '''
+        url = urllib.parse.urlsplit(request.path)
+        query = urllib.parse.parse_qs(url.query)
+        if not self._is_local(request):
+            _send_json(request, 403, {"ok": False,
+                                      "error": "Only local programs can send "
+                                      "commands"})
+            return
+        if method == "GET" and url.path == "/events":
+            self._stream_events(request)
+            return
+        if method == "GET" and url.path == "/status":
+            arguments = argparse.Namespace(command="status")
+        elif method == "POST" and url.path in ("/record", "/photo", "/hilight",
+                                               "/settings", "/offload"):
+            content_type = request.headers.get("Content-Type", "")
+            if content_type.split(";")[0].strip().lower() !=\
+                    "application/json":
+                _send_json(request, 415, {
+                    "ok": False,
+                    "error": "The Content-Type must be application/json"})
+                return
+            try:
+                body = _read_json(request)
+                arguments = _command_arguments(url.path[1:], body)
+            except (ValueError, KeyError) as error:
+                _send_json(request, 400, {"ok": False, "error": str(error)})
+                return
+        else:
+            _send_json(request, 404, {"ok": False, "error": "Not found"})
+            return
+        if not self.session.is_connected():
+            _send_json(request, 409, {"ok": False,
+                                      "error": "The GoPro is not connected"})
+            return
+
+        command_id, future = self.queue.submit_command(self.session,
+                                                       arguments)
+        if query.get("wait") == ["0"]:
+            _send_json(request, 202, {"id": command_id, "queued": True})
+            return
+        result = future.result()
+        _send_json(request, 200 if result["ok"] else 500, result)
+
+    def _is_local(self, request) -> bool:
+        '''
+        Checks that a request is addressed to this server by a local program
+        '''
+        host = request.headers.get("Host", "")
+        if host not in (f"127.0.0.1:{self.port}", f"localhost:{self.port}"):
+            return False
+        origin = request.headers.get("Origin")
+        if origin is None:
+            # Not sent by a web page
+            return True
+        try:
+            hostname = urllib.parse.urlsplit(origin).hostname
+        except ValueError:
+            return False
+        return hostname in LOCAL_HOSTS
+
+    def _announce(self, result: dict) -> None:
+        '''
+        Tells the listeners and WebSocket clients about a finished command
+        '''
+        if self.on_command is not None:
+            self.on_command(result)
+        self.broadcast({"event": "result", **result})
+
+    def _stream_events(self, request) -> None:
+        '''
+        Upgrades a request to a WebSocket and keeps it open for broadcasts
+        '''
+        key = request.headers.get("Sec-WebSocket-Key")
+        if key is None or\
+                request.headers.get("Upgrade", "").lower() != "websocket":
+            _send_json(request, 400, {"ok": False,
+                                      "error": "Expected a WebSocket"})
+            return
+        accept = base64.b64encode(hashlib.sha1(
+            (key + "258EAFA5-E914-47DA-95CA-C5AB0DC85B11").encode()).digest())
+        request.send_response(101, "Switching Protocols")
+        request.send_header("Upgrade", "websocket")
+        request.send_header("Connection", "Upgrade")
+        request.send_header("Sec-WebSocket-Accept", accept.decode())
+        request.end_headers()
+        request.wfile.flush()
+
+        client = queue.Queue(maxsize=self.CLIENT_BACKLOG)
+        # New clients start with the whole status
+        client.put(_websocket_frame(json.dumps(
+            {"event": "status", "changes": self._last_status},
+            default=str).encode()))
+        with self._clients_lock:
+            self._clients.add(client)
+        threading.Thread(target=_wait_for_close,
+                         args=(request.rfile, client), daemon=True,
+                         name="control-client").start()
+        try:
+            # Send the queued messages until the client closes or is dropped
+            while (frame := client.get()) is not None:
+                request.wfile.write(frame)
+                request.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            with self._clients_lock:
+                self._clients.discard(client)
+            request.close_connection = True
+
+    def _watch_status(self) -> None:
+        '''
+        Checks the status through the queue and broadcasts what changed
+        '''
+        while not self._stopped.wait(self.STATUS_INTERVAL):
+            if not self._clients or not self.session.is_connected():
+                continue
+            result = self.queue.submit(
+                "status", run_command, self.session,
+                argparse.Namespace(command="status")).result()
+            if not result["ok"]:
+                continue
+            status = result["status"]
+            changes = {key: value for key, value in status.items()
+                       if self._last_status.get(key) != value}
+            self._last_status = status
+            if changes:
+                self.broadcast({"event": "status", "changes": changes})
+
+
+def _command_arguments(command: str, body: dict) -> argparse.Namespace:
+    '''
+    The parsed command for a POST request body
+
+    Raises
+    ------
+    ValueError
+        If the body is missing a needed value
+    '''
+    match command:
+        case "record":
+            if body.get("action") not in ("start", "stop"):
+                raise ValueError("action must be \"start\" or \"stop\"")
+            return argparse.Namespace(command="record",
+                                      action=body["action"],
+                                      seconds=body.get("seconds"))
+        case "photo":
+            count = body.get("count", 1)
+            if not isinstance(count, int) or count < 1:
+                raise ValueError("count must be a positive whole number")
+            return argparse.Namespace(command="photo", count=count)
+        case "settings":
+            return argparse.Namespace(command="settings",
+                                      resolution=body.get("resolution"),
+                                      fps=body.get("fps"),
+                                      fov=body.get("fov"))
+        case "hilight":
+            # Timed from now so waiting in the queue does not move the tag
+            return argparse.Namespace(command="hilight",
+                                      at=time.perf_counter())
+        case "offload":
+            return argparse.Namespace(command="offload",
+                                      group=body.get("group", ""),
+                                      timestamp=bool(body.get("timestamp")))
+    return argparse.Namespace(command=command)
+
+
+def _read_json(request) -> dict:
+    '''
+    The JSON body of a request, or an empty dictionary if there is none
+    '''
+    length = int(request.headers.get("Content-Length", 0))
+    if length == 0:
+        return {}
+    body = json.loads(request.rfile.read(length))
+    if not isinstance(body, dict):
+        raise ValueError("The body must be a JSON object")
+    return body
+
+
+def _send_json(request, status: int, body: dict) -> None:
+    '''
+    Answers a request with a JSON body
+    '''
+    data = json.dumps(body, default=str).encode()
+    request.send_response(status)
+    request.send_header("Content-Type", "application/json")
+    request.send_header("Content-Length", str(len(data)))
+    if "latency" in body:
+        request.send_header("Server-Timing",
+                            f"total;dur={body['latency']['total_ms']:.1f}")
+    request.end_headers()
+    request.wfile.write(data)
+
+
+def _websocket_frame(payload: bytes) -> bytes:
+    '''
+    A WebSocket text frame from the server, which is never masked
+    '''
+    if len(payload) < 126:
+        header = struct.pack("!BB", 0x81, len(payload))
+    elif len(payload) < 1 << 16:
+        header = struct.pack("!BBH", 0x81, 126, len(payload))
+    else:
+        header = struct.pack("!BBQ", 0x81, 127, len(payload))
+    return header + payload
+
+
+def _wait_for_close(stream, client: queue.Queue) -> None:
+    '''
+    Reads WebSocket frames from a client until it closes, then stops its
+    sending thread. Messages from the client are ignored.
+    '''
+    try:
+        while _read_websocket_frame(stream) != 0x8:
+            pass
+    except (OSError, ValueError, struct.error):
+        pass
+    with client.mutex:
+        client.queue.clear()
+    client.put(None)
+
+
+def _read_websocket_frame(stream) -> int:
+    '''
+    Reads one WebSocket frame from a client and returns its opcode
+    '''
+    first, second = struct.unpack("!BB", stream.read(2))
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack("!H", stream.read(2))[0]
+    elif length == 127:
+        length = struct.unpack("!Q", stream.read(8))[0]
+    if second & 0x80:
+        stream.read(4)
+    stream.read(length)
+    return first & 0x0F
@@ -0,0 +1,311 @@
+import argparse
+import datetime as dt
+import json
+import os
+import threading
+import time
+
+
+class EventJournal:
+    '''
+    Keeps an append-only record of everything that happens in a session
+
+    Connections, setting changes, recordings, photos, saves, and errors are
+    written as one compact JSON object per line. Logging an event only adds
+    it to a list, and a background thread encodes and writes the list as one
+    block about once a second, so logging costs a few microseconds on the
+    thread that sends GoPro commands. Each file is closed once it reaches a
+    set size and the oldest files are deleted.
+
+    Every block gets a line in an index file next to the journal file with
+    its byte offset, length, first and last event time, and event types, so
+    read_events only reads the blocks that can match a time range or event
+    type instead of parsing every file.
+
+    Attributes
+    ----------
+    MAX_BYTES: int
+        The default size in bytes a file is closed at
+    KEEP_FILES: int
+        The default number of files kept
+    FLUSH_INTERVAL: float
+        The seconds between writes
+    MAX_PENDING: int
+        The most events kept waiting while they cannot be written, such as
+        while the disk is full. The oldest are dropped first.
+    directory: str
+        The folder the journal and index files are written in
+    max_bytes: int
+        The size in bytes a file is closed at
+    keep_files: int
+        The number of journal files kept, oldest deleted first
+    path: str or None
+        The journal file being written, or None before the first write
+    dropped: int
+        The number of events dropped because they could not be written
+
+    Methods
+    -------
+    __init__(directory, max_bytes, keep_files)
+        Starts the writing thread
+    log(event, **fields)
+        Adds an event to the journal
+    flush()
+        Writes every logged event now
+    close()
+        Writes every logged event and stops the writing thread
+
+    See Also
+    --------
+    read_events
+    '''
+    MAX_BYTES = 10 * 1024 * 1024
+    KEEP_FILES = 20
+    FLUSH_INTERVAL = 1.0
+    MAX_PENDING = 100000
+
+    def __init__(self, directory: str = "../Metrics/events",
+                 max_bytes: int = MAX_BYTES,
+                 keep_files: int = KEEP_FILES) -> None:
+        '''
+        Starts the writing thread
+
+        Parameters
+        ----------
+        directory: str, default="../Metrics/events"
+            The folder the journal and index files are written in
+        max_bytes: int, default=MAX_BYTES
+            The size in bytes a file is closed at
+        keep_files: int, default=KEEP_FILES
+            The number of journal files kept, oldest deleted first
+        '''
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.keep_files = keep_files
+        self.path = None
+        self.dropped = 0
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="event-journal")
+        self._thread.start()
+
+    def log(self, event: str, **fields) -> None:
+        '''
+        Adds an event to the journal
+
+        Can be called from any thread. The event is written within
+        FLUSH_INTERVAL seconds.
+
+        Parameters
+        ----------
+        event: str
+            The type of the event, such as "record_start"
+        **fields
+            Values saved with the event. Values that are not JSON types are
+            saved as strings.
+
+        Raises
+        ------
+        ValueError
+            If a field is named "t" or "e", which hold the time and type
+        '''
+        if "t" in fields or "e" in fields:
+            raise ValueError("The fields \"t\" and \"e\" hold the time "
+                             "and type of the event")
+        with self._pending_lock:
+            self._pending.append((time.time(), event, fields))
+
+    def flush(self) -> None:
+        '''
+        Writes every logged event now
+
+        If they cannot be written, they are kept to be written with the next
+        events, up to MAX_PENDING.
+
+        Raises
+        ------
+        OSError
+            If the events could not be written
+        '''
+        with self._pending_lock:
+            events, self._pending = self._pending, []
+        if not events:
+            return
+        try:
+            self._write(events)
+        except OSError:
+            with self._pending_lock:
+                self._pending[:0] = events
+                extra = len(self._pending) - self.MAX_PENDING
+                if extra > 0:
+                    del self._pending[:extra]
+                    self.dropped += extra
+            raise
+
+    def close(self) -> None:
+        '''
+        Writes every logged event and stops the writing thread
+        '''
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+
+    def _run(self) -> None:
+        '''
+        Writes the logged events every FLUSH_INTERVAL seconds until closed
+        '''
+        while not self._stopped.wait(self.FLUSH_INTERVAL):
+            try:
+                self.flush()
+            except OSError:
+                # Keep the events and try again if the disk is full for a
+                # while
+                pass
+
+    def _write(self, events: list) -> None:
+        '''
+        Writes events as one block and adds the block to the index
+        '''
+        lines = []
+        for moment, event, fields in events:
+            record = {"t": round(moment, 3), "e": event}
+            record.update(fields)
+            lines.append(json.dumps(record, separators=(",", ":"),
+                                    default=str))
+        block = ("\n".join(lines) + "\n").encode()
+        with self._write_lock:
+            if self.path is None or\
+                    os.path.getsize(self.path) + len(block) > self.max_bytes:
+                self._rotate()
+            with open(self.path, "ab") as journal_file:
+                offset = journal_file.tell()
+                journal_file.write(block)
+            # The times are rounded like the events' own, so a time range
+            # from the index matches the events in it
+            entry = {"offset": offset, "length": len(block),
+                     "first": round(events[0][0], 3),
+                     "last": round(events[-1][0], 3),
+                     "events": sorted({event for _, event, _ in events})}
+            # The index is written after the block so it never points past
+            # the end of the journal
+            with open(_index_path(self.path), "a") as index_file:
+                index_file.write(json.dumps(entry, separators=(",", ":")) +
+                                 "\n")
+
+    def _rotate(self) -> None:
+        '''
+        Starts a new journal file and deletes the oldest ones
+        '''
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        stamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+        self.path = os.path.join(self.directory, f"events_{stamp}.jsonl")
+        open(self.path, "ab").close()
+        for old in _journal_files(self.directory)[:-self.keep_files]:
+            for path in (old, _index_path(old)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def read_events(directory: str = "../Metrics/events",
+                start: float | None = None, end: float | None = None,
+                events=None):
+    '''
+    Reads the events in a time range or of some types from a journal
+
+    Only the blocks whose index entry overlaps the time range and has one of
+    the event types are read, so a short range or a rare event type is found
+    without parsing every file.
+
+    Parameters
+    ----------
+    directory: str, default="../Metrics/events"
+        The folder of the journal
+    start: float, optional
+        The earliest time.time() of an event to read
+    end: float, optional
+        The latest time.time() of an event to read
+    events: Iterable[str], optional
+        The event types to read. Every type is read if not given.
+
+    Returns
+    -------
+    Iterator[dict]
+        Each matching event in the order it was logged, with its time as "t"
+        and its type as "e"
+
+    See Also
+    --------
+    EventJournal
+    '''
+    events = None if events is None else set(events)
+    for path in _journal_files(directory):
+        try:
+            with open(_index_path(path), "r") as index_file:
+                blocks = [json.loads(line) for line in index_file]
+        except (OSError, ValueError):
+            continue
+        if not blocks or start is not None and blocks[-1]["last"] < start or\
+                end is not None and blocks[0]["first"] > end:
+            continue
+        with open(path, "rb") as journal_file:
+            for block in blocks:
+                if start is not None and block["last"] < start or\
+                        end is not None and block["first"] > end or\
+                        events is not None and\
+                        events.isdisjoint(block["events"]):
+                    continue
+                journal_file.seek(block["offset"])
+                for line in journal_file.read(block["length"]).splitlines():
+                    record = json.loads(line)
+                    if start is not None and record["t"] < start or\
+                            end is not None and record["t"] > end or\
+                            events is not None and record["e"] not in events:
+                        continue
+                    yield record
+
+
+def _journal_files(directory: str) -> list:
+    '''
+    The journal files in a folder from oldest to newest
+    '''
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name)
+                  for name in os.listdir(directory)
+                  if name.startswith("events_") and name.endswith(".jsonl"))
+
+
+def _index_path(path: str) -> str:
+    '''
+    The index file of a journal file
+    '''
+    return path[:-len(".jsonl")] + ".idx"
+
+
+def _timestamp(text: str) -> float:
+    '''
+    The time.time() of an ISO date and time from the command line
+    '''
+    return dt.datetime.fromisoformat(text).timestamp()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Print the events of a session journal as JSON lines")
+    parser.add_argument("--directory", default="../Metrics/events",
+                        help="folder of the journal")
+    parser.add_argument("--since", type=_timestamp, default=None,
+                        help="earliest time, such as 2024-05-01T09:30")
+    parser.add_argument("--until", type=_timestamp, default=None,
+                        help="latest time, such as 2024-05-01T12:00")
+    parser.add_argument("--event", action="append", default=None,
+                        help="event type to print, can be given more than "
+                        "once")
+    arguments = parser.parse_args()
+    for record in read_events(arguments.directory, arguments.since,
+                              arguments.until, arguments.event):
+        print(json.dumps(record))
@@ -0,0 +1,569 @@
+import concurrent.futures
+import datetime as dt
+import time
+
+from instrumentation import append_csv_row
+
+
+class FleetResponse:
+    '''
+    The combined response of a command sent to every GoPro in a fleet
+
+    Behaves like a single GoPro response so the app can use a fleet the same
+    way as one GoPro. For statuses, the data is the worst value over the
+    GoPros: the lowest number, or True if any GoPro reports True. For other
+    commands, the data is the data of each GoPro by name.
+
+    Attributes
+    ----------
+    responses: Dict[str, Response]
+        The response of each GoPro that answered by name
+    errors: Dict[str, Exception]
+        The error of each GoPro that raised one by name
+    is_ok: bool
+        True if every GoPro accepted the command
+    data: dict
+        The combined data
+    '''
+    def __init__(self, responses: dict, errors: dict,
+                 combine_status: bool) -> None:
+        self.responses = responses
+        self.errors = errors
+        self.is_ok = not errors and all(
+            getattr(response, "is_ok", True)
+            for response in responses.values())
+        if combine_status:
+            self.data = _worst_status(responses)
+        else:
+            self.data = {name: getattr(response, "data", response)
+                         for name, response in responses.items()}
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def values(self):
+        return self.data.values()
+
+
+class TakeTiming:
+    '''
+    When each GoPro in a fleet was told to start recording for one take
+
+    All times are seconds from time.perf_counter, so they can be compared
+    between GoPros but not with the clock on the wall.
+
+    Attributes
+    ----------
+    started: datetime
+        When the take was started
+    deadline: float
+        The time every shutter command was meant to be sent at
+    sends: Dict[str, float]
+        The time the shutter command was sent to each GoPro by name
+    acks: Dict[str, float]
+        The time each GoPro answered the shutter command by name
+    errors: Dict[str, Exception]
+        The error of each GoPro that did not start by name
+
+    Methods
+    -------
+    send_skew()
+        The seconds between the first and last shutter command sent
+    ack_skew()
+        The seconds between the first and last GoPro to answer
+    '''
+    def __init__(self, deadline: float) -> None:
+        self.started = dt.datetime.now()
+        self.deadline = deadline
+        self.sends = {}
+        self.acks = {}
+        self.errors = {}
+
+    def send_skew(self) -> float:
+        '''
+        The seconds between the first and last shutter command sent
+        '''
+        return _spread(self.sends.values())
+
+    def ack_skew(self) -> float:
+        '''
+        The seconds between the first and last GoPro to answer
+
+        The GoPro starts recording when it answers, so this is the closest
+        measure of how far apart the videos start.
+        '''
+        return _spread(self.acks.values())
+
+
+class CameraFleet:
+    '''
+    Controls several GoPros at once
+
+    Connects to every GoPro in parallel and sends each command to all of them
+    at the same time, so starting a recording on many GoPros takes about as
+    long as on one. The fleet can be used in place of a single GoPro: any
+    command reached through ble_command, ble_setting, ble_status, or
+    http_command is sent to every GoPro and returns a FleetResponse.
+
+    Attributes
+    ----------
+    SYNC_LEAD: float
+        The seconds between starting a synchronized start and the moment
+        every shutter command is sent, which gives every thread time to be
+        ready
+    ARM_TIMEOUT: float
+        The longest seconds to wait for the GoPros to stop being busy before
+        a synchronized start
+    SPIN: float
+        The seconds before the deadline each thread stops sleeping and
+        checks the clock in a loop, since sleeping is not precise
+    connection_cache: ConnectionCache
+        Used to connect to each GoPro and to save its information
+    make_gopro: Callable[[str], InstrumentedGoPro]
+        Makes a GoPro object for a GoPro name
+    metrics: CommandMetrics
+        Where the time of each fanned out command is recorded
+    cameras: Dict[str, InstrumentedGoPro]
+        The connected GoPros by name
+    camera_info: Dict[str, dict]
+        The saved information of each connected GoPro by name
+    last_responses: Dict[str, FleetResponse]
+        The last response of each command by its name
+    takes: List[TakeTiming]
+        The timing of every synchronized start
+
+    Methods
+    -------
+    __init__(connection_cache, make_gopro, metrics)
+        Sets up an empty fleet
+    connect(names)
+        Connects to several GoPros in parallel
+    reconnect()
+        Reconnects to every GoPro in the fleet that lost its connection
+    fan_out(command, function)
+        Runs a function on every GoPro in parallel
+    pre_arm(video_group)
+        Gets every GoPro ready to start recording right away
+    synchronized_start(video_group, shutter, lead, pre_armed)
+        Starts recording on every GoPro at the same moment
+    log_take(take, path)
+        Adds the timing of a take to a CSV file
+    close()
+        Disconnects from every GoPro
+    status_summary()
+        The last polled battery and SD card status of each GoPro
+
+    See Also
+    --------
+    CameraSession.connect
+    '''
+    SYNC_LEAD = 0.05
+    ARM_TIMEOUT = 5.0
+    SPIN = 0.002
+
+    def __init__(self, connection_cache, make_gopro, metrics) -> None:
+        '''
+        Sets up an empty fleet
+
+        Parameters
+        ----------
+        connection_cache: ConnectionCache
+            Used to connect to each GoPro and to save its information
+        make_gopro: Callable[[str], InstrumentedGoPro]
+            Makes a GoPro object for a GoPro name
+        metrics: CommandMetrics
+            Where the time of each fanned out command is recorded
+        '''
+        self.connection_cache = connection_cache
+        self.make_gopro = make_gopro
+        self.metrics = metrics
+        self.cameras = {}
+        self.camera_info = {}
+        self.last_responses = {}
+        self.takes = []
+        self._executor = None
+
+    @property
+    def is_ble_connected(self) -> bool:
+        return bool(self.cameras) and all(
+            gopro.is_ble_connected for gopro in self.cameras.values())
+
+    @property
+    def model(self) -> str:
+        '''
+        The model of the first GoPro, which all GoPros are expected to share
+        '''
+        return next(iter(self.camera_info.values()))["model"]
+
+    def connect(self, names: list) -> list:
+        '''
+        Connects to several GoPros in parallel
+
+        Parameters
+        ----------
+        names: List[str]
+            The names of the GoPros to connect to
+
+        Returns
+        -------
+        List[str]
+            The names of the GoPros that did not connect. They are left out
+            of the fleet.
+        '''
+        self._start_executor(len(names))
+        futures = {name: self._executor.submit(self._connect_one, name)
+                   for name in names}
+        missing = []
+        for name, future in futures.items():
+            try:
+                gopro, info = future.result()
+            except Exception:
+                gopro = None
+            if gopro is None:
+                missing.append(name)
+                continue
+            self.cameras[name] = gopro
+            self.camera_info[name] = info
+        return missing
+
+    def reconnect(self) -> bool:
+        '''
+        Reconnects to every GoPro in the fleet that lost its connection
+
+        Returns
+        -------
+        bool
+            True if every GoPro in the fleet is connected, or False if the
+            fleet was closed
+        '''
+        if self._executor is None:
+            # Closed, so there are no threads left to connect with
+            return False
+        lost = [name for name, gopro in self.cameras.items()
+                if not gopro.is_ble_connected]
+        for name in lost:
+            try:
+                self.cameras[name].close()
+            except Exception:
+                # The old connection is already broken
+                pass
+        futures = {name: self._executor.submit(self._connect_one, name)
+                   for name in lost}
+        for name, future in futures.items():
+            try:
+                gopro, info = future.result()
+            except Exception:
+                continue
+            if gopro is not None:
+                self.cameras[name] = gopro
+                self.camera_info[name] = info
+        return self.is_ble_connected
+
+    def fan_out(self, command: str, function) -> FleetResponse:
+        '''
+        Runs a function on every GoPro in parallel
+
+        Parameters
+        ----------
+        command: str
+            The name of the command, used to combine the responses and to
+            record the time it took on every GoPro
+        function: Callable[[InstrumentedGoPro], Response]
+            Sends the command to one GoPro
+
+        Returns
+        -------
+        FleetResponse
+            The combined responses of every GoPro
+        '''
+        start = time.perf_counter()
+        futures = {name: self._executor.submit(function, gopro)
+                   for name, gopro in self.cameras.items()}
+        responses = {}
+        errors = {}
+        for name, future in futures.items():
+            try:
+                responses[name] = future.result()
+            except Exception as error:
+                errors[name] = error
+        response = FleetResponse(responses, errors,
+                                 command.startswith("ble_status."))
+        self.metrics.record(f"fleet.{command}", time.perf_counter() - start,
+                            failed=not response.is_ok)
+        self.last_responses[command] = response
+        return response
+
+    def pre_arm(self, video_group) -> bool:
+        '''
+        Gets every GoPro ready to start recording right away
+
+        Switches every GoPro to video mode and waits until none of them are
+        busy, so the shutter command is not delayed on any of them.
+
+        Parameters
+        ----------
+        video_group: PresetGroup
+            The video preset group from the Open GoPro parameters
+
+        Returns
+        -------
+        bool
+            True if every GoPro is in video mode and not busy
+        '''
+        return not self._arm(video_group)
+
+    def synchronized_start(self, video_group, shutter,
+                           lead: float | None = None,
+                           pre_armed: bool = False) -> TakeTiming:
+        '''
+        Starts recording on every GoPro at the same moment
+
+        Pre-arms every GoPro unless they already are, then has one thread
+        per GoPro wait for a common deadline and send the shutter command at
+        it. The send and answer time
+        of each GoPro are measured so the skew between them is known. A GoPro
+        that could not be pre-armed is not sent the shutter, since it would
+        start late or not at all, and is added to the errors of the take.
+
+        Parameters
+        ----------
+        video_group: PresetGroup
+            The video preset group from the Open GoPro parameters
+        shutter: Toggle
+            The shutter value that starts recording
+        lead: float, optional
+            The seconds from now to the deadline. Defaults to SYNC_LEAD.
+        pre_armed: bool, default=False
+            If pre_arm was already run, so only the shutter is sent
+
+        Returns
+        -------
+        TakeTiming
+            The send and answer time of each GoPro
+
+        See Also
+        --------
+        TakeTiming.send_skew
+        TakeTiming.ack_skew
+        '''
+        unready = {} if pre_armed else self._arm(video_group)
+        if lead is None:
+            lead = self.SYNC_LEAD
+        # Look up every command before the deadline so the threads only wait
+        shutters = {name: gopro.ble_command.set_shutter
+                    for name, gopro in self.cameras.items()
+                    if name not in unready}
+        take = TakeTiming(time.perf_counter() + lead)
+        take.errors.update(unready)
+
+        def fire(name):
+            _wait_until(take.deadline, self.SPIN)
+            take.sends[name] = time.perf_counter()
+            response = shutters[name](shutter=shutter)
+            take.acks[name] = time.perf_counter()
+            if not getattr(response, "is_ok", True):
+                raise RuntimeError(f"{name} rejected the shutter command")
+            return response
+
+        futures = {name: self._executor.submit(fire, name)
+                   for name in shutters}
+        for name, future in futures.items():
+            try:
+                future.result()
+            except Exception as error:
+                take.errors[name] = error
+        self.metrics.record("fleet.sync.send_skew", take.send_skew())
+        self.metrics.record("fleet.sync.ack_skew", take.ack_skew(),
+                            failed=bool(take.errors))
+        self.takes.append(take)
+        return take
+
+    def log_take(self, take: TakeTiming,
+                 path: str = "../Metrics/take_skew.csv") -> None:
+        '''
+        Adds the timing of a take to a CSV file
+
+        Writes one row for each GoPro with its send and answer time in
+        milliseconds after the deadline, along with the skew of the take.
+
+        Parameters
+        ----------
+        take: TakeTiming
+            The timing from synchronized_start
+        path: str, default="../Metrics/take_skew.csv"
+            The CSV file to add the rows to
+        '''
+        for name in self.cameras:
+            append_csv_row(
+                path, ["take", "camera", "send_ms", "ack_ms", "send_skew_ms",
+                       "ack_skew_ms", "error"],
+                [take.started.isoformat(), name,
+                 _milliseconds(take.sends.get(name), take.deadline),
+                 _milliseconds(take.acks.get(name), take.deadline),
+                 f"{take.send_skew() * 1000:.3f}",
+                 f"{take.ack_skew() * 1000:.3f}", take.errors.get(name, "")])
+
+    def close(self) -> None:
+        '''
+        Disconnects from every GoPro
+        '''
+        for gopro in self.cameras.values():
+            if gopro.is_ble_connected:
+                gopro.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def status_summary(self) -> str:
+        '''
+        The last polled battery and SD card status of each GoPro
+
+        Returns
+        -------
+        str
+            The battery percent and minutes of recording room on the SD card
+            of each GoPro, such as "GoPro 5990: 80% 95m | GoPro 8194: 64% 88m"
+        '''
+        batteries = self.last_responses.get(
+            "ble_status.int_batt_per.get_value")
+        cards = self.last_responses.get("ble_status.video_rem.get_value")
+        parts = []
+        for name in self.cameras:
+            battery = _first_value(batteries, name)
+            card = _first_value(cards, name)
+            battery_text = "?" if battery is None else f"{battery}%"
+            card_text = "?" if card is None else f"{card // 60}m"
+            parts.append(f"{name}: {battery_text} {card_text}")
+        return " | ".join(parts)
+
+    def __getattr__(self, name: str):
+        if name in ("ble_command", "ble_setting", "ble_status",
+                    "http_command"):
+            return _FleetNamespace(self, name)
+        raise AttributeError(name)
+
+    def _arm(self, video_group) -> dict:
+        '''
+        Pre-arms every GoPro and returns the error of each one that is not
+        ready by name
+        '''
+        loaded = self.ble_command.load_preset_group(group=video_group)
+        unready = dict(loaded.errors)
+        for name, response in loaded.responses.items():
+            if not getattr(response, "is_ok", True):
+                unready[name] = RuntimeError(
+                    f"{name} did not switch to video mode")
+        give_up = time.monotonic() + self.ARM_TIMEOUT
+        while True:
+            busy = self.ble_status.system_busy.get_value()
+            waiting = {}
+            for name in self.cameras:
+                if name in unready:
+                    continue
+                value = _first_value(busy, name)
+                if name in busy.errors:
+                    waiting[name] = busy.errors[name]
+                elif value is None or value:
+                    waiting[name] = TimeoutError(f"{name} stayed busy")
+            if not waiting or time.monotonic() > give_up:
+                unready.update(waiting)
+                return unready
+            time.sleep(0.05)
+
+    def _start_executor(self, camera_count: int) -> None:
+        '''
+        Makes a thread for every GoPro so commands run at the same time
+        '''
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(1, camera_count), thread_name_prefix="fleet")
+
+    def _connect_one(self, name: str) -> tuple:
+        '''
+        Connects to one GoPro and saves its information
+        '''
+        gopro = self.connection_cache.connect(name, self.make_gopro,
+                                              metrics=self.metrics)
+        if not gopro.is_ble_connected:
+            return None, None
+        info = self.connection_cache.remember(name, gopro, self.metrics)
+        return gopro, info
+
+
+class _FleetNamespace:
+    '''
+    Sends any command reached through it to every GoPro in a fleet
+    '''
+    def __init__(self, fleet: CameraFleet, path: str) -> None:
+        self._fleet = fleet
+        self._path = path
+
+    def __getattr__(self, name: str):
+        return _FleetNamespace(self._fleet, f"{self._path}.{name}")
+
+    def __call__(self, *args, **kwargs) -> FleetResponse:
+        names = self._path.split(".")
+
+        def send(gopro):
+            target = gopro
+            for name in names:
+                target = getattr(target, name)
+            return target(*args, **kwargs)
+        return self._fleet.fan_out(self._path, send)
+
+
+def _worst_status(responses: dict) -> dict:
+    '''
+    Combines status responses into the worst value of each status
+    '''
+    combined = {}
+    for response in responses.values():
+        if not getattr(response, "is_ok", True):
+            continue
+        for key, value in response.data.items():
+            if key not in combined:
+                combined[key] = value
+            elif isinstance(value, bool):
+                combined[key] = combined[key] or value
+            else:
+                combined[key] = min(combined[key], value)
+    return combined
+
+
+def _wait_until(deadline: float, spin: float) -> None:
+    '''
+    Sleeps until just before a perf_counter time, then checks the clock in a
+    loop until it is reached
+    '''
+    remaining = deadline - time.perf_counter() - spin
+    if remaining > 0:
+        time.sleep(remaining)
+    while time.perf_counter() < deadline:
+        pass
+
+
+def _spread(times) -> float:
+    '''
+    The seconds between the earliest and latest time
+    '''
+    times = list(times)
+    return max(times) - min(times) if times else 0.0
+
+
+def _milliseconds(moment: float | None, deadline: float) -> str:
+    '''
+    The milliseconds from the deadline to a moment, or an empty string
+    '''
+    return "" if moment is None else f"{(moment - deadline) * 1000:.3f}"
+
+
+def _first_value(response: FleetResponse | None, name: str):
+    '''
+    The first value in one GoPro's part of a fleet response
+    '''
+    if response is None or name not in response.responses:
+        return None
+    camera_response = response.responses[name]
+    if not getattr(camera_response, "is_ok", True):
+        return None
+    return next(iter(camera_response.data.values()), None)
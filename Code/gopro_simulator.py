@@ -0,0 +1,737 @@
+import datetime as dt
+import http.server
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+
+
+class SimulatedResponse:
+    '''
+    A response from the simulated GoPro
+
+    Behaves like the responses from the Open GoPro SDK for the parts the app
+    uses. The data can be read with .data or directly like a dictionary.
+
+    Attributes
+    ----------
+    is_ok: bool
+        If the GoPro accepted the command
+    data: dict or str
+        The values returned by the command
+    '''
+    def __init__(self, is_ok: bool = True, data=None) -> None:
+        self.is_ok = is_ok
+        self.data = data if data is not None else {}
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def values(self):
+        return self.data.values()
+
+    def __repr__(self) -> str:
+        return f"SimulatedResponse(is_ok={self.is_ok}, data={self.data})"
+
+
+class SimulatedGoPro:
+    '''
+    A fake WirelessGoPro that runs in the app without a camera
+
+    Implements the parts of the WirelessGoPro interface the app uses so every
+    part of the app can be run and profiled without a GoPro. Every command
+    waits for a configurable latency with random jitter and can be made to
+    fail at random to test how the app handles a GoPro that rejects commands.
+    Videos and photos taken with the shutter are added to a fake media store
+    that can be downloaded over the fake wifi connection.
+
+    Attributes
+    ----------
+    MODEL_NAME: str
+        The model the simulated GoPro reports
+    BATTERY_MINUTES: float
+        The minutes of recording on a full battery
+    CARD_SECONDS: int
+        The seconds of video that fit on an empty SD card
+    IDLE_BATTERY_MINUTES: float
+        The minutes a full battery lasts while awake but not recording
+    FILES_PER_FOLDER: int
+        The files in each DCIM folder before new files go in the next one,
+        such as 101GOPRO after 100GOPRO
+    target: str or None
+        The name of the GoPro, such as "GoPro 5990"
+    ble_latency: float
+        The average seconds each bluetooth command takes
+    http_latency: float
+        The average seconds each wifi command takes
+    connect_latency: float
+        The seconds open takes to connect
+    idle_timeout: float
+        The seconds without a command before the GoPro saves power, or 0 to
+        stay awake
+    wake_latency: float
+        The extra seconds the first command after saving power takes
+    clock_offset: float
+        The seconds the GoPro's clock is ahead of the computer's
+    jitter: float
+        The most seconds a latency can randomly change by
+    failure_rate: float
+        The chance from 0 to 1 that a command is rejected
+    download_rate: float
+        The bytes per second files download at
+    enable_wifi: bool
+        If the wifi commands can be used
+    file_size: int
+        The number of bytes in each new media file
+    media: List[dict]
+        The files on the SD card with their DCIM folder, name, creation
+        time, and size
+    hilights: List[float]
+        The seconds into the recording of each HiLight tagged
+    ble_setting: SimulatedSettings
+        The video settings of the simulated GoPro
+    ble_command: SimulatedCommands
+        The bluetooth commands of the simulated GoPro
+    ble_status: SimulatedStatuses
+        The bluetooth statuses of the simulated GoPro
+    http_command: SimulatedHttpCommands
+        The wifi commands of the simulated GoPro
+
+    Methods
+    -------
+    __init__(target, ble_latency, http_latency, connect_latency,
+             idle_timeout, wake_latency, clock_offset, jitter, failure_rate,
+             seed, media_count, file_size, download_rate, enable_wifi)
+        Sets up the simulated GoPro
+    open(timeout, retries)
+        Connects to the simulated GoPro
+    close()
+        Disconnects from the simulated GoPro
+    drop_connection()
+        Makes the simulated GoPro lose its connection
+    battery_percent()
+        The simulated battery percentage from 0 to 1
+    delete_media(path)
+        Deletes a file from the fake SD card, standing in for the GoPro's
+        HTTP delete endpoint
+
+    See Also
+    --------
+    GoProApp
+
+    Notes
+    -----
+    Passing a seed makes the latencies and failures repeat exactly between
+    runs so performance changes can be compared.
+    '''
+    MODEL_NAME = "HERO10 Black"
+    BATTERY_MINUTES = 90.0
+    CARD_SECONDS = 4 * 60 * 60
+    IDLE_BATTERY_MINUTES = 600.0
+    FILES_PER_FOLDER = 999
+
+    def __init__(self, target: str | None = None, ble_latency: float = 0.05,
+                 http_latency: float = 0.02, connect_latency: float = 1.0,
+                 idle_timeout: float = 0.0, wake_latency: float = 0.5,
+                 clock_offset: float = 0.0, jitter: float = 0.01,
+                 failure_rate: float = 0.0, seed: int | None = None,
+                 media_count: int = 0,
+                 file_size: int = 1024 * 1024,
+                 download_rate: float = 20e6,
+                 enable_wifi: bool = True) -> None:
+        '''
+        Sets up the simulated GoPro
+
+        Parameters
+        ----------
+        target: str, optional
+            The name of the GoPro, such as "GoPro 5990"
+        ble_latency: float, default=0.05
+            The average seconds each bluetooth command takes
+        http_latency: float, default=0.02
+            The average seconds each wifi command takes
+        connect_latency: float, default=1.0
+            The seconds open takes to connect
+        idle_timeout: float, default=0.0
+            The seconds without a command before the GoPro saves power, like
+            a real GoPro between takes. 0 keeps it awake.
+        wake_latency: float, default=0.5
+            The extra seconds the first command after saving power takes
+        clock_offset: float, default=0.0
+            The seconds the GoPro's clock is ahead of the computer's until it
+            is set. Its clock counts local time as if it were UTC, like the
+            creation times of a real GoPro's media.
+        jitter: float, default=0.01
+            The most seconds a latency can randomly change by
+        failure_rate: float, default=0.0
+            The chance from 0 to 1 that a command is rejected
+        seed: int, optional
+            The seed for the random latencies and failures
+        media_count: int, default=0
+            The number of videos already on the SD card
+        file_size: int, default=1048576
+            The number of bytes in each new media file
+        download_rate: float, default=20e6
+            The bytes per second files download at
+        enable_wifi: bool, default=True
+            If the wifi commands can be used, like the enable_wifi option of
+            WirelessGoPro
+        '''
+        self.target = target
+        self.ble_latency = ble_latency
+        self.http_latency = http_latency
+        self.connect_latency = connect_latency
+        self.idle_timeout = idle_timeout
+        self.wake_latency = wake_latency
+        self.clock_offset = clock_offset + _utc_offset()
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.file_size = file_size
+        self.download_rate = download_rate
+        self.enable_wifi = enable_wifi
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._connected = False
+        self._battery_used = 0.0
+        self._recording_since = None
+        self._recording_created = 0
+        self._busy_until = 0.0
+        self._last_command = time.monotonic()
+        self._file_number = 1
+        self.preset_group = "VIDEO"
+        self.settings = {}
+        self.media = []
+        self.hilights = []
+        for _ in range(media_count):
+            self._add_media("MP4")
+
+        self.ble_setting = SimulatedSettings(self)
+        self.ble_command = SimulatedCommands(self)
+        self.ble_status = SimulatedStatuses(self)
+        self.http_command = SimulatedHttpCommands(self)
+
+    @property
+    def is_ble_connected(self) -> bool:
+        return self._connected
+
+    @property
+    def is_http_connected(self) -> bool:
+        return self._connected and self.enable_wifi
+
+    @property
+    def identifier(self) -> str:
+        return (self.target or "GoPro 0000")[-4:]
+
+    def open(self, timeout: int = 10, retries: int = 5) -> None:
+        '''
+        Connects to the simulated GoPro
+
+        Parameters
+        ----------
+        timeout: int, default=10
+            Not used, kept to match WirelessGoPro
+        retries: int, default=5
+            Not used, kept to match WirelessGoPro
+
+        Notes
+        -----
+        With failure injection, the connection can fail without an error
+        like a real GoPro that says it connected when it did not.
+        '''
+        self._wait(self.connect_latency)
+        with self._lock:
+            self._connected = self._random.random() >= self.failure_rate
+            self._last_command = time.monotonic()
+
+    def close(self) -> None:
+        '''
+        Disconnects from the simulated GoPro
+        '''
+        with self._lock:
+            self._connected = False
+
+    def drop_connection(self) -> None:
+        '''
+        Makes the simulated GoPro lose its connection
+
+        Commands sent after this raise a ConnectionError until open is called
+        again, like a GoPro that went out of bluetooth range.
+        '''
+        self.close()
+
+    def battery_percent(self) -> float:
+        '''
+        The simulated battery percentage from 0 to 1
+
+        Returns
+        -------
+        float
+            The battery left after the recording time used so far
+        '''
+        with self._lock:
+            used = self._battery_used
+            if self._recording_since is not None:
+                used += (time.monotonic() - self._recording_since) / 60 /\
+                    self.BATTERY_MINUTES
+            return max(0.0, 1.0 - used)
+
+    def delete_media(self, path: str) -> None:
+        '''
+        Deletes a file from the fake SD card
+
+        The real GoPro deletes files through an HTTP endpoint that is not in
+        the SDK, so this stands in for camera.delete_media and raises the
+        same error.
+
+        Raises
+        ------
+        RuntimeError
+            If the GoPro did not delete the file
+
+        See Also
+        --------
+        CameraSession.delete_media
+        '''
+        response = self._http_call(self.http_latency,
+                                   lambda: self._remove_media(path))
+        if not response.data:
+            # Rejected, or the file is not in that folder
+            raise RuntimeError(f"The GoPro did not delete {path}")
+
+    def _call(self, latency: float, action=None, data=None,
+              needs_idle: bool = False):
+        '''
+        Waits for a command's latency and runs it unless it is rejected
+
+        Commands that need the GoPro to be idle are rejected while it is
+        busy saving a file, like a real GoPro. With an idle timeout, a
+        command sent after the GoPro started saving power waits for it to
+        wake up first.
+        '''
+        if not self._connected:
+            raise ConnectionError("The simulated GoPro is not connected")
+        if self.idle_timeout > 0 and self._wake_up():
+            latency += self.wake_latency
+        self._wait(latency)
+        with self._lock:
+            if self._random.random() < self.failure_rate or\
+                    needs_idle and time.monotonic() < self._busy_until:
+                return SimulatedResponse(is_ok=False)
+            if action is not None:
+                data = action()
+        return SimulatedResponse(data=data)
+
+    def _wake_up(self) -> bool:
+        '''
+        Uses the battery of the time awake since the last command and checks
+        if the GoPro was saving power
+
+        Returns
+        -------
+        bool
+            True if the GoPro has to wake up for this command
+        '''
+        with self._lock:
+            now = time.monotonic()
+            idle = now - self._last_command
+            self._last_command = now
+            self._battery_used += min(idle, self.idle_timeout) / 60 /\
+                self.IDLE_BATTERY_MINUTES
+            return idle > self.idle_timeout and self._recording_since is None
+
+    def _wait(self, latency: float) -> None:
+        '''
+        Sleeps for a latency with random jitter
+        '''
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter, self.jitter)
+        time.sleep(max(0.0, latency + jitter))
+
+    def clock(self) -> float:
+        '''
+        The GoPro's clock in seconds since 1970, counting local time as UTC
+        '''
+        return time.time() + self.clock_offset
+
+    def _add_media(self, extension: str, created: int = 0) -> None:
+        '''
+        Adds a new file to the fake SD card
+
+        Like a real GoPro, the creation time of a video is when it started.
+        '''
+        prefix = "GX01" if extension == "MP4" else "GOPR"
+        folder = 100 + (self._file_number - 1) // self.FILES_PER_FOLDER
+        self.media.append({
+            "d": f"{folder}GOPRO",
+            "n": f"{prefix}{self._file_number:04d}.{extension}",
+            "cre": str(created or int(self.clock())),
+            "s": str(self.file_size),
+        })
+        self._file_number += 1
+
+    def _remove_media(self, path: str) -> bool:
+        '''
+        Removes a file given by its folder and name from the fake SD card,
+        and returns if it was there
+        '''
+        folder, _, name = path.rpartition("/")
+        with self._lock:
+            kept = [file for file in self.media
+                    if (file["d"], file["n"]) != (folder, name)]
+            removed = len(kept) < len(self.media)
+            self.media = kept
+        return removed
+
+    def _http_call(self, latency: float, action=None):
+        '''
+        Runs a wifi command if wifi is enabled
+        '''
+        if not self.enable_wifi:
+            raise ConnectionError("Wifi is not enabled on the simulated GoPro")
+        return self._call(latency, action)
+
+    def _set_shutter(self, enable: bool) -> None:
+        '''
+        Starts or stops a recording or takes a photo
+        '''
+        now = time.monotonic()
+        if self.preset_group == "PHOTO":
+            if enable:
+                self._add_media("JPG")
+                self._busy_until = now + 0.5
+            return
+        if enable and self._recording_since is None:
+            self._recording_since = now
+            self._recording_created = int(self.clock())
+        elif not enable and self._recording_since is not None:
+            self._battery_used += (now - self._recording_since) / 60 /\
+                self.BATTERY_MINUTES
+            self._recording_since = None
+            self._add_media("MP4", self._recording_created)
+            self._busy_until = now + 1.0
+
+
+class SimulatedParams:
+    '''
+    Stands in for open_gopro.Params when controlling a simulated GoPro
+
+    Any parameter, such as SimulatedParams().PresetGroup.PHOTO, is its own
+    name as a string, which is all the simulated GoPro needs. This lets the
+    app run with a simulated GoPro without the Open GoPro SDK installed.
+    '''
+    def __getattr__(self, group: str):
+        return _SimulatedParamGroup()
+
+
+class _SimulatedParamGroup:
+    '''
+    One enum of SimulatedParams
+    '''
+    def __getattr__(self, name: str) -> str:
+        return name
+
+
+def _utc_offset() -> float:
+    '''
+    The seconds the computer's local time is ahead of UTC
+    '''
+    return dt.datetime.now().astimezone().utcoffset().total_seconds()
+
+
+def _name(value) -> str:
+    '''
+    The upper case name of an Open GoPro parameter or of a plain value
+    '''
+    return str(getattr(value, "name", value)).upper()
+
+
+class SimulatedSetting:
+    '''
+    One video setting of the simulated GoPro
+    '''
+    def __init__(self, gopro: SimulatedGoPro, name: str) -> None:
+        self._gopro = gopro
+        self._name = name
+
+    def set(self, value) -> SimulatedResponse:
+        def action():
+            self._gopro.settings[self._name] = value
+        return self._gopro._call(self._gopro.ble_latency, action)
+
+    def get_value(self) -> SimulatedResponse:
+        return self._gopro._call(
+            self._gopro.ble_latency,
+            data={self._name: self._gopro.settings.get(self._name)})
+
+
+class SimulatedSettings:
+    '''
+    The bluetooth settings of the simulated GoPro
+    '''
+    def __init__(self, gopro: SimulatedGoPro) -> None:
+        self.resolution = SimulatedSetting(gopro, "resolution")
+        self.fps = SimulatedSetting(gopro, "fps")
+        self.video_field_of_view = SimulatedSetting(gopro,
+                                                    "video_field_of_view")
+        self.led = SimulatedSetting(gopro, "led")
+
+
+class SimulatedStatus:
+    '''
+    One status of the simulated GoPro
+    '''
+    def __init__(self, gopro: SimulatedGoPro, name: str, read) -> None:
+        self._gopro = gopro
+        self._name = name
+        self._read = read
+
+    def get_value(self) -> SimulatedResponse:
+        return self._gopro._call(self._gopro.ble_latency,
+                                 lambda: {self._name: self._read()})
+
+
+class SimulatedStatuses:
+    '''
+    The bluetooth statuses of the simulated GoPro
+    '''
+    def __init__(self, gopro: SimulatedGoPro) -> None:
+        def video_remaining():
+            recorded = sum(1 for file in gopro.media
+                           if file["n"].endswith("MP4"))
+            return max(0, gopro.CARD_SECONDS - recorded * 60)
+
+        self.int_batt_per = SimulatedStatus(
+            gopro, "int_batt_per",
+            lambda: round(gopro.battery_percent() * 100))
+        self.video_rem = SimulatedStatus(gopro, "video_rem", video_remaining)
+        self.encoding_active = SimulatedStatus(
+            gopro, "encoding_active",
+            lambda: gopro._recording_since is not None)
+        self.system_busy = SimulatedStatus(
+            gopro, "system_busy", lambda: time.monotonic() < gopro._busy_until)
+
+
+class SimulatedCommands:
+    '''
+    The bluetooth commands of the simulated GoPro
+    '''
+    def __init__(self, gopro: SimulatedGoPro) -> None:
+        self._gopro = gopro
+
+    def load_preset_group(self, group) -> SimulatedResponse:
+        def action():
+            self._gopro.preset_group = _name(group)
+        return self._gopro._call(self._gopro.ble_latency, action,
+                                 needs_idle=True)
+
+    def set_shutter(self, shutter) -> SimulatedResponse:
+        return self._gopro._call(
+            self._gopro.ble_latency,
+            lambda: self._gopro._set_shutter(_name(shutter) == "ENABLE"),
+            needs_idle=True)
+
+    def set_date_time(self, date_time: dt.datetime) -> SimulatedResponse:
+        def action():
+            # The GoPro drops the fraction of a second
+            self._gopro.clock_offset = (
+                date_time.replace(microsecond=0, tzinfo=None) -
+                dt.datetime(1970, 1, 1)).total_seconds() - time.time()
+        return self._gopro._call(self._gopro.ble_latency, action)
+
+    def get_date_time(self) -> SimulatedResponse:
+        return self._gopro._call(
+            self._gopro.ble_latency,
+            lambda: dt.datetime(1970, 1, 1) + dt.timedelta(
+                seconds=int(self._gopro.clock())))
+
+    def tag_hilight(self) -> SimulatedResponse:
+        def action():
+            if self._gopro._recording_since is not None:
+                self._gopro.hilights.append(
+                    time.monotonic() - self._gopro._recording_since)
+        return self._gopro._call(self._gopro.ble_latency, action)
+
+    def sleep(self) -> SimulatedResponse:
+        response = self._gopro._call(self._gopro.ble_latency)
+        if response.is_ok:
+            # The GoPro drops the connection when it goes to sleep
+            self._gopro.drop_connection()
+        return response
+
+    def get_hardware_info(self) -> SimulatedResponse:
+        return self._gopro._call(self._gopro.ble_latency, data={
+            "model_name": self._gopro.MODEL_NAME,
+            "serial_number": f"C34{self._gopro.identifier:0>11}",
+            "ap_ssid": self._gopro.target or "GoPro 0000",
+        })
+
+
+class SimulatedHttpCommands:
+    '''
+    The wifi commands of the simulated GoPro
+    '''
+    def __init__(self, gopro: SimulatedGoPro) -> None:
+        self._gopro = gopro
+
+    def get_media_list(self) -> SimulatedResponse:
+        return self._gopro._http_call(
+            self._gopro.http_latency,
+            lambda: {"files": [dict(file) for file in self._gopro.media]})
+
+    def download_file(self, camera_file: str,
+                      local_file: str) -> SimulatedResponse:
+        '''
+        Writes a file of zeros the size of the media file
+
+        Raises
+        ------
+        FileNotFoundError
+            If the file is not on the fake SD card
+        '''
+        sizes = {file["n"]: int(file["s"]) for file in self._gopro.media}
+        if camera_file not in sizes:
+            raise FileNotFoundError(camera_file)
+        response = self._gopro._http_call(
+            self._gopro.http_latency +
+            sizes[camera_file] / self._gopro.download_rate)
+        if response.is_ok:
+            directory = os.path.dirname(local_file)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(local_file, "wb") as media_file:
+                media_file.truncate(sizes[camera_file])
+        return response
+
+    def set_digital_zoom(self, percent: int) -> SimulatedResponse:
+        def action():
+            self._gopro.settings["digital_zoom"] = percent
+        return self._gopro._http_call(self._gopro.http_latency, action)
+
+
+class FakeCameraServer:
+    '''
+    A local HTTP server that serves media like a GoPro's wifi access point
+
+    Answers the Open GoPro media list, media download, and media delete
+    requests on localhost so file saving can be run against several fake
+    GoPros at once without any cameras or wifi. Downloads are sent at a set
+    speed.
+
+    Attributes
+    ----------
+    CHUNK_SIZE: int
+        The bytes sent at a time
+    gopro: SimulatedGoPro
+        The simulated GoPro whose media is served
+    download_rate: float
+        The bytes per second downloads are sent at
+    url: str
+        The base URL of the server, such as "http://127.0.0.1:53012"
+
+    Methods
+    -------
+    __init__(gopro, download_rate, port)
+        Starts serving the media of a simulated GoPro
+    close()
+        Stops the server
+    '''
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, gopro: SimulatedGoPro, download_rate: float = 20e6,
+                 port: int = 0) -> None:
+        '''
+        Starts serving the media of a simulated GoPro
+
+        Parameters
+        ----------
+        gopro: SimulatedGoPro
+            The simulated GoPro whose media is served
+        download_rate: float, default=20e6
+            The bytes per second downloads are sent at
+        port: int, default=0
+            The port to listen on, or 0 for any free port
+        '''
+        self.gopro = gopro
+        self.download_rate = download_rate
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", port),
+                                                       Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True, name="fake-camera")
+        self._thread.start()
+
+    def close(self) -> None:
+        '''
+        Stops the server
+        '''
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handle(self, request) -> None:
+        '''
+        Answers one request
+        '''
+        url = urllib.parse.urlsplit(request.path)
+        if url.path == "/gopro/media/list":
+            folders = {}
+            for file in self.gopro.media:
+                folders.setdefault(file["d"], []).append(
+                    {key: value for key, value in file.items()
+                     if key != "d"})
+            self._send_json(request, {"id": self.gopro.identifier, "media": [
+                {"d": folder, "fs": files}
+                for folder, files in folders.items()]})
+            return
+        if url.path == "/gopro/media/delete/file":
+            path = urllib.parse.parse_qs(url.query).get("path", [""])[0]
+            if not self.gopro._remove_media(path):
+                request.send_error(404)
+                return
+            self._send_json(request, {})
+            return
+
+        prefix = "/videos/DCIM/"
+        sizes = {f"{file['d']}/{file['n']}": int(file["s"])
+                 for file in self.gopro.media}
+        name = url.path[len(prefix):]
+        if not url.path.startswith(prefix) or name not in sizes:
+            request.send_error(404)
+            return
+        request.send_response(200)
+        request.send_header("Content-Length", str(sizes[name]))
+        request.end_headers()
+        remaining = sizes[name]
+        chunk = bytes(self.CHUNK_SIZE)
+        try:
+            while remaining > 0:
+                size = min(remaining, self.CHUNK_SIZE)
+                request.wfile.write(chunk[:size])
+                remaining -= size
+                time.sleep(size / self.download_rate)
+        except (BrokenPipeError, ConnectionResetError):
+            # The download was stopped by the app
+            pass
+
+    @staticmethod
+    def _send_json(request, body: dict) -> None:
+        '''
+        Answers a request with a JSON body
+        '''
+        data = json.dumps(body).encode()
+        request.send_response(200)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
@@ -0,0 +1,315 @@
+import argparse
+import json
+import shlex
+import sys
+import threading
+import time
+
+from camera import add_simulator_arguments, simulator_options_from
+from camera_session import CameraSession
+from connection_supervisor import ConnectionSupervisor
+from control_server import CommandQueue, ControlServer
+from readiness import ReadinessManager
+from sampling_profiler import profiler_from_environment
+from session_commands import JOB_COMMANDS, BackgroundJobs, run_command
+
+
+def build_command_parser(parser: argparse.ArgumentParser) -> None:
+    '''
+    Adds the GoPro commands to a command line parser
+
+    The same commands are used on the command line and, one per line, by the
+    daemon. The commands in JOB_COMMANDS take "start" or "stop". On the
+    command line, start waits for the job to finish, and in the daemon it
+    returns straight away.
+
+    Parameters
+    ----------
+    parser: ArgumentParser
+        The parser to add the commands to
+    '''
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("connect", help="connect and show the GoPro status")
+    commands.add_parser("status", help="show the battery and SD card status")
+    settings = commands.add_parser(
+        "settings", help="set the resolution, frame rate, and field of view")
+    settings.add_argument("--resolution", default=None,
+                          help="resolution label, such as 4K")
+    settings.add_argument("--fps", default=None,
+                          help="frame rate label, such as \"60 fps\"")
+    settings.add_argument("--fov", default=None,
+                          help="field of view label, such as Wide")
+    record = commands.add_parser("record", help="start or stop recording")
+    record.add_argument("action", choices=["start", "stop"],
+                        help="start or stop recording")
+    record.add_argument("--seconds", type=float, default=None,
+                        help="stop recording after this many seconds")
+    photo = commands.add_parser("photo", help="take photos")
+    photo.add_argument("--count", type=int, default=1,
+                       help="number of photos to take back to back")
+    commands.add_parser(
+        "hilight", help="tag a HiLight in the recording and note its time "
+        "for the saved video")
+    clock = commands.add_parser(
+        "clock", help="set the GoPro's clock and measure how far it is from "
+        "the computer's")
+    clock.add_argument("--no-set", action="store_true",
+                       help="only measure the offset without setting the "
+                       "clock")
+    offload = commands.add_parser("offload", help="save out new files")
+    offload.add_argument("--group", default="",
+                         help="folder in the Data folder to save the files in")
+    offload.add_argument("--timestamp", action="store_true",
+                         help="add a timestamp to the front of the file names")
+    timelapse_actions = commands.add_parser(
+        "timelapse", help="take photos at a fixed interval and save them as "
+        "the run goes").add_subparsers(dest="action", required=True)
+    timelapse = timelapse_actions.add_parser(
+        "start", help="start the time-lapse, and on the command line wait "
+        "for it to finish")
+    timelapse_actions.add_parser("stop", help="stop the time-lapse")
+    timelapse.add_argument("--interval", type=float, required=True,
+                           help="seconds between photos")
+    timelapse.add_argument("--count", type=int, default=None,
+                           help="number of photos, or run until stopped")
+    timelapse.add_argument("--group", default="",
+                           help="folder in the Data folder to save the photos "
+                           "in")
+    timelapse.add_argument("--keep-on-card", action="store_true",
+                           help="do not delete photos from the GoPro once "
+                           "they are saved")
+    schedule_actions = commands.add_parser(
+        "schedule", help="record for a few minutes at a time on a repeating "
+        "schedule").add_subparsers(dest="action", required=True)
+    schedule = schedule_actions.add_parser(
+        "start", help="start the schedule, and on the command line wait for "
+        "it to finish")
+    schedule_actions.add_parser("stop", help="stop the schedule")
+    schedule.add_argument("--record-minutes", type=float, required=True,
+                          help="minutes to record in each window")
+    schedule.add_argument("--every-minutes", type=float, required=True,
+                          help="minutes from the start of one window to the "
+                          "next")
+    schedule.add_argument("--count", type=int, default=None,
+                          help="number of windows, or repeat until stopped")
+    schedule.add_argument("--stay-awake", action="store_true",
+                          help="do not put the GoPro to sleep between "
+                          "windows")
+    readiness_actions = commands.add_parser(
+        "readiness", help="compare record start times and battery use with "
+        "and without keep-alives and pre-arming").add_subparsers(
+            dest="action", required=True)
+    readiness = readiness_actions.add_parser(
+        "start", help="start the comparison, and on the command line wait "
+        "for it to finish")
+    readiness_actions.add_parser("stop", help="stop the comparison")
+    readiness.add_argument("--takes", type=int, default=3,
+                           help="recordings started in each mode")
+    readiness.add_argument("--idle", type=float, default=30.0,
+                           help="seconds to wait before each recording")
+    readiness.add_argument("--record-seconds", type=float, default=2.0,
+                           help="seconds to record each take")
+    readiness.add_argument("--keep-alive", type=float,
+                           default=ReadinessManager.KEEP_ALIVE_INTERVAL,
+                           help="seconds between keep-alives when kept ready")
+    daemon = commands.add_parser(
+        "daemon", help="stay connected and run commands read from stdin, one "
+        "per line")
+    daemon.add_argument("--status-interval", type=float, default=0.0,
+                        help="seconds between status lines, or 0 for none")
+    daemon.add_argument("--control-port", type=int, default=None,
+                        help="also accept commands over HTTP on this "
+                        "localhost port")
+    daemon.add_argument("--keep-ready", action="store_true",
+                        help="send keep-alives and pre-arm the GoPro between "
+                        "recordings")
+
+
+def run_daemon(session: CameraSession, parser: argparse.ArgumentParser,
+               status_interval: float,
+               control_port: int | None = None,
+               keep_ready: bool = False) -> None:
+    '''
+    Stays connected and runs commands read from stdin, one per line
+
+    Each command is written like on the command line, such as
+    "record start" or "settings --resolution 4K", and its result is printed
+    as one line of JSON. Commands are run one at a time through the same
+    queue as the control server's, so they never run at the same time as
+    the commands sent over HTTP. A time-lapse, schedule, or readiness
+    comparison is started and stopped with "start" and "stop" and runs in
+    the background instead, so the queue and stdin are free while it runs.
+    The GoPro's clock is synced in the
+    background when the daemon starts, and the connection is restored in the
+    background if it is lost. The daemon stops at the end of stdin or on
+    "quit", or, with a control port, when it is stopped.
+
+    Parameters
+    ----------
+    session: CameraSession
+        The connected session
+    parser: ArgumentParser
+        Parses each command line
+    status_interval: float
+        The seconds between status lines, or 0 for none
+    control_port: int, optional
+        The localhost port to run the control server on
+    keep_ready: bool, default=False
+        If keep-alives are sent and the GoPro is pre-armed between
+        recordings
+
+    See Also
+    --------
+    BackgroundJobs
+    CommandQueue
+    ControlServer
+    ReadinessManager
+    '''
+    supervisor = ConnectionSupervisor(
+        session.is_connected, session.reconnect,
+        on_lost=lambda: print_json({"event": "connection_lost"}),
+        on_recovered=lambda outage: print_json(
+            {"event": "connection_recovered", "outage": outage}))
+    session.command_metrics.add_failure_listener(supervisor.notify_failure)
+    supervisor.start()
+    _start_clock_sync(session)
+    readiness = None
+    if keep_ready:
+        readiness = ReadinessManager(
+            session, on_report=lambda report: print_json(
+                {"event": "readiness", **report}))
+        readiness.start()
+    if status_interval > 0:
+        _start_status_thread(session, status_interval)
+    jobs = BackgroundJobs(session, print_json)
+    command_queue = CommandQueue(session.command_metrics)
+    # Print the stops of recordings started with seconds when they happen
+    command_queue.add_result_listener(
+        lambda result: "stop_of" in result and print_json(result))
+    control_server = None
+    if control_port is not None:
+        control_server = ControlServer(session, control_port,
+                                       command_queue=command_queue)
+        print_json({"event": "control_server", "port": control_server.port})
+    try:
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            if line == "quit":
+                break
+            try:
+                arguments = parser.parse_args(shlex.split(line))
+                if arguments.command == "daemon":
+                    raise ValueError("The daemon is already running")
+                if arguments.command in JOB_COMMANDS:
+                    print_json(jobs.run(arguments))
+                    continue
+                _, future = command_queue.submit_command(session, arguments)
+                print_json(future.result())
+            except SystemExit:
+                # argparse already printed the usage error
+                print_json({"command": line, "ok": False,
+                            "error": "Unknown command"})
+            except Exception as error:
+                print_json({"command": line, "ok": False,
+                            "error": str(error)})
+        # Keep serving the control server after stdin is closed
+        while control_server is not None:
+            time.sleep(1)
+    finally:
+        if control_server is not None:
+            control_server.close()
+        jobs.close()
+        command_queue.close()
+        if readiness is not None:
+            readiness.stop()
+        supervisor.stop()
+
+
+def print_json(result: dict) -> None:
+    '''
+    Prints a result as one line of JSON
+    '''
+    print(json.dumps(result, default=str), flush=True)
+
+
+def _start_clock_sync(session: CameraSession) -> None:
+    '''
+    Syncs the GoPro's clock on another thread and prints the offset
+    '''
+    def sync():
+        try:
+            print_json({"event": "clock", "clock": session.sync_clock()})
+        except Exception as error:
+            print_json({"event": "clock", "error": str(error)})
+    threading.Thread(target=sync, daemon=True, name="clock-sync").start()
+
+
+def _start_status_thread(session: CameraSession, interval: float) -> None:
+    '''
+    Prints the status of the GoPro every interval seconds
+    '''
+    def report():
+        while True:
+            time.sleep(interval)
+            try:
+                print_json({"event": "status", "status": session.status()})
+            except Exception as error:
+                print_json({"event": "status", "error": str(error)})
+    threading.Thread(target=report, daemon=True, name="status").start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Control a GoPro without the GUI. Every command connects "
+        "first and prints its result as JSON.")
+    parser.add_argument("--gopro", default="GoPro 5990",
+                        help="GoPro name, \"All GoPros\", or "
+                        f"\"{CameraSession.FIRST_AVAILABLE}\"")
+    add_simulator_arguments(parser)
+    build_command_parser(parser)
+    arguments = parser.parse_args()
+
+    session = CameraSession(simulator_options_from(arguments))
+    profiler = profiler_from_environment(session.session_id)
+    session.select(arguments.gopro)
+    try:
+        missing = session.connect()
+    except ConnectionError as error:
+        print_json({"command": arguments.command, "ok": False,
+                    "error": str(error)})
+        if profiler is not None:
+            print_json({"event": "profile", "path": profiler.stop()})
+        sys.exit(1)
+    if missing:
+        print_json({"event": "missing", "gopros": missing})
+
+    exit_code = 0
+    try:
+        if arguments.command == "daemon":
+            command_parser = argparse.ArgumentParser(prog="", add_help=False)
+            build_command_parser(command_parser)
+            run_daemon(session, command_parser, arguments.status_interval,
+                       arguments.control_port, arguments.keep_ready)
+        elif arguments.command in JOB_COMMANDS:
+            jobs = BackgroundJobs(session, print_json)
+            result = jobs.run(arguments)
+            if result["ok"] and arguments.action == "start":
+                print_json(result)
+                result = jobs.wait(arguments.command)
+            print_json(result)
+            exit_code = 0 if result["ok"] else 1
+        else:
+            result = run_command(session, arguments)
+            print_json(result)
+            exit_code = 0 if result["ok"] else 1
+    except Exception as error:
+        print_json({"command": arguments.command, "ok": False,
+                    "error": str(error)})
+        exit_code = 1
+    finally:
+        session.close()
+        if profiler is not None:
+            print_json({"event": "profile", "path": profiler.stop()})
+    sys.exit(exit_code)
@@ -0,0 +1,216 @@
+import datetime as dt
+import json
+import os
+import threading
+import time
+
+
+class HilightIndex:
+    '''
+    Remembers when HiLights were tagged in each recording until it is saved
+
+    Each HiLight is timed on the computer the moment it is asked for, as the
+    seconds since the GoPro answered the command that started the recording,
+    so the offsets do not include the time the tag command takes. The takes
+    are kept in a file until their videos are saved. When a video is saved,
+    the take that started closest to the video's creation time is attached
+    to it as a JSON file next to the video, so reviewers can jump straight to
+    each HiLight.
+
+    Attributes
+    ----------
+    MATCH_TOLERANCE: float
+        The most seconds between the start of a take and the creation time of
+        its video
+    path: str
+        The file the takes waiting to be saved are kept in
+    takes: List[dict]
+        The start time and HiLight offsets of every take not saved yet
+    clock_offset: float or None
+        The seconds the GoPro's creation times are ahead of time.time(), set
+        by CameraSession.sync_clock, used to compare creation times with
+        take start times. Until it is set, the creation times are read as
+        the computer's local time, which the GoPro's clock is set to.
+
+    Methods
+    -------
+    __init__(path)
+        Loads the takes waiting to be saved
+    start_take(started)
+        Starts timing HiLights for a new recording
+    tag(at)
+        Adds a HiLight to the current recording
+    end_take()
+        Stops timing HiLights once the recording stops
+    attach(media, saved)
+        Saves the HiLights of each take next to its saved video
+    save()
+        Saves the takes waiting to be saved to a file
+
+    See Also
+    --------
+    CameraSession.tag_hilight
+    '''
+    MATCH_TOLERANCE = 120.0
+
+    def __init__(self, path: str = "../State/hilight_index.json") -> None:
+        '''
+        Loads the takes waiting to be saved
+
+        Parameters
+        ----------
+        path: str, default="../State/hilight_index.json"
+            The file to load and save the takes
+        '''
+        self.path = path
+        self.clock_offset = None
+        self._lock = threading.Lock()
+        self._take = None
+        self._origin = 0.0
+        try:
+            with open(self.path, "r") as index_file:
+                self.takes = json.load(index_file)
+        except (OSError, ValueError):
+            self.takes = []
+
+    def start_take(self, started: float | None = None) -> None:
+        '''
+        Starts timing HiLights for a new recording
+
+        Parameters
+        ----------
+        started: float, optional
+            The time.perf_counter time the recording started. Defaults to
+            now.
+        '''
+        now = time.perf_counter()
+        if started is None:
+            started = now
+        with self._lock:
+            self._origin = started
+            self._take = {"started": time.time() - (now - started),
+                          "hilights": []}
+            self.takes.append(self._take)
+
+    def tag(self, at: float | None = None) -> float | None:
+        '''
+        Adds a HiLight to the current recording
+
+        Parameters
+        ----------
+        at: float, optional
+            The time.perf_counter time the HiLight was asked for, such as when
+            a key was pressed. Defaults to now.
+
+        Returns
+        -------
+        float or None
+            The seconds into the recording, or None if no recording was
+            started since the app connected
+        '''
+        if at is None:
+            at = time.perf_counter()
+        with self._lock:
+            if self._take is None:
+                return None
+            offset = max(0.0, at - self._origin)
+            self._take["hilights"].append(offset)
+            return offset
+
+    def end_take(self) -> None:
+        '''
+        Stops timing HiLights once the recording stops
+
+        Takes without HiLights are dropped since there is nothing to attach.
+        '''
+        with self._lock:
+            if self._take is not None and not self._take["hilights"]:
+                self.takes.remove(self._take)
+            self._take = None
+        self.save()
+
+    def attach(self, media: list, saved: dict) -> dict:
+        '''
+        Saves the HiLights of each take next to its saved video
+
+        Each take is matched with the saved video created closest to its
+        start, within MATCH_TOLERANCE. A recording split into several
+        chapter files is matched with its first chapter. The HiLights are
+        written to "<video>.hilights.json" and the take is removed from the
+        index. Takes that do not match a video are kept for the next save.
+
+        Parameters
+        ----------
+        media: List[dict]
+            The GoPro's media list, with the name "n" and creation time "cre"
+            in seconds since 1970 of each file
+        saved: Dict[str, str]
+            The local path of each video saved just now by its name on the
+            GoPro
+
+        Returns
+        -------
+        Dict[str, List[float]]
+            The HiLight offsets attached to each video by its name on the
+            GoPro
+        '''
+        created = {file["n"]: self._creation_time(file["cre"])
+                   for file in media
+                   if file["n"] in saved and file["n"].endswith(".MP4")}
+        attached = {}
+        with self._lock:
+            for take in list(self.takes):
+                if take is self._take or not created:
+                    continue
+                name = min(created,
+                           key=lambda name: abs(created[name] -
+                                                take["started"]))
+                if abs(created[name] - take["started"]) >\
+                        self.MATCH_TOLERANCE:
+                    continue
+                offsets = attached.setdefault(name, [])
+                offsets.extend(take["hilights"])
+                self.takes.remove(take)
+        for name, offsets in attached.items():
+            with open(saved[name] + ".hilights.json", "w") as sidecar:
+                json.dump({
+                    "file": name,
+                    "hilights": [{"seconds": round(offset, 3),
+                                  "timecode": _timecode(offset)}
+                                 for offset in sorted(offsets)],
+                }, sidecar, indent=4)
+        if attached:
+            self.save()
+        return attached
+
+    def _creation_time(self, created: str | float) -> float:
+        '''
+        The time.time() a file was created from its creation time "cre"
+        '''
+        if self.clock_offset is not None:
+            return float(created) - self.clock_offset
+        # "cre" counts the GoPro's local clock as if it were UTC
+        return dt.datetime.fromtimestamp(float(created), dt.timezone.utc)\
+            .replace(tzinfo=None).timestamp()
+
+    def save(self) -> None:
+        '''
+        Saves the takes waiting to be saved to a file
+        '''
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        temporary_path = self.path + ".tmp"
+        with self._lock:
+            with open(temporary_path, "w") as index_file:
+                json.dump(self.takes, index_file, indent=4)
+            os.replace(temporary_path, self.path)
+
+
+def _timecode(seconds: float) -> str:
+    '''
+    Seconds as HH:MM:SS.mmm for video players
+    '''
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:06.3f}"
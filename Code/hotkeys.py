@@ -0,0 +1,137 @@
+import concurrent.futures
+import datetime as dt
+import time
+
+from instrumentation import append_csv_row
+
+
+class HotkeyController:
+    '''
+    Sends record, photo, and HiLight commands the moment a hotkey is pressed
+
+    The key press only records the time and hands the command to a worker
+    thread, so the command reaches the GoPro before any widget is redrawn.
+    The widgets are updated afterwards by the done listener. The time from
+    the key press to the GoPro's answer is recorded for every press.
+
+    Attributes
+    ----------
+    ACTIONS: Tuple[str]
+        The commands a hotkey can send. "record" starts recording if the
+        GoPro is not recording and stops it if it is.
+    session: CameraSession
+        The connected session the commands are sent on
+    on_done: Callable[[dict], None] or None
+        Called on the worker thread with the result of every press
+    log_path: str
+        The CSV file the latency of every press is added to
+
+    Methods
+    -------
+    __init__(session, on_done, log_path)
+        Starts the worker thread
+    press(action)
+        Sends the command of a hotkey
+    close()
+        Stops the worker thread
+
+    See Also
+    --------
+    GoProApp.hotkey_pressed
+    '''
+    ACTIONS = ("record", "photo", "hilight")
+
+    def __init__(self, session, on_done=None,
+                 log_path: str = "../Metrics/hotkey_latency.csv") -> None:
+        '''
+        Starts the worker thread
+
+        Parameters
+        ----------
+        session: CameraSession
+            The connected session the commands are sent on
+        on_done: Callable[[dict], None], optional
+            Called on the worker thread with the result of every press
+        log_path: str, default="../Metrics/hotkey_latency.csv"
+            The CSV file the latency of every press is added to
+        '''
+        self.session = session
+        self.on_done = on_done
+        self.log_path = log_path
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="hotkey")
+
+    def press(self, action: str) -> concurrent.futures.Future:
+        '''
+        Sends the command of a hotkey
+
+        Presses are sent in order, so pressing the record key twice quickly
+        starts and then stops recording.
+
+        Parameters
+        ----------
+        action: str
+            One of ACTIONS
+
+        Returns
+        -------
+        Future
+            Finishes with the result once the GoPro answers
+
+        Raises
+        ------
+        ValueError
+            If the action is not one of ACTIONS
+        '''
+        pressed = time.perf_counter()
+        if action not in self.ACTIONS:
+            raise ValueError(f"Unknown hotkey action {action}")
+        return self._executor.submit(self._run, action, pressed)
+
+    def close(self) -> None:
+        '''
+        Stops the worker thread after the pressed commands are sent
+        '''
+        self._executor.shutdown(wait=False)
+
+    def _run(self, action: str, pressed: float) -> dict:
+        '''
+        Sends a command and records the time from the key press to the answer
+        '''
+        started = time.perf_counter()
+        result = {"action": action, "ok": True}
+        try:
+            match action:
+                case "record" if self.session.recording:
+                    self.session.stop_recording()
+                case "record":
+                    take = self.session.start_recording()
+                    result["ok"] = take is None or not take.errors
+                case "photo":
+                    self.session.take_photo()
+                case "hilight":
+                    result["offset"] = self.session.tag_hilight(pressed)
+        except Exception as error:
+            result["ok"] = False
+            result["error"] = str(error)
+        answered = time.perf_counter()
+        result["recording"] = self.session.recording
+        result["queued_ms"] = (started - pressed) * 1000
+        result["latency_ms"] = (answered - pressed) * 1000
+        self.session.command_metrics.record(
+            f"hotkey.{action}", answered - pressed, failed=not result["ok"])
+        self._log(result)
+        if self.on_done is not None:
+            self.on_done(result)
+        return result
+
+    def _log(self, result: dict) -> None:
+        '''
+        Adds the latency of a press to the CSV file
+        '''
+        append_csv_row(
+            self.log_path, ["time", "action", "queued_ms", "latency_ms",
+                            "error"],
+            [dt.datetime.now().isoformat(), result["action"],
+             f"{result['queued_ms']:.3f}", f"{result['latency_ms']:.3f}",
+             result.get("error", "")])
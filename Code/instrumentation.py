@@ -0,0 +1,445 @@
+import bisect
+import csv
+import math
+import os
+import threading
+import time
+
+# Buckets for every factor of ten in latency from 0.1 ms to 100 s
+_BUCKETS_PER_DECADE = 20
+_BUCKET_BOUNDS = [1e-4 * 10 ** (index / _BUCKETS_PER_DECADE)
+                  for index in range(6 * _BUCKETS_PER_DECADE + 1)]
+
+
+class LatencyHistogram:
+    '''
+    Fixed size histogram of command latencies
+
+    Latencies are counted in buckets that are spaced logarithmically from 0.1
+    milliseconds to 100 seconds so recording a call only costs a binary search
+    and the memory used does not grow with the number of calls. Percentiles
+    are accurate to the width of a bucket, which is about 12%.
+
+    Attributes
+    ----------
+    BUCKETS_PER_DECADE: int
+        The number of buckets for every factor of ten in latency
+    BOUNDS: List[float]
+        The upper bound of each bucket in seconds
+    counts: List[int]
+        The number of latencies in each bucket with one more bucket for
+        latencies above the last bound
+    count: int
+        The number of latencies recorded
+    total: float
+        The sum of all latencies in seconds
+    minimum: float
+        The shortest latency in seconds
+    maximum: float
+        The longest latency in seconds
+    errors: int
+        The number of calls that failed
+    retries: int
+        The number of calls that repeated a failed call
+
+    Methods
+    -------
+    __init__()
+        Makes an empty histogram
+    record(seconds)
+        Adds a latency to the histogram
+    percentile(fraction)
+        The latency below which a fraction of the calls finished
+    '''
+    BUCKETS_PER_DECADE = _BUCKETS_PER_DECADE
+    BOUNDS = _BUCKET_BOUNDS
+
+    def __init__(self) -> None:
+        '''
+        Makes an empty histogram
+        '''
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = 0.0
+        self.errors = 0
+        self.retries = 0
+
+    def record(self, seconds: float) -> None:
+        '''
+        Adds a latency to the histogram
+
+        Parameters
+        ----------
+        seconds: float
+            The latency of a call in seconds
+        '''
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.minimum = min(self.minimum, seconds)
+        self.maximum = max(self.maximum, seconds)
+
+    def percentile(self, fraction: float) -> float:
+        '''
+        The latency below which a fraction of the calls finished
+
+        Parameters
+        ----------
+        fraction: float
+            The fraction of calls from 0 to 1, such as 0.95 for the p95
+
+        Returns
+        -------
+        float
+            The upper bound of the bucket holding the percentile in seconds,
+            limited to the longest latency seen, or 0 if nothing was recorded
+        '''
+        if self.count == 0:
+            return 0.0
+        target = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                break
+        if index == len(self.BOUNDS):
+            return self.maximum
+        return min(self.BOUNDS[index], self.maximum)
+
+
+class CommandMetrics:
+    '''
+    Latency histograms and error counts for every GoPro command
+
+    Keeps one LatencyHistogram per command name, such as
+    "ble_command.set_shutter", and exports snapshots of them as a CSV file or
+    as a Prometheus textfile. Commands may be recorded from any thread.
+
+    Attributes
+    ----------
+    PERCENTILES: Tuple[float]
+        The percentiles included in snapshots
+    histograms: Dict[str, LatencyHistogram]
+        The histogram for each command name
+
+    Methods
+    -------
+    __init__()
+        Makes an empty set of metrics
+    record(command, seconds, failed)
+        Adds a call of a command
+    record_retry(command)
+        Counts a retry of a command
+    add_failure_listener(listener)
+        Calls a function whenever a command fails
+    snapshot()
+        The current metrics of every command
+    export_csv(path)
+        Writes a snapshot to a CSV file
+    export_prometheus(path)
+        Writes a snapshot to a Prometheus textfile
+
+    See Also
+    --------
+    InstrumentedGoPro
+    '''
+    PERCENTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self) -> None:
+        '''
+        Makes an empty set of metrics
+        '''
+        self.histograms = {}
+        self._failed_last = set()
+        self._failure_listeners = []
+        self._lock = threading.Lock()
+
+    def add_failure_listener(self, listener) -> None:
+        '''
+        Calls a function whenever a command fails
+
+        Parameters
+        ----------
+        listener: Callable[[str, Exception or None], None]
+            Called with the command name and the error it raised, or None if
+            the GoPro rejected it. It is called on the thread that sent the
+            command.
+        '''
+        self._failure_listeners.append(listener)
+
+    def record(self, command: str, seconds: float, failed: bool = False,
+               error: Exception | None = None) -> None:
+        '''
+        Adds a call of a command
+
+        A call that comes right after a failed call of the same command is
+        also counted as a retry.
+
+        Parameters
+        ----------
+        command: str
+            The name of the command
+        seconds: float
+            The wall time latency of the call in seconds
+        failed: bool, default=False
+            If the call raised an error or the GoPro rejected it
+        error: Exception, optional
+            The error the call raised
+        '''
+        with self._lock:
+            histogram = self.histograms.get(command)
+            if histogram is None:
+                histogram = self.histograms[command] = LatencyHistogram()
+            histogram.record(seconds)
+            if command in self._failed_last:
+                histogram.retries += 1
+            if failed:
+                histogram.errors += 1
+                self._failed_last.add(command)
+            else:
+                self._failed_last.discard(command)
+        if failed:
+            for listener in self._failure_listeners:
+                listener(command, error)
+
+    def record_retry(self, command: str) -> None:
+        '''
+        Counts a retry of a command
+
+        Parameters
+        ----------
+        command: str
+            The name of the command
+        '''
+        with self._lock:
+            histogram = self.histograms.get(command)
+            if histogram is None:
+                histogram = self.histograms[command] = LatencyHistogram()
+            histogram.retries += 1
+
+    def snapshot(self) -> list:
+        '''
+        The current metrics of every command
+
+        Returns
+        -------
+        List[dict]
+            One row per command with its name, count, errors, retries, mean,
+            minimum, maximum, and percentiles in seconds
+        '''
+        rows = []
+        with self._lock:
+            for command, histogram in sorted(self.histograms.items()):
+                row = {
+                    "command": command,
+                    "count": histogram.count,
+                    "errors": histogram.errors,
+                    "retries": histogram.retries,
+                    "mean": histogram.total / max(histogram.count, 1),
+                    "min": histogram.minimum if histogram.count else 0.0,
+                    "max": histogram.maximum,
+                    "sum": histogram.total,
+                }
+                for fraction in self.PERCENTILES:
+                    row[f"p{int(fraction * 100)}"] =\
+                        histogram.percentile(fraction)
+                rows.append(row)
+        return rows
+
+    def export_csv(self, path: str) -> None:
+        '''
+        Writes a snapshot to a CSV file
+
+        Parameters
+        ----------
+        path: str
+            The file to write. Its folder is made if it does not exist.
+        '''
+        rows = self.snapshot()
+        fields = ["command", "count", "errors", "retries", "mean", "min",
+                  "max", "sum"] +\
+            [f"p{int(fraction * 100)}" for fraction in self.PERCENTILES]
+        _make_parent_directory(path)
+        with open(path, "w", newline="") as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def export_prometheus(self, path: str) -> None:
+        '''
+        Writes a snapshot to a Prometheus textfile
+
+        The latencies are written as a summary with quantile labels and the
+        errors and retries as counters so the file can be read by the node
+        exporter textfile collector.
+
+        Parameters
+        ----------
+        path: str
+            The file to write. It is written to a temporary file first and
+            then renamed so the collector never reads a partial file.
+        '''
+        lines = [
+            "# HELP gopro_command_latency_seconds Wall time of GoPro "
+            "commands",
+            "# TYPE gopro_command_latency_seconds summary",
+        ]
+        counters = []
+        for row in self.snapshot():
+            label = f'command="{row["command"]}"'
+            for fraction in self.PERCENTILES:
+                lines.append(
+                    f'gopro_command_latency_seconds{{{label},'
+                    f'quantile="{fraction}"}} '
+                    f'{row[f"p{int(fraction * 100)}"]:.6f}')
+            lines.append(
+                f"gopro_command_latency_seconds_sum{{{label}}} "
+                f"{row['sum']:.6f}")
+            lines.append(
+                f"gopro_command_latency_seconds_count{{{label}}} "
+                f"{row['count']}")
+            counters.append((label, row["errors"], row["retries"]))
+        lines.append("# HELP gopro_command_errors_total Failed GoPro commands")
+        lines.append("# TYPE gopro_command_errors_total counter")
+        lines.extend(f"gopro_command_errors_total{{{label}}} {errors}"
+                     for label, errors, _ in counters)
+        lines.append("# HELP gopro_command_retries_total Retried GoPro "
+                     "commands")
+        lines.append("# TYPE gopro_command_retries_total counter")
+        lines.extend(f"gopro_command_retries_total{{{label}}} {retries}"
+                     for label, _, retries in counters)
+
+        _make_parent_directory(path)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "w") as prometheus_file:
+            prometheus_file.write("\n".join(lines) + "\n")
+        os.replace(temporary_path, path)
+
+
+class InstrumentedGoPro:
+    '''
+    Wraps a GoPro so every command it sends is timed
+
+    Looks like the wrapped WirelessGoPro to the rest of the app. Any method
+    reached through ble_command, ble_setting, ble_status, or http_command, as
+    well as open, is timed and recorded in the command metrics under its full
+    name, such as "ble_setting.resolution.set". A call fails if it raises an
+    error or returns a response that is not ok.
+
+    Attributes
+    ----------
+    INSTRUMENTED_NAMESPACES: Tuple[str]
+        The GoPro attributes whose commands are timed
+    INSTRUMENTED_METHODS: Tuple[str]
+        The GoPro methods that are timed directly
+    gopro: WirelessGoPro
+        The wrapped GoPro
+    metrics: CommandMetrics
+        Where the timings are recorded
+
+    Methods
+    -------
+    __init__(gopro, metrics)
+        Wraps a GoPro
+
+    See Also
+    --------
+    CommandMetrics
+    '''
+    INSTRUMENTED_NAMESPACES = ("ble_command", "ble_setting", "ble_status",
+                               "http_command")
+    INSTRUMENTED_METHODS = ("open",)
+
+    def __init__(self, gopro, metrics: CommandMetrics) -> None:
+        '''
+        Wraps a GoPro
+
+        Parameters
+        ----------
+        gopro: WirelessGoPro
+            The GoPro to time the commands of
+        metrics: CommandMetrics
+            Where the timings are recorded
+        '''
+        self.gopro = gopro
+        self.metrics = metrics
+
+    def __getattr__(self, name: str):
+        value = getattr(self.gopro, name)
+        if name in self.INSTRUMENTED_NAMESPACES:
+            return _InstrumentedNamespace(value, name, self.metrics)
+        if name in self.INSTRUMENTED_METHODS:
+            return _timed(value, name, self.metrics)
+        return value
+
+
+class _InstrumentedNamespace:
+    '''
+    Times the methods of a GoPro command namespace and its children
+    '''
+    def __init__(self, namespace, prefix: str,
+                 metrics: CommandMetrics) -> None:
+        self._namespace = namespace
+        self._prefix = prefix
+        self._metrics = metrics
+
+    def __getattr__(self, name: str):
+        value = getattr(self._namespace, name)
+        full_name = f"{self._prefix}.{name}"
+        if callable(value):
+            return _timed(value, full_name, self._metrics)
+        return _InstrumentedNamespace(value, full_name, self._metrics)
+
+
+def _timed(function, name: str, metrics: CommandMetrics):
+    '''
+    Wraps a function so its wall time is recorded under a name
+    '''
+    def timed_function(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        except Exception as error:
+            metrics.record(name, time.perf_counter() - start, failed=True,
+                           error=error)
+            raise
+        metrics.record(name, time.perf_counter() - start,
+                       failed=getattr(result, "is_ok", True) is False)
+        return result
+    return timed_function
+
+
+def append_csv_row(path: str, header: list, row: list) -> None:
+    '''
+    Adds a row to a CSV file that keeps growing over runs
+
+    The file and its folder are made if they do not exist, and a new file
+    starts with the header.
+
+    Parameters
+    ----------
+    path: str
+        The CSV file to add the row to
+    header: List[str]
+        The column names, written only to a new file
+    row: list
+        The values of the row in the order of the header
+    '''
+    _make_parent_directory(path)
+    new_file = not os.path.exists(path)
+    with open(path, "a", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        if new_file:
+            writer.writerow(header)
+        writer.writerow(row)
+
+
+def _make_parent_directory(path: str) -> None:
+    '''
+    Makes the folder a file will be written to if it does not exist
+    '''
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
@@ -0,0 +1,230 @@
+import datetime as dt
+import functools
+import os
+import sys
+import threading
+import time
+import traceback
+
+from instrumentation import append_csv_row
+
+
+class LoopMonitor:
+    '''
+    Finds the callbacks that freeze the window
+
+    A heartbeat is scheduled on the Tk main loop every few milliseconds, and
+    the time it fires late by is how long the loop was blocked. Every beat's
+    lag is recorded in the command metrics as "tk.heartbeat". The app's
+    widget callbacks and the functions run by the TkDispatcher are timed as
+    "tk.<name>", counting only the time they kept the loop from running, so
+    the time a messagebox waits for the user is not counted.
+
+    When a beat is later than the threshold, the loop stalled. A watchdog
+    thread samples the Tk thread's stack while the stall is still happening,
+    so the stack shows where the loop is stuck. Each stall is added to a CSV
+    file and the session journal with the callback running at the time, or
+    the one that blocked the longest since the last beat, and the stack.
+
+    Attributes
+    ----------
+    HEARTBEAT_MS: int
+        The milliseconds between heartbeats
+    STALL_THRESHOLD: float
+        The default seconds of lag that count as a stall
+    root: CTk
+        The app whose main loop is monitored
+    metrics: CommandMetrics
+        Where the heartbeat lag and callback times are recorded
+    threshold: float
+        The seconds of lag that count as a stall
+    journal: EventJournal or None
+        Where each stall is added as a "loop_stall" event
+    log_path: str
+        The CSV file every stall is added to
+    stalls: int
+        The number of stalls so far
+
+    Methods
+    -------
+    __init__(root, metrics, threshold, journal, log_path)
+        Sets up the monitor without starting it
+    start()
+        Starts the heartbeat and the watchdog thread
+    stop()
+        Stops the heartbeat and the watchdog thread
+    wrap(function)
+        Times a callback every time it is called
+    call(function, *args, **kwargs)
+        Runs a function on the Tk thread and times it
+
+    See Also
+    --------
+    TkDispatcher
+    '''
+    HEARTBEAT_MS = 20
+    STALL_THRESHOLD = 0.2
+
+    def __init__(self, root, metrics, threshold: float = STALL_THRESHOLD,
+                 journal=None,
+                 log_path: str = "../Metrics/loop_stalls.csv") -> None:
+        '''
+        Sets up the monitor without starting it
+
+        Parameters
+        ----------
+        root: CTk
+            The app whose main loop is monitored
+        metrics: CommandMetrics
+            Where the heartbeat lag and callback times are recorded
+        threshold: float, default=STALL_THRESHOLD
+            The seconds of lag that count as a stall
+        journal: EventJournal, optional
+            Where each stall is added as a "loop_stall" event
+        log_path: str, default="../Metrics/loop_stalls.csv"
+            The CSV file every stall is added to
+        '''
+        self.root = root
+        self.metrics = metrics
+        self.threshold = threshold
+        self.journal = journal
+        self.log_path = log_path
+        self.stalls = 0
+        self._stopped = threading.Event()
+        self._thread = None
+        self._tk_thread = threading.get_ident()
+        self._last_beat = None
+        self._active = []
+        self._slowest = (0.0, None)
+        self._sample = None
+
+    def start(self) -> None:
+        '''
+        Starts the heartbeat and the watchdog thread
+
+        Must be called on the Tk thread.
+        '''
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._tk_thread = threading.get_ident()
+        self._last_beat = None
+        self.root.after(self.HEARTBEAT_MS, self._beat)
+        self._thread = threading.Thread(target=self._watch, daemon=True,
+                                        name="loop-watchdog")
+        self._thread.start()
+
+    def stop(self) -> None:
+        '''
+        Stops the heartbeat and the watchdog thread
+        '''
+        self._stopped.set()
+
+    def wrap(self, function):
+        '''
+        Times a callback every time it is called
+
+        Parameters
+        ----------
+        function: Callable
+            The callback, such as a bound method of the app
+
+        Returns
+        -------
+        Callable
+            A function that runs the callback through call
+        '''
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            return self.call(function, *args, **kwargs)
+        return timed
+
+    def call(self, function, *args, **kwargs):
+        '''
+        Runs a function on the Tk thread and times it
+
+        Parameters
+        ----------
+        function: Callable
+            The function to run
+        *args
+            The arguments to run the function with
+        **kwargs
+            The keyword arguments to run the function with
+
+        Returns
+        -------
+        Any
+            What the function returned
+        '''
+        name = getattr(function, "__name__", type(function).__name__)
+        started = time.perf_counter()
+        self._active.append(name)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self._active.pop()
+            finished = time.perf_counter()
+            # Only count the time since the loop last ran, since a
+            # messagebox runs the loop while the callback waits for it
+            last_beat = self._last_beat or started
+            blocked = finished - max(started, last_beat)
+            self.metrics.record(f"tk.{name}", blocked)
+            if blocked > self._slowest[0]:
+                self._slowest = (blocked, name)
+
+    def _beat(self) -> None:
+        '''
+        Measures how late the heartbeat is and schedules the next one
+        '''
+        if self._stopped.is_set():
+            return
+        now = time.perf_counter()
+        if self._last_beat is not None:
+            lag = max(0.0, now - self._last_beat - self.HEARTBEAT_MS / 1000)
+            self.metrics.record("tk.heartbeat", lag)
+            if lag > self.threshold:
+                self._stall(lag)
+        self._last_beat = now
+        self._slowest = (0.0, None)
+        self._sample = None
+        self.root.after(self.HEARTBEAT_MS, self._beat)
+
+    def _watch(self) -> None:
+        '''
+        Samples the Tk thread's stack while the loop is stalled
+        '''
+        while not self._stopped.wait(self.threshold / 2):
+            last_beat = self._last_beat
+            if last_beat is None or self._sample is not None or\
+                    time.perf_counter() - last_beat < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._tk_thread)
+            if frame is None:
+                continue
+            active = list(self._active)
+            self._sample = (active[-1] if active else None,
+                            _collapse(traceback.extract_stack(frame)))
+
+    def _stall(self, lag: float) -> None:
+        '''
+        Logs a stall with the callback that caused it
+        '''
+        self.stalls += 1
+        callback, stack = self._sample or (None, "")
+        if callback is None:
+            callback = self._slowest[1] or "unknown"
+        if self.journal is not None:
+            self.journal.log("loop_stall", callback=callback,
+                             seconds=round(lag, 3), stack=stack)
+        append_csv_row(self.log_path, ["time", "callback", "seconds", "stack"],
+                       [dt.datetime.now().isoformat(), callback,
+                        f"{lag:.3f}", stack])
+
+
+def _collapse(stack: traceback.StackSummary) -> str:
+    '''
+    A stack from the outermost call to the innermost as one line
+    '''
+    return ";".join(f"{frame.name} ({os.path.basename(frame.filename)}:"
+                    f"{frame.lineno})" for frame in stack)
@@ -0,0 +1,503 @@
+import argparse
+import concurrent.futures
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+import urllib.parse
+
+
+class CameraEndpoint:
+    '''
+    Where to download the media of one GoPro from
+
+    Every GoPro's wifi access point uses the same address, so each GoPro is
+    reached through its own network interface, such as a USB wifi adapter
+    joined to that GoPro's access point. The interface can be given by name
+    or by the address the computer has on it.
+
+    Attributes
+    ----------
+    DEFAULT_URL: str
+        The address of a GoPro on its own wifi access point
+    CHUNK_SIZE: int
+        The bytes read from the GoPro at a time
+    TIMEOUT: float
+        The seconds to wait for the GoPro to answer
+    serial: str
+        The serial number of the GoPro, which names its folder
+    url: str
+        The base URL of the GoPro's HTTP server
+    interface: str or None
+        The name of the network interface to download through
+    source_address: str or None
+        The address of the computer on the network interface to download
+        through
+
+    Methods
+    -------
+    __init__(serial, url, interface, source_address)
+        Sets up the endpoint
+    media_list()
+        The files on the GoPro's SD card
+    download(directory, file_name, local_file, balancer)
+        Downloads one file from the GoPro
+    delete(directory, file_name)
+        Deletes one file from the GoPro's SD card
+
+    See Also
+    --------
+    OffloadScheduler
+
+    Notes
+    -----
+    Binding to an interface by name only works on Linux and needs the
+    CAP_NET_RAW permission. Binding to a source address works everywhere but
+    needs a route for the GoPro's address through that interface.
+    '''
+    DEFAULT_URL = "http://10.5.5.9:8080"
+    CHUNK_SIZE = 1024 * 1024
+    TIMEOUT = 10.0
+
+    def __init__(self, serial: str, url: str = DEFAULT_URL,
+                 interface: str | None = None,
+                 source_address: str | None = None) -> None:
+        '''
+        Sets up the endpoint
+
+        Parameters
+        ----------
+        serial: str
+            The serial number of the GoPro, which names its folder
+        url: str, default="http://10.5.5.9:8080"
+            The base URL of the GoPro's HTTP server
+        interface: str, optional
+            The name of the network interface to download through
+        source_address: str, optional
+            The address of the computer on the network interface to download
+            through
+        '''
+        self.serial = serial
+        self.url = url
+        self.interface = interface
+        self.source_address = source_address
+
+    def media_list(self) -> list:
+        '''
+        The files on the GoPro's SD card
+
+        Returns
+        -------
+        List[Tuple[str, dict]]
+            The folder on the SD card and the name, creation time, and size of
+            each file
+
+        Raises
+        ------
+        ConnectionError
+            If the GoPro does not answer with the media list
+        '''
+        connection = self._connect()
+        try:
+            connection.request("GET", "/gopro/media/list")
+            response = connection.getresponse()
+            if response.status != 200:
+                raise ConnectionError(
+                    f"{self.serial} answered the media list with "
+                    f"{response.status}")
+            media = json.loads(response.read())
+        finally:
+            connection.close()
+        return [(folder["d"], file) for folder in media.get("media", [])
+                for file in folder["fs"]]
+
+    def download(self, directory: str, file_name: str, local_file: str,
+                 balancer=None) -> int:
+        '''
+        Downloads one file from the GoPro
+
+        The file is written to a temporary file first so a stopped download
+        is never mistaken for a saved file, and the temporary file is removed
+        if the download stops.
+
+        Parameters
+        ----------
+        directory: str
+            The folder of the file on the SD card
+        file_name: str
+            The name of the file on the SD card
+        local_file: str
+            The path to save the file to
+        balancer: DiskBandwidthBalancer, optional
+            Shares the disk write speed between the GoPros
+
+        Returns
+        -------
+        int
+            The number of bytes saved
+
+        Raises
+        ------
+        ConnectionError
+            If the GoPro does not send the file
+        '''
+        connection = self._connect()
+        temporary_file = local_file + ".part"
+        written = 0
+        finished = False
+        try:
+            connection.request("GET", f"/videos/DCIM/{directory}/{file_name}")
+            response = connection.getresponse()
+            if response.status != 200:
+                raise ConnectionError(
+                    f"{self.serial} answered {file_name} with "
+                    f"{response.status}")
+            with open(temporary_file, "wb") as media_file:
+                while True:
+                    chunk = response.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if balancer is not None:
+                        balancer.throttle(self.serial, len(chunk))
+                    media_file.write(chunk)
+                    written += len(chunk)
+            os.replace(temporary_file, local_file)
+            finished = True
+        finally:
+            connection.close()
+            if not finished and os.path.exists(temporary_file):
+                os.remove(temporary_file)
+        return written
+
+    def delete(self, directory: str, file_name: str) -> None:
+        '''
+        Deletes one file from the GoPro's SD card
+
+        Parameters
+        ----------
+        directory: str
+            The folder of the file on the SD card
+        file_name: str
+            The name of the file on the SD card
+
+        Raises
+        ------
+        ConnectionError
+            If the GoPro did not delete the file
+        '''
+        query = urllib.parse.urlencode({"path": f"{directory}/{file_name}"})
+        connection = self._connect()
+        try:
+            connection.request("GET", f"/gopro/media/delete/file?{query}")
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                raise ConnectionError(
+                    f"{self.serial} answered the delete of {file_name} with "
+                    f"{response.status}")
+        finally:
+            connection.close()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        '''
+        Opens a connection to the GoPro through its network interface
+        '''
+        parts = urllib.parse.urlsplit(self.url)
+        source = (self.source_address, 0) if self.source_address else None
+        connection = http.client.HTTPConnection(
+            parts.hostname, parts.port or 80, timeout=self.TIMEOUT,
+            source_address=source)
+        if self.interface is not None:
+            # The interface has to be set before connecting to be used
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(self.TIMEOUT)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE,
+                            self.interface.encode())
+            if source is not None:
+                sock.bind(source)
+            sock.connect((parts.hostname, parts.port or 80))
+            connection.sock = sock
+        return connection
+
+
+class DiskBandwidthBalancer:
+    '''
+    Shares the disk write speed evenly between the GoPros being saved
+
+    Without a limit, every GoPro writes as fast as it downloads. With a
+    limit, each GoPro being saved gets an equal share of it, so one fast
+    GoPro cannot starve the disk writes of the others, and the share of a
+    GoPro that finishes goes to the rest.
+
+    Attributes
+    ----------
+    limit: float or None
+        The most bytes per second written to the disk by every GoPro
+        together, or None for no limit
+
+    Methods
+    -------
+    __init__(limit)
+        Sets up the balancer
+    register(stream)
+        Adds a GoPro to the share
+    unregister(stream)
+        Removes a GoPro from the share
+    throttle(stream, size)
+        Waits until a GoPro can write some bytes
+    '''
+    def __init__(self, limit: float | None = None) -> None:
+        '''
+        Sets up the balancer
+
+        Parameters
+        ----------
+        limit: float, optional
+            The most bytes per second written by every GoPro together
+        '''
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._next_write = {}
+
+    def register(self, stream: str) -> None:
+        '''
+        Adds a GoPro to the share
+
+        Parameters
+        ----------
+        stream: str
+            The serial number of the GoPro
+        '''
+        with self._lock:
+            self._next_write[stream] = time.monotonic()
+
+    def unregister(self, stream: str) -> None:
+        '''
+        Removes a GoPro from the share
+
+        Parameters
+        ----------
+        stream: str
+            The serial number of the GoPro
+        '''
+        with self._lock:
+            self._next_write.pop(stream, None)
+
+    def throttle(self, stream: str, size: int) -> None:
+        '''
+        Waits until a GoPro can write some bytes
+
+        Parameters
+        ----------
+        stream: str
+            The serial number of the GoPro
+        size: int
+            The number of bytes about to be written
+        '''
+        if self.limit is None:
+            return
+        with self._lock:
+            share = self.limit / max(1, len(self._next_write))
+            now = time.monotonic()
+            start = max(now, self._next_write.get(stream, now))
+            self._next_write[stream] = start + size / share
+        if start > now:
+            time.sleep(start - now)
+
+
+class OffloadScheduler:
+    '''
+    Saves out the new files of several GoPros at the same time
+
+    Each GoPro is downloaded on its own thread through its own endpoint, so
+    saving every GoPro takes about as long as the slowest one instead of the
+    sum of all of them. The files of each GoPro are saved in a folder named
+    after its serial number.
+
+    Attributes
+    ----------
+    endpoints: List[CameraEndpoint]
+        Where to download each GoPro's media from
+    balancer: DiskBandwidthBalancer
+        Shares the disk write speed between the GoPros
+    last_report: Dict[str, dict]
+        The files, bytes, seconds, error, and saved file names and folders
+        of each GoPro from the last save
+
+    Methods
+    -------
+    __init__(endpoints, balancer)
+        Sets up the scheduler
+    offload(local_directory, timestamp, is_saved)
+        Downloads the new files of every GoPro
+
+    See Also
+    --------
+    CameraSession.offload_fleet
+    '''
+    def __init__(self, endpoints: list,
+                 balancer: DiskBandwidthBalancer | None = None) -> None:
+        '''
+        Sets up the scheduler
+
+        Parameters
+        ----------
+        endpoints: List[CameraEndpoint]
+            Where to download each GoPro's media from
+        balancer: DiskBandwidthBalancer, optional
+            Shares the disk write speed between the GoPros. Defaults to no
+            limit.
+        '''
+        self.endpoints = endpoints
+        self.balancer = balancer or DiskBandwidthBalancer()
+        self.last_report = {}
+
+    def offload(self, local_directory: str, timestamp: str = "",
+                is_saved=None) -> dict:
+        '''
+        Downloads the new files of every GoPro
+
+        Parameters
+        ----------
+        local_directory: str
+            The folder to make a folder for each GoPro in
+        timestamp: str, default=""
+            The timestamp to add to the front of the file names
+        is_saved: Callable[[str, str], bool], optional
+            Checks if a file from a GoPro serial number was already saved.
+            Files already in the GoPro's folder are always skipped.
+
+        Returns
+        -------
+        Dict[str, dict]
+            The number of files and bytes saved, the seconds it took, the
+            error that stopped it, if any, the names of the saved files, and
+            the folder on the SD card of each saved file by name, of each
+            GoPro by serial number
+        '''
+        report = {}
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(1, len(self.endpoints)),
+                thread_name_prefix="offload") as executor:
+            futures = {
+                endpoint.serial: executor.submit(
+                    self._offload_camera, endpoint, local_directory,
+                    timestamp, is_saved)
+                for endpoint in self.endpoints}
+            for serial, future in futures.items():
+                report[serial] = future.result()
+        self.last_report = report
+        return report
+
+    def _offload_camera(self, endpoint: CameraEndpoint, local_directory: str,
+                        timestamp: str, is_saved) -> dict:
+        '''
+        Downloads the new files of one GoPro
+        '''
+        start = time.perf_counter()
+        result = {"files": 0, "bytes": 0, "seconds": 0.0, "error": None,
+                  "saved": [], "folders": {}}
+        camera_directory = os.path.join(local_directory, endpoint.serial)
+        os.makedirs(camera_directory, exist_ok=True)
+        self.balancer.register(endpoint.serial)
+        try:
+            for directory, file in endpoint.media_list():
+                name = file["n"]
+                local_file = os.path.join(camera_directory, timestamp + name)
+                if os.path.exists(local_file) or (
+                        is_saved is not None and
+                        is_saved(endpoint.serial, name)):
+                    continue
+                result["bytes"] += endpoint.download(
+                    directory, name, local_file, self.balancer)
+                result["files"] += 1
+                result["saved"].append(name)
+                result["folders"][name] = directory
+        except Exception as error:
+            result["error"] = error
+        finally:
+            self.balancer.unregister(endpoint.serial)
+            result["seconds"] = time.perf_counter() - start
+        return result
+
+
+def load_endpoints(path: str = "../State/offload_endpoints.json") -> dict:
+    '''
+    Loads the endpoint of each GoPro from a file
+
+    The file maps each GoPro name to the URL, network interface, or source
+    address to reach it through and optionally its serial number, such as
+    {"GoPro 5990": {"interface": "wlan1"}}.
+
+    Parameters
+    ----------
+    path: str, default="../State/offload_endpoints.json"
+        The file to load
+
+    Returns
+    -------
+    Dict[str, CameraEndpoint]
+        The endpoint of each GoPro by name, or an empty dictionary if there
+        is no file. The serial number is an empty string if it is not in the
+        file.
+    '''
+    try:
+        with open(path, "r") as endpoint_file:
+            entries = json.load(endpoint_file)
+    except (OSError, ValueError):
+        return {}
+    return {name: CameraEndpoint(
+                entry.get("serial", ""),
+                entry.get("url", CameraEndpoint.DEFAULT_URL),
+                entry.get("interface"), entry.get("source_address"))
+            for name, entry in entries.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Save files from several fake GoPros at once and compare "
+        "the time to saving them one after another")
+    parser.add_argument("--cameras", type=int, default=3,
+                        help="number of fake GoPros")
+    parser.add_argument("--media-count", type=int, default=4,
+                        help="files on each fake GoPro")
+    parser.add_argument("--file-size", type=int, default=4 * 1024 * 1024,
+                        help="bytes in each file")
+    parser.add_argument("--download-rate", type=float, default=20e6,
+                        help="bytes per second each fake GoPro sends")
+    parser.add_argument("--disk-limit", type=float, default=None,
+                        help="most bytes per second written by every GoPro")
+    parser.add_argument("--output", default="../Data/offload_benchmark",
+                        help="folder to save the files in")
+    arguments = parser.parse_args()
+
+    from gopro_simulator import FakeCameraServer, SimulatedGoPro
+    servers = [
+        FakeCameraServer(
+            SimulatedGoPro(target=f"GoPro {number:04d}",
+                           media_count=arguments.media_count,
+                           file_size=arguments.file_size),
+            download_rate=arguments.download_rate)
+        for number in range(arguments.cameras)]
+    endpoints = [CameraEndpoint(f"FAKE{number:04d}", server.url)
+                 for number, server in enumerate(servers)]
+    try:
+        scheduler = OffloadScheduler(
+            endpoints, DiskBandwidthBalancer(arguments.disk_limit))
+        start = time.perf_counter()
+        report = scheduler.offload(arguments.output)
+        total = time.perf_counter() - start
+    finally:
+        for server in servers:
+            server.close()
+
+    for serial, result in report.items():
+        print(f"{serial}: {result['files']} files, {result['bytes']} bytes "
+              f"in {result['seconds']:.2f}s"
+              + (f" ({result['error']})" if result["error"] else ""))
+    print(f"total: {total:.2f}s, slowest GoPro: "
+          f"{max(result['seconds'] for result in report.values()):.2f}s, "
+          "one after another: "
+          f"{sum(result['seconds'] for result in report.values()):.2f}s")
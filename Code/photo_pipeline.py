@@ -0,0 +1,247 @@
+import concurrent.futures
+import queue
+import threading
+import time
+
+
+# Queued to switch back to video mode after hold_photo_mode is turned off
+_RELEASE = "release"
+
+
+class PhotoPipeline:
+    '''
+    Takes queued photos back to back with as few mode switches as possible
+
+    Photo requests from any thread are queued. The GoPro is switched to
+    photo mode once for the first request, the shutter is fired for every
+    queued request as soon as the GoPro is no longer busy, and it is switched
+    back to video mode once the queue is empty, unless photo mode is held.
+    Every command goes through the session's command gate, so it waits for
+    the GoPro to finish saving and is retried if rejected. The latency of
+    every shot and the shots per second of every burst are measured.
+
+    Attributes
+    ----------
+    session: CameraSession
+        The connected session the photos are taken on
+    on_burst: Callable[[dict], None] or None
+        Called on the pipeline thread with the summary of every burst
+    last_burst: dict or None
+        The summary of the last burst
+    in_photo_mode: bool
+        If the GoPro is in photo mode for a burst or held photo mode
+
+    Methods
+    -------
+    __init__(session, on_burst)
+        Sets up the pipeline without starting its thread
+    request(count, wait_for_ready)
+        Queues photos to take
+    hold_photo_mode(hold)
+        Keeps the GoPro in photo mode between bursts
+    close()
+        Stops the pipeline thread after the queued photos are taken
+
+    See Also
+    --------
+    CameraSession.take_photo
+    '''
+    def __init__(self, session, on_burst=None) -> None:
+        '''
+        Sets up the pipeline without starting its thread
+
+        Parameters
+        ----------
+        session: CameraSession
+            The connected session the photos are taken on
+        on_burst: Callable[[dict], None], optional
+            Called on the pipeline thread with the summary of every burst
+        '''
+        self.session = session
+        self.on_burst = on_burst
+        self.last_burst = None
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._hold = False
+        self._in_photo_mode = False
+
+    @property
+    def in_photo_mode(self) -> bool:
+        return self._in_photo_mode or self._hold
+
+    def request(self, count: int = 1,
+                wait_for_ready: bool = True) -> list:
+        '''
+        Queues photos to take
+
+        Can be called from any thread. The pipeline thread is started with
+        the first request.
+
+        Parameters
+        ----------
+        count: int, default=1
+            The number of photos to take
+        wait_for_ready: bool, default=True
+            If the photos wait for the GoPro to stop being busy. Otherwise a
+            photo is skipped if the GoPro is busy when its turn comes.
+
+        Returns
+        -------
+        List[Future]
+            One future per photo that finishes with the milliseconds from the
+            request to the GoPro's answer, or with the error of the shot. A
+            skipped photo finishes with a TimeoutError.
+        '''
+        self._start()
+        requested = time.perf_counter()
+        futures = [concurrent.futures.Future() for _ in range(count)]
+        for future in futures:
+            self._queue.put((requested, future, wait_for_ready))
+        return futures
+
+    def hold_photo_mode(self, hold: bool) -> None:
+        '''
+        Keeps the GoPro in photo mode between bursts
+
+        Photos taken at intervals, like a time-lapse, then do not switch
+        modes for every photo. Once released, the GoPro is switched back to
+        video mode after the queued photos.
+
+        Parameters
+        ----------
+        hold: bool
+            True to stay in photo mode, False to release it
+        '''
+        self._hold = hold
+        if not hold:
+            self._start()
+            self._queue.put(_RELEASE)
+
+    def close(self) -> None:
+        '''
+        Stops the pipeline thread after the queued photos are taken
+        '''
+        self._queue.put(None)
+
+    def _start(self) -> None:
+        '''
+        Starts the pipeline thread if it is not running
+        '''
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, daemon=True, name="photo-pipeline")
+                self._thread.start()
+
+    def _run(self) -> None:
+        '''
+        Takes a burst for every group of queued photos until closed
+        '''
+        while (shot := self._queue.get()) is not None:
+            if shot != _RELEASE:
+                self._burst([shot])
+            elif self._in_photo_mode and not self._hold:
+                self._switch_to_video(self.session.gopro)
+
+    def _burst(self, shots: list) -> None:
+        '''
+        Takes photos until the queue is empty with one switch to photo mode
+        and one switch back to video mode
+        '''
+        params = self.session.params
+        gopro = self.session.gopro
+        gate = self.session.command_gate
+        started = time.perf_counter()
+        latencies = []
+        errors = 0
+        skipped = 0
+        try:
+            if not self._in_photo_mode:
+                # The GoPro is no longer ready to record right away
+                self.session.armed = False
+                gate.send(gopro, "ble_command.load_preset_group",
+                          lambda: gopro.ble_command.load_preset_group(
+                              group=params.PresetGroup.PHOTO),
+                          encoding=False)
+                self._in_photo_mode = True
+        except Exception as error:
+            for _, future, _ in shots + self._drain():
+                future.set_exception(error)
+            return
+
+        while shots:
+            requested, future, wait_for_ready = shots.pop(0)
+            try:
+                gate.wait_ready(gopro, "ble_command.set_shutter",
+                                timeout=None if wait_for_ready else 0.0)
+                gate.send(gopro, "ble_command.set_shutter",
+                          lambda: gopro.ble_command.set_shutter(
+                              shutter=params.Toggle.ENABLE),
+                          check_first=False)
+            except TimeoutError as error:
+                # Busy is not a failed command, so it is not recorded
+                skipped += 1
+                future.set_exception(error)
+            except Exception as error:
+                errors += 1
+                self.session.command_metrics.record(
+                    "photo.shot", time.perf_counter() - requested,
+                    failed=True)
+                future.set_exception(error)
+            else:
+                latency = time.perf_counter() - requested
+                latencies.append(latency * 1000)
+                self.session.command_metrics.record("photo.shot", latency)
+                future.set_result(latency * 1000)
+            # Keep shooting while photos are queued
+            shots.extend(self._drain())
+        finished = time.perf_counter()
+
+        if not self._hold:
+            self._switch_to_video(gopro)
+        self.last_burst = {
+            "shots": len(latencies),
+            "errors": errors,
+            "skipped": skipped,
+            "seconds": finished - started,
+            "shots_per_second": len(latencies) / (finished - started),
+            "latency_ms": latencies,
+        }
+        self.session.journal.log(
+            "photo_burst", shots=len(latencies), errors=errors,
+            skipped=skipped, seconds=round(finished - started, 3))
+        if self.on_burst is not None:
+            self.on_burst(self.last_burst)
+
+    def _drain(self) -> list:
+        '''
+        Takes every photo request waiting in the queue
+
+        A close or release request is put back so it is handled after the
+        burst.
+        '''
+        shots = []
+        while True:
+            try:
+                shot = self._queue.get_nowait()
+            except queue.Empty:
+                return shots
+            if shot is None or shot == _RELEASE:
+                self._queue.put(shot)
+                return shots
+            shots.append(shot)
+
+    def _switch_to_video(self, gopro) -> None:
+        '''
+        Switches the GoPro back to video mode once it is not busy
+        '''
+        self._in_photo_mode = False
+        try:
+            self.session.command_gate.send(
+                gopro, "ble_command.load_preset_group",
+                lambda: gopro.ble_command.load_preset_group(
+                    group=self.session.params.PresetGroup.VIDEO))
+        except Exception:
+            # The next command or reconnection switches the mode again
+            pass
@@ -0,0 +1,343 @@
+import collections
+import datetime as dt
+import threading
+import time
+
+from instrumentation import append_csv_row
+
+
+class ReadinessManager:
+    '''
+    Keeps the GoPro awake and armed between takes so recordings start fast
+
+    Between takes the GoPro starts saving power, and the first command after
+    that waits for it to wake up. The manager sends a keep-alive every 28
+    seconds so it stays awake, and pre-arms it whenever it is idle, which
+    switches it to video mode and checks it is ready, so starting a
+    recording only has to send the shutter. Nothing is sent while the GoPro
+    is recording, taking photos, or disconnected, or while a recording is
+    being started or stopped, which is checked with the session's recording
+    lock since a cold start takes seconds before the session knows it is
+    recording. The lock is only held for the check, so a recording started
+    while the GoPro is being armed does not wait for arming to finish. A
+    pre-arm that fails is tried again after a wait that doubles with every
+    failure.
+
+    The Open GoPro SDK's WirelessGoPro already sends a keep-alive every 28
+    seconds from its own thread while connected, so with a real GoPro the
+    manager's keep-alives at the default interval only double it, and a
+    shorter interval only matters if the GoPro still saves power. They are
+    what keeps a simulated GoPro awake.
+
+    Staying awake uses battery, so the battery is polled every few minutes
+    and the percent used per hour while idle is measured. Each poll adds the
+    idle battery use and the median armed and cold record start times to a
+    CSV file, so the two costs can be compared with and without the manager.
+
+    Attributes
+    ----------
+    KEEP_ALIVE_INTERVAL: float
+        The default seconds between keep-alives, the same as the SDK's
+    CHECK_INTERVAL: float
+        The seconds between checks if the GoPro is idle and needs pre-arming
+    BATTERY_INTERVAL: float
+        The seconds between battery polls
+    MAX_ARM_BACKOFF: float
+        The most seconds to wait before trying a failed pre-arm again
+    MAX_ERRORS: int
+        The number of failures kept in errors
+    session: CameraSession
+        The connected session kept ready
+    keep_alive_interval: float or None
+        The seconds between keep-alives, or None to let the GoPro save power
+    pre_arm: bool
+        If the GoPro is pre-armed whenever it is idle
+    on_report: Callable[[dict], None] or None
+        Called on the manager thread with every report
+    log_path: str
+        The CSV file every report is added to
+    keep_alives: int
+        The number of keep-alives sent so far
+    arms: int
+        The number of times the GoPro was pre-armed so far
+    errors: Deque[str]
+        The last keep-alives, pre-arms, and battery polls that failed
+
+    Methods
+    -------
+    __init__(session, keep_alive_interval, pre_arm, on_report, log_path)
+        Sets up the manager without starting it
+    start()
+        Starts keeping the GoPro ready on a background thread
+    stop()
+        Stops keeping the GoPro ready
+    join(timeout)
+        Waits for the manager thread to finish
+    is_running()
+        Check if the manager is still running
+    idle_drain_per_hour()
+        The battery percent used per hour while idle
+    report()
+        The keep-alive, battery, and record start measurements
+
+    See Also
+    --------
+    CameraSession.keep_alive
+    CameraSession.pre_arm
+    '''
+    KEEP_ALIVE_INTERVAL = 28.0
+    CHECK_INTERVAL = 1.0
+    BATTERY_INTERVAL = 300.0
+    MAX_ARM_BACKOFF = 60.0
+    MAX_ERRORS = 100
+
+    def __init__(self, session,
+                 keep_alive_interval: float | None = KEEP_ALIVE_INTERVAL,
+                 pre_arm: bool = True, on_report=None,
+                 log_path: str = "../Metrics/readiness.csv") -> None:
+        '''
+        Sets up the manager without starting it
+
+        Parameters
+        ----------
+        session: CameraSession
+            The connected session to keep ready
+        keep_alive_interval: float or None, default=KEEP_ALIVE_INTERVAL
+            The seconds between keep-alives. If None, no keep-alives are sent
+            and the GoPro is only pre-armed.
+        pre_arm: bool, default=True
+            If the GoPro is pre-armed whenever it is idle
+        on_report: Callable[[dict], None], optional
+            Called on the manager thread with every report
+        log_path: str, default="../Metrics/readiness.csv"
+            The CSV file every report is added to
+
+        Raises
+        ------
+        ValueError
+            If the keep-alive interval is not positive
+        '''
+        if keep_alive_interval is not None and keep_alive_interval <= 0:
+            raise ValueError("The keep-alive interval must be more than 0 "
+                             "seconds")
+        self.session = session
+        self.keep_alive_interval = keep_alive_interval
+        self.pre_arm = pre_arm
+        self.on_report = on_report
+        self.log_path = log_path
+        self.keep_alives = 0
+        self.arms = 0
+        self.errors = collections.deque(maxlen=self.MAX_ERRORS)
+        self._stopped = threading.Event()
+        self._thread = None
+        self._drain_percent = 0.0
+        self._drain_seconds = 0.0
+        self._battery_sample = None
+        self._recorded = False
+        self._arm_backoff = 0.0
+        self._next_arm = 0.0
+
+    def start(self) -> None:
+        '''
+        Starts keeping the GoPro ready on a background thread
+        '''
+        if self.is_running():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="readiness")
+        self._thread.start()
+
+    def stop(self) -> None:
+        '''
+        Stops keeping the GoPro ready
+
+        The GoPro stays armed until a command disarms it.
+        '''
+        self._stopped.set()
+
+    def join(self, timeout: float | None = None) -> None:
+        '''
+        Waits for the manager thread to finish
+
+        Parameters
+        ----------
+        timeout: float, optional
+            The most seconds to wait
+        '''
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_running(self) -> bool:
+        '''
+        Check if the manager is still running
+
+        Returns
+        -------
+        bool
+            True if the manager thread is running
+        '''
+        return self._thread is not None and self._thread.is_alive()
+
+    def idle_drain_per_hour(self) -> float | None:
+        '''
+        The battery percent used per hour while idle
+
+        Only the time between two battery polls with no recording in between
+        is counted.
+
+        Returns
+        -------
+        float or None
+            The percent from 0 to 100 per hour, or None until two polls have
+            been made
+        '''
+        if self._drain_seconds <= 0:
+            return None
+        return self._drain_percent / self._drain_seconds * 3600
+
+    def report(self) -> dict:
+        '''
+        The keep-alive, battery, and record start measurements
+
+        Returns
+        -------
+        dict
+            The keep-alive interval, if pre-arming is on, the keep-alives and
+            pre-arms sent, the idle battery percent used per hour, and the
+            count and median milliseconds of armed and cold record starts
+        '''
+        starts = {row["command"]: row
+                  for row in self.session.command_metrics.snapshot()
+                  if row["command"].startswith("record_start.")}
+        report = {
+            "keep_alive_interval": self.keep_alive_interval,
+            "pre_arm": self.pre_arm,
+            "keep_alives": self.keep_alives,
+            "arms": self.arms,
+            "idle_drain_per_hour": self.idle_drain_per_hour(),
+        }
+        for kind in ("armed", "cold"):
+            row = starts.get(f"record_start.{kind}")
+            report[f"{kind}_starts"] = 0 if row is None else row["count"]
+            report[f"{kind}_start_ms"] = None if row is None else\
+                row["p50"] * 1000
+        return report
+
+    def _run(self) -> None:
+        '''
+        Sends keep-alives and pre-arms the GoPro until stopped
+        '''
+        next_keep_alive = next_battery = time.monotonic()
+        while not self._stopped.is_set():
+            # A recording being started or stopped counts as recording
+            idle = False
+            if self.session.recording_lock.acquire(blocking=False):
+                try:
+                    idle = self._is_idle()
+                finally:
+                    self.session.recording_lock.release()
+            if idle and self.keep_alive_interval is not None and\
+                    time.monotonic() >= next_keep_alive:
+                next_keep_alive = time.monotonic() + self.keep_alive_interval
+                self._keep_alive()
+            if idle and self.pre_arm and not self.session.armed and\
+                    time.monotonic() >= self._next_arm:
+                self._arm()
+            if not idle:
+                self._recorded = True
+            if time.monotonic() >= next_battery:
+                next_battery += self.BATTERY_INTERVAL
+                self._poll_battery()
+            self._stopped.wait(self.CHECK_INTERVAL)
+
+    def _is_idle(self) -> bool:
+        '''
+        Check if the GoPro is connected and not recording or taking photos
+        '''
+        return self.session.is_connected() and\
+            not self.session.recording and\
+            not self.session.photo_pipeline.in_photo_mode
+
+    def _keep_alive(self) -> None:
+        '''
+        Sends one keep-alive
+        '''
+        try:
+            if self.session.keep_alive():
+                self.keep_alives += 1
+        except Exception as error:
+            self.errors.append(f"keep-alive: {error}")
+
+    def _arm(self) -> None:
+        '''
+        Pre-arms the GoPro, or waits longer before trying again if it fails
+        '''
+        try:
+            self.session.pre_arm()
+        except Exception as error:
+            self.errors.append(f"pre-arm: {error}")
+            self._arm_backoff = min(
+                max(2 * self._arm_backoff, self.CHECK_INTERVAL),
+                self.MAX_ARM_BACKOFF)
+            self._next_arm = time.monotonic() + self._arm_backoff
+            return
+        self._arm_backoff = 0.0
+        if self.session.photo_pipeline.in_photo_mode or\
+                self.session.recording_lock.locked() or\
+                self.session.recording:
+            # A photo or recording was started while arming, so the GoPro
+            # was already sent what it needs or has changed mode
+            self.session.armed = False
+            return
+        self.arms += 1
+
+    def _poll_battery(self) -> None:
+        '''
+        Measures the battery used since the last poll and reports
+        '''
+        if not self.session.is_connected():
+            self._battery_sample = None
+            return
+        try:
+            percent = self.session.read_battery_percent() * 100
+        except Exception as error:
+            self.errors.append(f"battery: {error}")
+            self._battery_sample = None
+            return
+        now = time.monotonic()
+        if self._battery_sample is not None and not self._recorded:
+            polled, last_percent = self._battery_sample
+            self._drain_percent += last_percent - percent
+            self._drain_seconds += now - polled
+        self._battery_sample = (now, percent)
+        self._recorded = not self._is_idle()
+        report = self.report()
+        report["battery_percent"] = percent
+        self._log(report)
+        if self.on_report is not None:
+            self.on_report(report)
+
+    def _log(self, report: dict) -> None:
+        '''
+        Adds a report to the CSV file
+        '''
+        append_csv_row(
+            self.log_path, ["time", "keep_alive_interval", "pre_arm",
+                            "keep_alives", "arms", "battery_percent",
+                            "idle_drain_per_hour", "armed_start_ms",
+                            "cold_start_ms"],
+            [dt.datetime.now().isoformat(),
+             report["keep_alive_interval"] or "", report["pre_arm"],
+             report["keep_alives"], report["arms"],
+             f"{report['battery_percent']:.1f}",
+             _format(report["idle_drain_per_hour"], ".2f"),
+             _format(report["armed_start_ms"], ".1f"),
+             _format(report["cold_start_ms"], ".1f")])
+
+
+def _format(value: float | None, spec: str) -> str:
+    '''
+    A number for the CSV file, or an empty cell if it is not known yet
+    '''
+    return "" if value is None else format(value, spec)
@@ -1,8 +1,22 @@
 import customtkinter as ctk
 from tkinter import messagebox
-from open_gopro import WirelessGoPro, Params
-import os
 import datetime as dt
+from battery_estimator import BatteryEstimator
+from camera import add_simulator_arguments, simulator_options_from
+from camera_session import CameraSession
+from connection_supervisor import ConnectionSupervisor
+from control_server import ControlServer
+from hotkeys import HotkeyController
+from loop_monitor import LoopMonitor
+from readiness import ReadinessManager
+from recording_scheduler import (RecordingScheduler, duty_cycle,
+                                 parse_duty_cycle)
+from sampling_profiler import SamplingProfiler, profiler_from_environment
+from timelapse import TimeLapse
+from workers import TkDispatcher
+import argparse
+import threading
+import time
 
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("dark-blue")
@@ -25,10 +39,17 @@ class GoProApp(ctk.CTk):
     PADY: int
         The number of pixels to pad on the top and bottom sides of the GUI
         elements
-    gopro_name: str
-        The name of the GoPro to connect to
-    gopro: WirelessGoPro
-        A wireless GoPro object to connect to
+    MONITORED_CALLBACKS: Tuple[str]
+        The callbacks the loop monitor times
+    session: CameraSession
+        The connection, video settings, and saved files of the GoPro, shared
+        with the headless command line
+    loop_monitor: LoopMonitor
+        Logs the callbacks that freeze the window
+    dispatcher: TkDispatcher
+        Runs GUI updates from background threads on the Tk thread
+    supervisor: ConnectionSupervisor
+        Reconnects to the GoPro in the background if the connection is lost
     resolution_dropdown: CTkOptionMenu
         A list of possible resolutions for the GoPro
     frame_rate_dropdown: CTkOptionMenu
@@ -52,12 +73,54 @@ class GoProApp(ctk.CTk):
     timestamp_check: CTkCheckBox
         Checkbox for telling the code if a time stamp should be added to the
         start of the files being saved.
-    previously_saved_files: List[str]
-        A list of all of the previously saved files in the Data folder
+    offload_thread: Thread or None
+        The thread saving out files from the GoPro
+    paused_offload: Tuple[str, str] or None
+        The folder and timestamp of a file save stopped by a lost connection
     poll_battery: CTkButton
         A button to get the battery life and SD card recording room values
+    battery_estimator: BatteryEstimator
+        Learns the battery life of each video setting from polled values
     battery_indicator: BatteryIndicator
         The GUI elements to display the battery and SD card statuses
+    fleet_status_text: CTkLabel
+        The battery and SD card status of each GoPro in the fleet
+    duty_cycle_entry: CTkEntry
+        The minutes to record and the minutes between recordings, such as
+        "5/30", for the recording schedule
+    schedule_variable: StringVar
+        "on" while the recording schedule runs
+    schedule_switch: CTkSwitch
+        Starts and stops the recording schedule
+    schedule_status_text: CTkLabel
+        What the recording schedule is doing and when it changes next
+    scheduler: RecordingScheduler or None
+        Records on the duty cycle while the schedule runs
+    interval_entry: CTkEntry
+        The seconds between time-lapse photos
+    timelapse_variable: StringVar
+        "on" while the time-lapse runs
+    timelapse_switch: CTkSwitch
+        Starts and stops the time-lapse
+    timelapse_status_text: CTkLabel
+        The photos taken, skipped, and saved by the time-lapse
+    timelapse: TimeLapse or None
+        Takes photos at the interval while the time-lapse runs
+    ready_variable: StringVar
+        "on" while the GoPro is kept ready
+    ready_switch: CTkSwitch
+        Starts and stops the keep-alives and pre-arming
+    ready_status_text: CTkLabel
+        The armed and cold record start times and the idle battery use
+    readiness: ReadinessManager or None
+        Keeps the GoPro awake and armed while the switch is on
+    hotkeys: HotkeyController
+        Sends the commands of the HOTKEYS straight away on its own thread
+    hilight_button: CTkButton
+        A button to tag a HiLight in the current recording
+    hotkey_status_text: CTkLabel
+        The result and latency of the last hotkey press or photo burst, or
+        how closely the GoPro's clock was set
     zoom_label: CTkLabel
         label of teh digital zoom slider
     zoom_slider: CTkSlider
@@ -67,10 +130,14 @@ class GoProApp(ctk.CTk):
     gopro_list: List[str]
         List of all possible GoPros to connect to. You can also connect to the
         first available.
+    control_server: ControlServer or None
+        The localhost server that lets other programs send commands
+    profiler: SamplingProfiler
+        Samples the stacks of every thread while profiling is on
 
     Methods
     -------
-    __init__()
+    __init__(simulator_options, control_port)
         Creates all of the base GUI elements
     set_resolution(choice)
         Switches the GoPro to a selected resolution
@@ -78,39 +145,114 @@ class GoProApp(ctk.CTk):
         Switches the GoPro to a selected frame rate
     set_fov(choice)
         Switches the GoPro to a field of view
+    apply_settings(resolution, fps, fov)
+        Sends a valid combination of video settings to the GoPro
+    load_capabilities(model)
+        Loads the video settings possible on a GoPro model
     switch_theme(choice)
         Takes theme choice from theme_dropdown and applies it
     take_photo()
         Take an image with the current settings
+    photo_burst_done(burst)
+        Show the speed of the last photo burst
     save_files()
         Save out new files from the GoPro
+    start_offload(local_directory, timestamp)
+        Start saving out new files in the background
+    offload_files(local_directory, timestamp)
+        Download every new file from the GoPro
+    offload_fleet(local_directory, timestamp)
+        Download every new file from every GoPro in the fleet at once
+    offload_finished(status, error)
+        Show that saving out files stopped
     set_zoom()
         Set the percent of digital zoom on the camera
     select_gopro(choice)
         Select a GoPro to connect to
     connect_callback()
         Connect to the selected GoPro form the select_gopro dropdown
+    sync_clock()
+        Set the GoPro's clock and show how far it is from the computer's
     close_callback()
         Disconnects from the GoPro
+    set_controls_state(state)
+        Enable or disable every control that sends commands to the GoPro
+    reconnect()
+        Try once to reconnect to the GoPro and restore its settings
+    connection_lost()
+        Disable the controls while the app reconnects
+    connection_recovered(outage)
+        Enable the controls, match the recording switch to the GoPro, and
+        resume saving files after reconnecting
     recording_switch_event
         Turns video recording on and off with the current video settings
+    send_recording(start)
+        Start or stop recording and show the result on the Tk thread
+    recording_done(start, take, error, battery)
+        Show the result of the recording switch
+    control_command_done(result)
+        Show the result of a command sent through the control server
+    schedule_switch_event()
+        Starts or stops recording on the duty cycle schedule
+    schedule_changed(state)
+        Show what the recording schedule is doing
+    timelapse_switch_event()
+        Starts or stops taking photos at a fixed interval
+    timelapse_frame(frame)
+        Show the progress of the time-lapse
+    timelapse_error(message)
+        Show an error of the running time-lapse
+    timelapse_finished()
+        Show the result of the time-lapse once its photos are saved
+    ready_switch_event()
+        Starts or stops keeping the GoPro ready between recordings
+    show_readiness(report)
+        Show the record start times and idle battery use
+    hotkey_pressed(action)
+        Send the command of a hotkey before updating any widgets
+    hotkey_done(result)
+        Show the result of a hotkey press
+    recording_changed(recording)
+        Update the recording switch and battery estimator after recording
+        was started or stopped without the switch
+    show_recording(recording)
+        Set the recording switch without sending a command
+    export_metrics(event)
+        Save the GoPro command latencies to the Metrics folder
+    toggle_profiler(event)
+        Start sampling stacks, or stop and save them
     poll_battery_callback()
         Update the battery and SD card indicators
+    battery_key()
+        The name of the current video settings for the battery estimator
 
     See Also
     --------
+    CameraSession
+    ControlServer
     BatteryIndicator
+    BatteryEstimator
 
     Notes
     -----
-    - The app needs to be restarted if you need to reconnect to the GoPro.
+    - If the connection to the GoPro is lost, the app reconnects on its own,
+      sends the selected settings again, and resumes saving files.
     - The app will check your Data folder to make sure that it does not save
       the same video twice.
     - In order to save different videos into different folders, you need to
       save them after a group of those videos have been recorded as all new
       videos are pulled at once.
     - The newer GoPros can have more resolution, fps and fov  values. These
-      values are for the Hero10.
+      values are loaded for each model from the Capabilities folder, and the
+      Hero10 values are used for models without a file.
+    - F9 starts and stops recording, F10 takes a photo, and F11 tags a
+      HiLight. Hotkeys send the command before redrawing any widgets, so they
+      are the fastest way to catch a moment.
+    - Selecting "All GoPros" sends every command to each GoPro in
+      CameraSession.FLEET at the same time. The fleet's bluetooth commands do
+      not use wifi, so the zoom cannot be set while it is connected, and
+      files are only saved if each GoPro has its own network interface in
+      State/offload_endpoints.json.
 
     References
     ----------
@@ -118,49 +260,81 @@ class GoProApp(ctk.CTk):
     '''
     PADX = 10
     PADY = 10
+    HOTKEYS = {"<F9>": "record", "<F10>": "photo", "<F11>": "hilight"}
+    MONITORED_CALLBACKS = (
+        "set_resolution", "set_frame_rate", "set_fov", "switch_theme",
+        "take_photo", "save_files", "set_zoom", "select_gopro",
+        "connect_callback", "close_callback", "recording_switch_event",
+        "schedule_switch_event", "timelapse_switch_event",
+        "ready_switch_event", "hotkey_pressed", "export_metrics",
+        "poll_battery_callback")
     LABEL_FONT = ("Inter", 20)
     WIDGET_FONT = ("Inter", 16)
 
-    def __init__(self) -> None:
+    def __init__(self, simulator_options: dict | None = None,
+                 control_port: int | None = None) -> None:
         '''
         Creates all of the base GUI elements
 
         Creates the GUI and links the elements to the correct callbacks
+
+        Parameters
+        ----------
+        simulator_options: dict, optional
+            Keyword arguments for a SimulatedGoPro. If given, the app controls
+            a simulated GoPro instead of a real one.
+        control_port: int, optional
+            The localhost port to accept commands from other programs on
         '''
         super().__init__()
-        # selected GoPro to connect to
-        self.gopro_name = "GoPro 5990"
-        self.gopro = WirelessGoPro(target=self.gopro_name)
+        self.session = CameraSession(simulator_options)
+        # Time the callbacks before the widgets are given them
+        self.loop_monitor = LoopMonitor(self, self.session.command_metrics,
+                                        journal=self.session.journal)
+        for name in self.MONITORED_CALLBACKS:
+            setattr(self, name, self.loop_monitor.wrap(getattr(self, name)))
+        self.loop_monitor.start()
+        self.dispatcher = TkDispatcher(self, self.loop_monitor)
+        self.supervisor = ConnectionSupervisor(
+            self.session.is_connected, self.reconnect,
+            on_lost=self.connection_lost,
+            on_recovered=self.connection_recovered)
+        self.session.command_metrics.add_failure_listener(
+            self.supervisor.notify_failure)
+        capabilities = self.session.capabilities
 
         # Global App Parameters)
-        self.title("GoPro Control App")
+        self.title("GoPro Control App" if simulator_options is None
+                   else "GoPro Control App (Simulated GoPro)")
         self.config(padx=self.PADX, pady=self.PADY)
         self.resizable(False, False)
 
         # Resolution Dropdown
-        default_resolution = ctk.StringVar(value="1080p")
+        default_resolution = ctk.StringVar(value=capabilities.resolutions[0])
         self.resolution_dropdown = ctk.CTkOptionMenu(
-            self, values=["1080p", "2.7K", "2.7K (4x3)", "4K",
-                          "4K (4x3)", "5K (4x3)", "5.3K"],
+            self, values=capabilities.resolutions,
             command=self.set_resolution, variable=default_resolution,
             state="disabled", font=self.WIDGET_FONT)
         self.resolution_dropdown.grid(row=0, column=0, padx=self.PADX,
                                       pady=self.PADY, sticky="nsew")
 
         # Frame Rate Dropdown
-        default_frame_rate = ctk.StringVar(value="30 fps")
+        frame_rates = capabilities.frame_rates(default_resolution.get())
+        default_frame_rate = ctk.StringVar(value=frame_rates[0])
         self.frame_rate_dropdown = ctk.CTkOptionMenu(
-            self, values=["24 fps", "30 fps", "60 fps" "120 fps", "240 fps"],
+            self, values=frame_rates,
             command=self.set_frame_rate, variable=default_frame_rate,
             state="disabled", font=self.WIDGET_FONT)
         self.frame_rate_dropdown.grid(row=0, column=1, padx=self.PADX,
                                       pady=self.PADY, sticky="nsew")
 
         # Select FOV
-        default_fov = ctk.StringVar(value="Wide")
+        fovs = capabilities.fovs(default_resolution.get(),
+                                 default_frame_rate.get())
+        default_fov = ctk.StringVar(
+            value="Wide" if "Wide" in fovs else fovs[0])
         self.fov_dropdown = ctk.CTkOptionMenu(
-            self, values=["Linear", "Horizon Leveling", "Narrow",
-                          "Super View", "Wide"], variable=default_fov,
+            self, values=fovs, variable=default_fov,
             command=self.set_fov, state="disabled", font=self.WIDGET_FONT)
         self.fov_dropdown.grid(row=0, column=2, padx=self.PADX, pady=self.PADY,
                                sticky="nsew")
@@ -211,12 +385,8 @@ class GoProApp(ctk.CTk):
                                                font=self.WIDGET_FONT)
         self.timestamp_check.grid(row=4, column=3, padx=self.PADX,
                                   pady=self.PADY)
-        if not os.path.exists("../Data"):
-            os.makedirs("../Data")
-        self.previously_saved_files = []
-        for (_, _, filenames) in os.walk("../Data"):
-            files = [parts.split("_")[-1] for parts in filenames]
-            self.previously_saved_files.extend(files)
+        self.offload_thread = None
+        self.paused_offload = None
 
         # Battery Indicator
         self.poll_battery = ctk.CTkButton(
@@ -225,10 +395,89 @@ class GoProApp(ctk.CTk):
             font=self.WIDGET_FONT)
         self.poll_battery.grid(row=2, column=0, padx=self.PADX, pady=self.PADY,
                                sticky="nsew")
-        self.battery_indicator = BatteryIndicator(self)
+        self.battery_estimator = BatteryEstimator(
+            BatteryIndicator.BATTERY_RECORDING_TIMES)
+        self.battery_indicator = BatteryIndicator(
+            self, estimator=self.battery_estimator)
         self.battery_indicator.grid(row=2, column=1, columnspan=3,
                                     padx=self.PADX, pady=self.PADY,
                                     sticky="nsew")
+        self.fleet_status_text = ctk.CTkLabel(self, text="",
+                                              font=self.WIDGET_FONT)
+        self.fleet_status_text.grid(row=5, column=0, columnspan=4,
+                                    padx=self.PADX, sticky="w")
+
+        # Recording Schedule
+        self.duty_cycle_entry = ctk.CTkEntry(
+            self, placeholder_text="Minutes On/Every, e.g. 5/30",
+            font=self.WIDGET_FONT)
+        self.duty_cycle_entry.grid(row=6, column=0, padx=self.PADX,
+                                   pady=self.PADY, sticky="nsew")
+        self.schedule_variable = ctk.StringVar(value="off")
+        self.schedule_switch = ctk.CTkSwitch(
+            self, text="Run Schedule", variable=self.schedule_variable,
+            onvalue="on", offvalue="off", command=self.schedule_switch_event,
+            state="disabled", font=self.WIDGET_FONT)
+        self.schedule_switch.grid(row=6, column=1, padx=self.PADX,
+                                  pady=self.PADY, sticky="nsew")
+        self.schedule_status_text = ctk.CTkLabel(self, text="",
+                                                 font=self.WIDGET_FONT)
+        self.schedule_status_text.grid(row=6, column=2, columnspan=2,
+                                       padx=self.PADX, sticky="w")
+        self.scheduler = None
+
+        # Time-Lapse
+        self.interval_entry = ctk.CTkEntry(
+            self, placeholder_text="Seconds Between Photos",
+            font=self.WIDGET_FONT)
+        self.interval_entry.grid(row=8, column=0, padx=self.PADX,
+                                 pady=self.PADY, sticky="nsew")
+        self.timelapse_variable = ctk.StringVar(value="off")
+        self.timelapse_switch = ctk.CTkSwitch(
+            self, text="Run Time-Lapse", variable=self.timelapse_variable,
+            onvalue="on", offvalue="off", command=self.timelapse_switch_event,
+            state="disabled", font=self.WIDGET_FONT)
+        self.timelapse_switch.grid(row=8, column=1, padx=self.PADX,
+                                   pady=self.PADY, sticky="nsew")
+        self.timelapse_status_text = ctk.CTkLabel(self, text="",
+                                                  font=self.WIDGET_FONT)
+        self.timelapse_status_text.grid(row=8, column=2, columnspan=2,
+                                        padx=self.PADX, sticky="w")
+        self.timelapse = None
+
+        # Keep the GoPro ready between recordings
+        self.ready_variable = ctk.StringVar(value="off")
+        self.ready_switch = ctk.CTkSwitch(
+            self, text="Keep Ready", variable=self.ready_variable,
+            onvalue="on", offvalue="off", command=self.ready_switch_event,
+            state="disabled", font=self.WIDGET_FONT)
+        self.ready_switch.grid(row=9, column=0, padx=self.PADX,
+                               pady=self.PADY, sticky="nsew")
+        self.ready_status_text = ctk.CTkLabel(self, text="",
+                                              font=self.WIDGET_FONT)
+        self.ready_status_text.grid(row=9, column=1, columnspan=3,
+                                    padx=self.PADX, sticky="w")
+        self.readiness = None
+
+        # Hotkeys
+        self.hilight_button = ctk.CTkButton(
+            self, text="Tag HiLight",
+            command=lambda: self.hotkey_pressed("hilight"),
+            state="disabled", font=self.WIDGET_FONT)
+        self.hilight_button.grid(row=7, column=0, padx=self.PADX,
+                                 pady=self.PADY, sticky="nsew")
+        self.hotkey_status_text = ctk.CTkLabel(self, text="",
+                                               font=self.WIDGET_FONT)
+        self.hotkey_status_text.grid(row=7, column=1, columnspan=3,
+                                     padx=self.PADX, sticky="w")
+        self.hotkeys = HotkeyController(
+            self.session, on_done=lambda result: self.dispatcher.call(
+                self.hotkey_done, result))
+        for key, action in self.HOTKEYS.items():
+            self.bind(key, lambda event, action=action:
+                      self.hotkey_pressed(action))
+        self.session.photo_pipeline.on_burst = lambda burst:\
+            self.dispatcher.call(self.photo_burst_done, burst)
 
         # set zoom level
         self.zoom_label = ctk.CTkLabel(self, text="Digital Zoom",
@@ -252,12 +501,29 @@ class GoProApp(ctk.CTk):
         default_gopro_name = ctk.StringVar(value="GoPro 5990")
         self.gopro_list = ctk.CTkOptionMenu(
             self, values=["GoPro 5990", "GoPro 8194",
-                          "Connect to First Available"],
+                          CameraSession.FIRST_AVAILABLE,
+                          CameraSession.ALL_GOPROS],
             command=self.select_gopro, variable=default_gopro_name,
             font=self.WIDGET_FONT)
         self.gopro_list.grid(row=4, column=0, padx=self.PADX, pady=self.PADY,
                              sticky="nsew")
 
+        # Save the command latencies with Ctrl+M
+        self.bind("<Control-m>", self.export_metrics)
+
+        # Profile the app with Ctrl+Shift+P or GOPRO_PROFILE=1
+        self.profiler = profiler_from_environment(self.session.session_id)\
+            or SamplingProfiler(self.session.session_id)
+        self.bind("<Control-P>", self.toggle_profiler)
+
+        # Accept commands from other programs
+        self.control_server = None
+        if control_port is not None:
+            self.control_server = ControlServer(
+                self.session, control_port,
+                on_command=lambda result: self.dispatcher.call(
+                    self.control_command_done, result))
+
     def set_resolution(self, choice: str) -> None:
         '''
         Switches the GoPro to a selected resolution
@@ -274,91 +540,27 @@ class GoProApp(ctk.CTk):
         Raises
         ------
         KeyError
-            If there is a resolution selected that was not implemented
+            If there is a resolution selected that is not available on the
+            connected GoPro model
 
         See Also
         --------
-        self.set_frame_rate
+        self.apply_settings
         BatteryIndicator
-
-        Notes
-        -----
-        Newer and older GoPros have different possible resolution and frame
-        rate possibilities. This code was written for a Hero10, but different
-        options should be easy to add.
-        '''
-        # Restrict the frame rates based on the selected resolution
-        match choice:
-            case "1080p":
-                self.gopro.ble_setting.resolution.set(
-                    Params.Resolution.RES_1080)
-                self.frame_rate_dropdown.configure(values=[
-                    "30 fps",
-                    "60 fps",
-                    "120 fps",
-                    "240 fps"
-                ], variable=ctk.StringVar(value="30 fps"))
-                self.set_frame_rate(self.frame_rate_dropdown.get())
-            case "2.7K":
-                self.gopro.ble_setting.resolution.set(
-                    Params.Resolution.RES_2_7K)
-                self.frame_rate_dropdown.configure(values=[
-                    "60 fps",
-                    "120 fps",
-                    "240 fps"
-                ], variable=ctk.StringVar(value="60 fps"))
-                self.set_frame_rate(self.frame_rate_dropdown.get())
-            case "2.7K (4x3)":
-                self.gopro.ble_setting.resolution.set(
-                    Params.Resolution.RES_2_7K_4_3)
-                self.frame_rate_dropdown.configure(values=[
-                    "60 fps",
-                    "120 fps"
-                ], variable=ctk.StringVar(value="60 fps"))
-                self.set_frame_rate(self.frame_rate_dropdown.get())
-            case "4K":
-                self.gopro.ble_setting.resolution.set(
-                    Params.Resolution.RES_4K)
-                self.frame_rate_dropdown.configure(values=[
-                    "24 fps",
-                    "30 fps",
-                    "60 fps",
-                    "120 fps"
-                ], variable=ctk.StringVar(value="24 fps"))
-                self.set_frame_rate(self.frame_rate_dropdown.get())
-            case "4K (4x3)":
-                self.gopro.ble_setting.resolution.set(
-                    Params.Resolution.RES_4K_4_3)
-                self.frame_rate_dropdown.configure(
-                    values=["60 fps"], variable=ctk.StringVar(value="60 fps"))
-                self.set_frame_rate(self.frame_rate_dropdown.get())
-            case "5K (4x3)":
-                self.gopro.ble_setting.resolution.set(
-                    Params.Resolution.RES_5_K_4_3)
-                self.frame_rate_dropdown.configure(
-                    values=["30 fps"], variable=ctk.StringVar(value="30 fps"))
-                self.set_frame_rate(self.frame_rate_dropdown.get())
-            case "5.3K":
-                self.gopro.ble_setting.resolution.set(
-                    Params.Resolution.RES_5_3_K)
-                self.frame_rate_dropdown.configure(values=[
-                    "30 fps",
-                    "60 fps"
-                ], variable=ctk.StringVar(value="30 fps"))
-                self.set_frame_rate(self.frame_rate_dropdown.get())
-            case _:
-                messagebox.showerror(
-                    title="Unknown Resolution",
-                    message="This is not an available resolution")
-                raise KeyError
-        # Refresh the battery indicator with the new video parameters
-        self.poll_battery_callback()
+        '''
+        if choice not in self.session.capabilities.resolutions:
+            messagebox.showerror(
+                title="Unknown Resolution",
+                message="This is not an available resolution")
+            raise KeyError(choice)
+        self.apply_settings(choice, self.frame_rate_dropdown.get(),
+                            self.fov_dropdown.get())
 
     def set_frame_rate(self, choice: str) -> None:
         '''
         Switches the GoPro to a selected frame rate
 
-        Switches the frame rate of the GoPro. Once a new resolution has been
+        Switches the frame rate of the GoPro. Once a new frame rate has been
         selected, the battery indicator updates.
 
         Parameters
@@ -369,98 +571,124 @@ class GoProApp(ctk.CTk):
         Raises
         ------
         KeyError
-            If there is a frame rate selected that was not implemented
+            If there is a frame rate selected that is not available at the
+            current resolution
 
         See Also
         --------
-        self.set_resolution
+        self.apply_settings
         BatteryIndicator
-
-        Notes
-        -----
-        Newer and older GoPros have different possible resolution and frame
-        rate possibilities. This code was written for a Hero10, but different
-        options should be easy to add.
-        '''
-        match choice:
-            case "24 fps":
-                self.gopro.ble_setting.fps.set(
-                    Params.FPS.FPS_24)
-            case "25 fps":
-                self.gopro.ble_setting.fps.set(
-                    Params.FPS.FPS_25)
-            case "30 fps":
-                self.gopro.ble_setting.fps.set(
-                    Params.FPS.FPS_30)
-            case "50 fps":
-                self.gopro.ble_setting.fps.set(
-                    Params.FPS.FPS_50)
-            case "60 fps":
-                self.gopro.ble_setting.fps.set(
-                    Params.FPS.FPS_60)
-            case "100 fps":
-                self.gopro.ble_setting.fps.set(
-                    Params.FPS.FPS_100)
-            case"120 fps":
-                self.gopro.ble_setting.fps.set(
-                    Params.FPS.FPS_120)
-            case "200 fps":
-                self.gopro.ble_setting.fps.set(
-                    Params.FPS.FPS_200)
-            case "240 fps":
-                self.gopro.ble_setting.fps.set(
-                    Params.FPS.FPS_240)
-            case _:
-                messagebox.showerror(
-                    title="Unknown Frame Rate",
-                    message="This is not an available frame rate")
-                raise KeyError
-        # Refresh the battery indicator
-        self.poll_battery_callback()
+        '''
+        resolution = self.resolution_dropdown.get()
+        if choice not in self.session.capabilities.frame_rates(resolution):
+            messagebox.showerror(
+                title="Unknown Frame Rate",
+                message="This is not an available frame rate")
+            raise KeyError(choice)
+        self.apply_settings(resolution, choice, self.fov_dropdown.get())
 
     def set_fov(self, choice: str) -> None:
         '''
         Switches the GoPro to a field of view
 
-        Switches the frame rate of the GoPro. Once a new resolution has been
-        selected, the battery indicator updates.
+        Switches the field of view of the GoPro. Once a new field of view has
+        been selected, the battery indicator updates.
 
         Parameters
         ----------
         choice: str
-            The selected frame rate from the frame_rate_dropdown widget.
+            The selected field of view from the fov_dropdown widget.
 
         Raises
         ------
         KeyError
-            If there is a frame rate selected that was not implemented
+            If there is a field of view selected that is not available at the
+            current resolution and frame rate
+
+        See Also
+        --------
+        self.apply_settings
+        '''
+        resolution = self.resolution_dropdown.get()
+        fps = self.frame_rate_dropdown.get()
+        if choice not in self.session.capabilities.fovs(resolution, fps):
+            messagebox.showerror(title="Unknown FOV",
+                                 message="This FOV is not available")
+            raise KeyError(choice)
+        self.apply_settings(resolution, fps, choice)
+
+    def apply_settings(self, resolution: str, fps: str, fov: str) -> None:
+        '''
+        Sends a valid combination of video settings to the GoPro
+
+        Finds the closest valid combination to the requested settings from the
+        capability index, restricts the dropdowns to the options possible with
+        it, and sends only the settings that differ from what the GoPro already
+        has. Once the settings are sent, the battery indicator updates.
+
+        Parameters
+        ----------
+        resolution: str
+            The resolution label
+        fps: str
+            The wanted frame rate label. If it is not possible at the
+            resolution, the first possible frame rate is used.
+        fov: str
+            The wanted field of view label. If it is not possible at the
+            resolution and frame rate, the first possible field of view is
+            used.
+
+        See Also
+        --------
+        CameraSession.apply_settings
 
         Notes
         -----
-        Newer and older GoPros have different possible fov possibilities. This
-        code was written for a Hero10, but different options should be easy to
-        add.
-        '''
-        match choice:
-            case "Linear":
-                self.gopro.ble_setting.video_field_of_view.set(
-                    Params.VideoFOV.LINEAR)
-            case "Horizon Leveling":
-                self.gopro.ble_setting.video_field_of_view.set(
-                    Params.VideoFOV.LINEAR_HORIZON_LEVELING)
-            case "Narrow":
-                self.gopro.ble_setting.video_field_of_view.set(
-                    Params.VideoFOV.NARROW)
-            case "Super View":
-                self.gopro.ble_setting.video_field_of_view.set(
-                    Params.VideoFOV.SUPERVIEW)
-            case "Wide":
-                self.gopro.ble_setting.video_field_of_view.set(
-                    Params.VideoFOV.WIDE)
-            case _:
-                messagebox.showerror(title="Unknown FOV",
-                                     message="This FOV is not available")
-                raise KeyError
+        Newer and older GoPros have different possible resolution, frame rate,
+        and fov possibilities. These are loaded from the Capabilities folder
+        for the connected model, so new models only need a new data file.
+        '''
+        capabilities = self.session.capabilities
+        resolution, fps, fov = self.session.resolve_settings(resolution, fps,
+                                                             fov)
+
+        # Restrict the dropdowns to the valid options
+        self.resolution_dropdown.set(resolution)
+        self.frame_rate_dropdown.configure(
+            values=capabilities.frame_rates(resolution))
+        self.frame_rate_dropdown.set(fps)
+        self.fov_dropdown.configure(values=capabilities.fovs(resolution, fps))
+        self.fov_dropdown.set(fov)
+
+        _, rejected = self.session.apply_settings(resolution, fps, fov)
+        if rejected is not None:
+            messagebox.showerror(
+                title="Setting Rejected",
+                message=f"The GoPro did not accept the {rejected} setting")
+        # Refresh the battery indicator with the new video parameters
+        self.poll_battery_callback()
+
+    def load_capabilities(self, model: str) -> None:
+        '''
+        Loads the video settings possible on a GoPro model
+
+        Parameters
+        ----------
+        model: str
+            The model name of the GoPro. If there is no capability file for
+            the model, the default model is used.
+
+        Warns
+        -----
+        Warning messagebox if the model does not have a capability file
+        '''
+        if not self.session.load_capabilities(model):
+            messagebox.showwarning(
+                title="Unknown GoPro Model",
+                message=f"No settings are known for {model}. Using the "
+                f"{self.session.camera_model} settings.")
+        self.resolution_dropdown.configure(
+            values=self.session.capabilities.resolutions)
 
     def switch_theme(self, choice: str) -> None:
         '''
@@ -482,15 +710,36 @@ class GoProApp(ctk.CTk):
         '''
         Take an image with the current settings
 
-        Switch to the photo mode in the current settings, take a photo, and
-        switch back to video mode.
+        The photo is queued on the photo pipeline without waiting for it, so
+        quick clicks are taken as one burst with a single switch to photo
+        mode and back to video mode.
+
+        See Also
+        --------
+        CameraSession.take_photo
+        PhotoPipeline
+        '''
+        self.session.photo_pipeline.request()
+
+    def photo_burst_done(self, burst: dict) -> None:
         '''
-        self.gopro.ble_command.load_preset_group(
-                group=Params.PresetGroup.PHOTO)
-        self.gopro.ble_command.set_shutter(shutter=Params.Toggle.ENABLE)
-        self.gopro.ble_command.set_shutter(shutter=Params.Toggle.DISABLE)
-        self.gopro.ble_command.load_preset_group(
-                group=Params.PresetGroup.VIDEO)
+        Show the speed of the last photo burst
+
+        Runs on the Tk thread after the GoPro is back in video mode.
+
+        Parameters
+        ----------
+        burst: dict
+            The burst summary from PhotoPipeline
+        '''
+        text = f"{burst['shots']} photos at "\
+            f"{burst['shots_per_second']:.1f}/s"
+        if burst["latency_ms"]:
+            average = sum(burst["latency_ms"]) / len(burst["latency_ms"])
+            text += f", {average:.0f} ms each"
+        if burst["errors"]:
+            text += f", {burst['errors']} failed"
+        self.hotkey_status_text.configure(text=text)
 
     def save_files(self) -> None:
         '''
@@ -506,31 +755,114 @@ class GoProApp(ctk.CTk):
 
         Notes
         -----
-        If the specified directory does not exist, the code will make it in the
-        Data folder.
-        '''
-        # Make a timestamp
-        timestamp = ""
-        if self.stamp_check.get() == "on":
-            now = dt.datetime.now()
-            timestamp = now.strftime("%Y%m%d_%H%M%S") + "_"
-        # Get the user entered directory name
-        directory_name = self.file_group_entry.get()
-        # Get all of the files on the GoPro
-        gopro_file_list =\
-            self.gopro.http_command.get_media_list().data["files"]
-        file_names = [file["n"] for file in gopro_file_list]
-        # Make a directory for the files to save into
-        local_directory = f"../Data/{directory_name}/"
-        if not os.path.exists(local_directory):
-            os.makedirs(local_directory)
-        # Save out any new files
-        for file in file_names:
-            if file not in self.previously_saved_files:
-                local_file = local_directory + timestamp + file
-                self.gopro.http_command.download_file(camera_file=file,
-                                                      local_file=local_file)
-                self.previously_saved_files.append(file)
+        - If the specified directory does not exist, the code will make it in
+          the Data folder.
+        - The files are saved in the background so the app can still be used.
+          If the connection is lost, saving resumes after reconnecting.
+        - The files from each GoPro in the fleet are saved in a folder named
+          after its serial number.
+        '''
+        self.start_offload(*self.session.save_directory(
+            self.file_group_entry.get(), self.stamp_check.get() == "on"))
+
+    def start_offload(self, local_directory: str, timestamp: str) -> None:
+        '''
+        Start saving out new files in the background
+
+        Can be called from any thread. Nothing happens if files are already
+        being saved.
+
+        Parameters
+        ----------
+        local_directory: str
+            The folder to save the files into
+        timestamp: str
+            The timestamp to add to the front of the file names, or an empty
+            string for no timestamp
+        '''
+        if self.offload_thread is not None and self.offload_thread.is_alive():
+            return
+        self.paused_offload = None
+        self.dispatcher.call(self.save_files_button.configure,
+                             state="disabled", text="Saving Files...")
+        self.offload_thread = threading.Thread(
+            target=self.offload_fleet if self.session.is_fleet()
+            else self.offload_files, args=(local_directory, timestamp),
+            daemon=True, name="offload")
+        self.offload_thread.start()
+
+    def offload_files(self, local_directory: str, timestamp: str) -> None:
+        '''
+        Download every new file from the GoPro
+
+        Runs on the offload thread. If the connection is lost, the save is
+        paused and the connection supervisor is told to reconnect.
+
+        Parameters
+        ----------
+        local_directory: str
+            The folder to save the files into
+        timestamp: str
+            The timestamp to add to the front of the file names
+        '''
+        try:
+            self.session.offload_files(local_directory, timestamp)
+        except Exception as error:
+            if self.session.is_connected():
+                self.dispatcher.call(self.offload_finished, "Save Out Files",
+                                     error)
+                return
+            # Files that finished are skipped when the save resumes
+            self.paused_offload = (local_directory, timestamp)
+            self.dispatcher.call(self.offload_finished, "Save Paused")
+            self.supervisor.notify_failure()
+            return
+        self.dispatcher.call(self.offload_finished, "Save Out Files")
+
+    def offload_fleet(self, local_directory: str, timestamp: str) -> None:
+        '''
+        Download every new file from every GoPro in the fleet at once
+
+        Runs on the offload thread.
+
+        Parameters
+        ----------
+        local_directory: str
+            The folder to make a folder for each GoPro in
+        timestamp: str
+            The timestamp to add to the front of the file names
+
+        See Also
+        --------
+        CameraSession.offload_fleet
+        '''
+        errors = self.session.offload_fleet(local_directory, timestamp)
+        self.dispatcher.call(self.offload_finished, "Save Out Files",
+                             "; ".join(errors) if errors else None)
+
+    def offload_finished(self, status: str,
+                         error: Exception | str | None = None) -> None:
+        '''
+        Show that saving out files stopped
+
+        Parameters
+        ----------
+        status: str
+            The text to show on the save_files_button
+        error: Exception or str, optional
+            The error that stopped the save, which is shown in a messagebox
+
+        Warns
+        -----
+        Error messagebox if the files could not be saved
+        '''
+        self.save_files_button.configure(
+            text=status,
+            state="normal" if self.supervisor.state != "reconnecting"
+            else "disabled")
+        if error is not None:
+            messagebox.showerror(title="Failed to Save Files",
+                                 message=f"The files were not saved: {error}")
 
     def set_zoom(self, value: int) -> None:
         '''
@@ -543,16 +875,23 @@ class GoProApp(ctk.CTk):
         ----------
         value: int
             The slider value from the zoom_slider
+
+        Notes
+        -----
+        The zoom is set over wifi, so it cannot be set on the fleet.
         '''
-        self.gopro.http_command.set_digital_zoom(percent=int(value))
+        if self.session.is_fleet():
+            return
+        self.session.gopro.http_command.set_digital_zoom(percent=int(value))
 
     def select_gopro(self, choice: str) -> None:
         '''
         Select a GoPro to connect to
 
-        Take in the selected GoPro name and makes a new WirelessGoPro object
-        for it. If the name has not been implemented, the first available GoPro
-        will be connected to.
+        Take in the selected GoPro name and switches to its GoPro object if
+        one was already made for it. Otherwise a new object is made when the
+        connection is opened. If the name is not a GoPro name, the first
+        available GoPro will be connected to.
 
         Parameters
         ----------
@@ -563,13 +902,7 @@ class GoProApp(ctk.CTk):
         -----
         Default GoPro names are in the form of "GoPro XXXX".
         '''
-        match choice:
-            case "GoPro 5990":
-                self.gopro_name = "GoPro 5990"
-            case _:
-                self.gopro_name = None
-
-        self.gopro = WirelessGoPro(target=self.gopro_name)
+        self.session.select(choice)
 
     def connect_callback(self) -> None:
         '''
@@ -578,11 +911,13 @@ class GoProApp(ctk.CTk):
         Will only connect when the user confirms the GoPro is in pairing mode.
         When the GoPro is connected, the rest of the GUI becomes enabled. This
         is to prevent the user from entering commands before they should be
-        able to.
+        able to. For the fleet, GoPros that do not connect are left out so
+        the rest can still be used.
 
         Warns
         -----
         Error messagebox if the GoPro does not connect to bluetooth
+        Warning messagebox if some of the fleet GoPros did not connect
 
         Warnings
         --------
@@ -590,12 +925,19 @@ class GoProApp(ctk.CTk):
         first time even if the GoPro says it connected. If the App does not
         give confirmation, it did not work. Close the app and pair again.
 
+        See Also
+        --------
+        CameraSession.connect
+        ConnectionCache
+
         Notes
         -----
         - Even if the GoPro says it is connected, wait for a confirmation to
           appear on screen.
         - The pairing mode for the GoPro is when connecting to the Quik App and
           not connecting to a remote.
+        - GoPros that were connected before are connected to directly first
+          and only scanned for if that fails.
         '''
         # Ask the user if they are in pairing mode and only continue if True
         answer = messagebox.askokcancel(
@@ -603,34 +945,60 @@ class GoProApp(ctk.CTk):
         if not answer:
             return
 
-        # Connect to the GoPro if it is not already connected
-        if not self.gopro.is_ble_connected:
-            self.gopro.open()
+        try:
+            missing = self.session.connect()
+        except ConnectionError as error:
+            messagebox.showerror(title="Failed to Connect",
+                                 message=str(error))
+            return
 
-        # If the GoPro is not connected, enable the rest of teh GUI
-        if self.gopro.is_ble_connected:
+        # The GoPro is connected, so enable the rest of the GUI
+        if missing:
+            messagebox.showwarning(
+                title="Some GoPros Did Not Connect",
+                message=f"Continuing without {', '.join(missing)}")
+        elif self.session.is_fleet():
+            messagebox.showinfo(
+                title="Connection Successful",
+                message=f"{len(self.session.gopro.cameras)} GoPros Connected")
+        else:
             messagebox.showinfo(title="Connection Successful",
                                 message="GoPro Connected")
-            self.gopro.ble_command.load_preset_group(
-                group=Params.PresetGroup.VIDEO)
-            self.connect.configure(state="disabled")
-            self.gopro_list.configure(state="disabled")
-            self.set_resolution(self.resolution_dropdown.get())
-            self.set_frame_rate(self.frame_rate_dropdown.get())
-            self.set_fov(self.fov_dropdown.get())
-            self.frame_rate_dropdown.configure(state="normal")
-            self.resolution_dropdown.configure(state="normal")
-            self.fov_dropdown.configure(state="normal")
-            self.recording_switch.configure(state="normal")
-            self.photo_button.configure(state="normal")
-            self.poll_battery.configure(state="normal")
-            self.save_files_button.configure(state="normal")
-            self.zoom_slider.configure(state="normal")
-            self.poll_battery_callback()
-            self.set_zoom(0)
+        self.connect.configure(state="disabled")
+        self.gopro_list.configure(state="disabled")
+        self.load_capabilities(self.session.camera_model)
+        self.apply_settings(self.resolution_dropdown.get(),
+                            self.frame_rate_dropdown.get(),
+                            self.fov_dropdown.get())
+        self.set_controls_state("normal")
+        self.set_zoom(0)
+        self.supervisor.start()
+        threading.Thread(target=self.sync_clock, daemon=True,
+                         name="clock-sync").start()
+
+    def sync_clock(self) -> None:
+        '''
+        Set the GoPro's clock and show how far it is from the computer's
+
+        Runs on its own thread after connecting, since the clock is read
+        several times over about two seconds. Saved files are then dated by
+        when they were recorded.
+
+        See Also
+        --------
+        CameraSession.sync_clock
+        '''
+        try:
+            result = self.session.sync_clock()
+        except Exception as error:
+            text = f"The GoPro clock was not set: {error}"
         else:
-            messagebox.showerror(title="Failed to Connect",
-                                 message="The GoPro did not connect")
+            if self.session.is_fleet():
+                result = max(result.values(),
+                             key=lambda camera: camera["uncertainty"])
+            text = "GoPro clock set to within "\
+                f"{result['uncertainty'] * 1000:.0f} ms"
+        self.dispatcher.call(self.hotkey_status_text.configure, text=text)
 
     def close_callback(self) -> None:
         '''
@@ -644,31 +1012,590 @@ class GoProApp(ctk.CTk):
         --------
         The closing code needs to run in order to connect again.
         '''
-        if self.gopro.is_ble_connected:
-            self.gopro.close()
-
-        if self.gopro.is_ble_connected:
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            self.scheduler.join()
+        if self.timelapse is not None:
+            self.timelapse.stop()
+            self.timelapse.join()
+        if self.readiness is not None:
+            self.readiness.stop()
+            self.readiness.join()
+        self.supervisor.stop()
+        if not self.session.close():
             messagebox.showerror(title="Failed to Disconnect",
                                  message="The GoPro did not disconnect.")
 
+    def set_controls_state(self, state: str) -> None:
+        '''
+        Enable or disable every control that sends commands to the GoPro
+
+        Parameters
+        ----------
+        state: str
+            Either "normal" or "disabled"
+
+        Notes
+        -----
+        The zoom slider stays disabled while recording. The zoom slider stays
+        disabled for the fleet, which has no wifi, and so does the save button
+        if no GoPro in the fleet has an offload endpoint. While the recording
+        schedule or the time-lapse runs, the recording switch and the other
+        one's switch are disabled, and its own switch stays enabled so it can
+        always be stopped.
+        '''
+        scheduled = self.scheduler is not None and self.scheduler.is_running()
+        timelapse = self.timelapse is not None and self.timelapse.is_running()
+        self.frame_rate_dropdown.configure(state=state)
+        self.resolution_dropdown.configure(state=state)
+        self.fov_dropdown.configure(state=state)
+        self.recording_switch.configure(
+            state="disabled" if scheduled or timelapse else state)
+        self.schedule_switch.configure(
+            state="normal" if scheduled else
+            "disabled" if timelapse else state)
+        self.timelapse_switch.configure(
+            state="normal" if timelapse else
+            "disabled" if scheduled else state)
+        self.photo_button.configure(state=state)
+        self.hilight_button.configure(state=state)
+        self.poll_battery.configure(state=state)
+        self.ready_switch.configure(state=state)
+        if not self.session.can_offload():
+            self.save_files_button.configure(state="disabled")
+        elif self.offload_thread is None or\
+                not self.offload_thread.is_alive():
+            self.save_files_button.configure(state=state)
+        if self.recording_variable.get() == "on" or self.session.is_fleet():
+            self.zoom_slider.configure(state="disabled")
+        else:
+            self.zoom_slider.configure(state=state)
+
+    def reconnect(self) -> bool:
+        '''
+        Try once to reconnect to the GoPro and restore its settings
+
+        Runs on the connection supervisor thread. The selected video settings
+        are sent again once the GoPro reconnects.
+
+        Returns
+        -------
+        bool
+            True if the GoPro reconnected
+
+        See Also
+        --------
+        ConnectionSupervisor
+        CameraSession.reconnect
+        '''
+        return self.session.reconnect()
+
+    def connection_lost(self) -> None:
+        '''
+        Disable the controls while the app reconnects
+
+        Runs on the connection supervisor thread.
+        '''
+        self.dispatcher.call(self.connect.configure, text="Reconnecting...")
+        self.dispatcher.call(self.set_controls_state, "disabled")
+
+    def connection_recovered(self, outage: float) -> None:
+        '''
+        Enable the controls, match the recording switch to the GoPro, and
+        resume saving files after reconnecting
+
+        Runs on the connection supervisor thread.
+
+        Parameters
+        ----------
+        outage: float
+            The seconds the connection was lost for
+        '''
+        self.dispatcher.call(self.connect.configure,
+                             text=f"Reconnected in {outage:.1f}s")
+        self.dispatcher.call(self.set_controls_state, "normal")
+        # The GoPro may have stopped recording while it was disconnected
+        self.dispatcher.call(self.recording_changed, self.session.recording)
+        if self.paused_offload is not None:
+            self.start_offload(*self.paused_offload)
+
     def recording_switch_event(self):
         '''
         Turns video recording on and off with the current video settings
+
+        The fleet is started with a synchronized start, and the skew between
+        the GoPros is saved to the Metrics folder and shown under the battery
+        indicator. The command is sent on its own thread, like a hotkey, so
+        the window does not freeze while the GoPro gets ready. The switch is
+        disabled until the GoPro answers and then shows whether it is
+        recording, so it always matches the GoPro.
+
+        See Also
+        --------
+        recording_done
         '''
-        # If the switch has turned on, record
-        if self.recording_variable.get() == "on":
-            # Make sure the GoPro is in video mode
-            self.gopro.ble_command.load_preset_group(
-                group=Params.PresetGroup.VIDEO)
+        start = self.recording_variable.get() == "on"
+        self.recording_switch.configure(
+            text="Starting" if start else "Stopping", state="disabled")
+        self.zoom_slider.configure(state="disabled")
+        threading.Thread(target=self.send_recording, args=(start,),
+                         daemon=True, name="recording-switch").start()
+
+    def send_recording(self, start: bool) -> None:
+        '''
+        Start or stop recording and show the result on the Tk thread
+
+        Runs on its own thread for the recording switch.
+
+        Parameters
+        ----------
+        start: bool
+            True to start recording, False to stop it
+        '''
+        take = error = battery = None
+        try:
+            if start:
+                take = self.session.start_recording()
+            else:
+                self.session.stop_recording()
+                # Close the battery segment so idle time is not learned
+                battery = self.session.read_battery_percent()
+        except Exception as exception:
+            error = exception
+        self.dispatcher.call(self.recording_done, start, take, error,
+                             battery)
+
+    def recording_done(self, start: bool, take, error: Exception | None,
+                       battery: float | None) -> None:
+        '''
+        Show the result of the recording switch
+
+        Runs on the Tk thread after the GoPro answered.
+
+        Parameters
+        ----------
+        start: bool
+            True if recording was started, False if it was stopped
+        take: TakeTiming or None
+            The timing of a fleet start
+        error: Exception or None
+            The error if the GoPro did not start or stop recording
+        battery: float or None
+            The battery percent read after recording stopped
+
+        Warns
+        -----
+        Error messagebox if the GoPro did not start or stop recording
+        '''
+        self.recording_switch.configure(state="normal")
+        self.show_recording(self.session.recording)
+        if error is not None:
+            messagebox.showerror(
+                title="Recording Not Started" if start
+                else "Recording Not Stopped", message=str(error))
+            return
+        if start:
+            if take is not None and take.errors:
+                messagebox.showerror(
+                    title="Recording Not Started",
+                    message="These GoPros did not start recording: "
+                    f"{', '.join(take.errors)}")
+            # Start a battery segment for the battery estimator
+            self.poll_battery_callback()
+        elif battery is not None:
+            self.battery_estimator.observe(self.battery_key(), battery)
+            self.battery_estimator.end_segment()
+
+    def control_command_done(self, result: dict) -> None:
+        '''
+        Show the result of a command sent through the control server
+
+        The recording switch and the setting dropdowns are updated to match
+        the GoPro without sending the commands again.
+
+        Parameters
+        ----------
+        result: dict
+            The result of the command
+
+        See Also
+        --------
+        run_command
+        '''
+        if not result["ok"]:
+            return
+        match result["command"]:
+            case "record":
+                self.recording_changed(result["recording"])
+            case "settings":
+                settings = result["settings"]
+                capabilities = self.session.capabilities
+                self.resolution_dropdown.set(settings["resolution"])
+                self.frame_rate_dropdown.configure(
+                    values=capabilities.frame_rates(settings["resolution"]))
+                self.frame_rate_dropdown.set(settings["fps"])
+                self.fov_dropdown.configure(values=capabilities.fovs(
+                    settings["resolution"], settings["fps"]))
+                self.fov_dropdown.set(settings["fov"])
+                self.poll_battery_callback()
+
+    def schedule_switch_event(self) -> None:
+        '''
+        Starts or stops recording on the duty cycle schedule
+
+        The duty cycle is read from duty_cycle_entry as the minutes to record
+        and the minutes from the start of one recording to the next. The
+        GoPro sleeps between recordings that are far enough apart.
+
+        Warns
+        -----
+        Error messagebox if the duty cycle cannot be read
+
+        See Also
+        --------
+        RecordingScheduler
+        '''
+        if self.schedule_variable.get() == "off":
+            if self.scheduler is not None:
+                self.scheduler.stop()
+            return
+        try:
+            windows = duty_cycle(*parse_duty_cycle(
+                self.duty_cycle_entry.get()))
+        except ValueError:
+            self.schedule_variable.set("off")
+            messagebox.showerror(
+                title="Invalid Duty Cycle",
+                message="Enter the minutes to record and the minutes between "
+                "recordings, such as 5/30")
+            return
+        self.scheduler = RecordingScheduler(
+            self.session, windows, supervisor=self.supervisor,
+            on_change=lambda state, battery: self.dispatcher.call(
+                self.schedule_changed, state, battery))
+        self.scheduler.start()
+        self.set_controls_state("normal")
+
+    def schedule_changed(self, state: str,
+                         battery: float | None = None) -> None:
+        '''
+        Show what the recording schedule is doing
+
+        Runs on the Tk thread when the schedule changes state. The battery
+        estimator learns from each recording like it does when recording with
+        the switch, using the battery the scheduler read after the recording
+        stopped, and the controls are disabled while the GoPro sleeps.
+
+        Parameters
+        ----------
+        state: str
+            The new RecordingScheduler state
+        battery: float, optional
+            The battery from 0 to 1 if a recording just stopped
+        '''
+        self.recording_changed(state == "recording", battery)
+        if state == "stopped":
+            # The scheduler thread finishes right after this is queued
+            self.scheduler.join()
+            self.schedule_variable.set("off")
+            self.schedule_status_text.configure(
+                text=f"{self.scheduler.windows_recorded} recordings done")
+            self.set_controls_state(
+                "normal" if self.session.is_connected() else "disabled")
+            return
+        # Commands cannot be sent while the GoPro sleeps
+        self.set_controls_state(
+            "disabled" if state in ("sleeping", "waking") else "normal")
+        text = state.capitalize()
+        if self.scheduler.next_change is not None:
+            change = dt.datetime.now() + dt.timedelta(
+                seconds=self.scheduler.next_change - time.monotonic())
+            text += f" until {change:%H:%M:%S}"
+        self.schedule_status_text.configure(text=text)
+
+    def timelapse_switch_event(self) -> None:
+        '''
+        Starts or stops taking photos at a fixed interval
+
+        The interval is read from interval_entry. Photos are saved into the
+        file group folder every few photos while the time-lapse runs and are
+        deleted from the GoPro once saved.
+
+        Warns
+        -----
+        Error messagebox if the interval cannot be read
+
+        See Also
+        --------
+        TimeLapse
+        '''
+        if self.timelapse_variable.get() == "off":
+            if self.timelapse is not None:
+                self.timelapse.stop()
+                self.timelapse_status_text.configure(text="Saving photos...")
+            return
+        try:
+            interval = float(self.interval_entry.get())
+            local_directory, timestamp = self.session.save_directory(
+                self.file_group_entry.get(), self.stamp_check.get() == "on")
+            self.timelapse = TimeLapse(
+                self.session, interval, local_directory=local_directory,
+                timestamp=timestamp,
+                on_frame=lambda frame: self.dispatcher.call(
+                    self.timelapse_frame, frame),
+                on_finish=lambda: self.dispatcher.call(
+                    self.timelapse_finished),
+                on_error=lambda message: self.dispatcher.call(
+                    self.timelapse_error, message))
+        except ValueError:
+            self.timelapse_variable.set("off")
+            messagebox.showerror(
+                title="Invalid Interval",
+                message="Enter the seconds between photos, such as 10")
+            return
+        self.timelapse.start()
+        self.set_controls_state("normal")
+
+    def timelapse_frame(self, frame: dict) -> None:
+        '''
+        Show the progress of the time-lapse
+
+        Parameters
+        ----------
+        frame: dict
+            The result of the last frame from TimeLapse
+        '''
+        self.timelapse_status_text.configure(
+            text=f"{self.timelapse.frames_taken} taken, "
+            f"{self.timelapse.frames_skipped} skipped, "
+            f"{self.timelapse.frames_saved} saved")
+
+    def timelapse_error(self, message: str) -> None:
+        '''
+        Show an error of the running time-lapse
+
+        Parameters
+        ----------
+        message: str
+            The error from TimeLapse
+
+        Warns
+        -----
+        Warning messagebox for the first error of the run, such as photos
+        that could not be deleted from the SD card
+        '''
+        self.timelapse_status_text.configure(text=message)
+        if len(self.timelapse.errors) == 1:
+            messagebox.showwarning(title="Time-Lapse Error", message=message)
+
+    def timelapse_finished(self) -> None:
+        '''
+        Show the result of the time-lapse once its photos are saved
+
+        Warns
+        -----
+        Error messagebox if any photos or saves failed
+        '''
+        # The time-lapse thread finishes right after this is queued
+        self.timelapse.join()
+        self.timelapse_variable.set("off")
+        self.timelapse_frame({})
+        self.set_controls_state(
+            "normal" if self.session.is_connected() else "disabled")
+        if self.timelapse.errors:
+            messagebox.showerror(
+                title="Time-Lapse Errors",
+                message="\n".join(self.timelapse.errors[:10]))
+
+    def ready_switch_event(self) -> None:
+        '''
+        Starts or stops keeping the GoPro ready between recordings
+
+        While on, keep-alives stop the GoPro from saving power and it is
+        pre-armed in video mode, so recordings start faster at the cost of
+        some battery.
+
+        See Also
+        --------
+        ReadinessManager
+        '''
+        if self.ready_variable.get() == "off":
+            if self.readiness is not None:
+                self.readiness.stop()
+                self.show_readiness(self.readiness.report())
+            return
+        self.readiness = ReadinessManager(
+            self.session, on_report=lambda report: self.dispatcher.call(
+                self.show_readiness, report))
+        self.readiness.start()
+        self.ready_status_text.configure(text="Keeping the GoPro ready")
+
+    def show_readiness(self, report: dict) -> None:
+        '''
+        Show the record start times and idle battery use
+
+        Parameters
+        ----------
+        report: dict
+            The report from ReadinessManager
+        '''
+        parts = []
+        for kind in ("armed", "cold"):
+            if report[f"{kind}_start_ms"] is not None:
+                parts.append(f"{kind.capitalize()} start "
+                             f"{report[f'{kind}_start_ms']:.0f} ms")
+        if report["idle_drain_per_hour"] is not None:
+            parts.append(f"Idle {report['idle_drain_per_hour']:.1f}%/h")
+        self.ready_status_text.configure(
+            text=", ".join(parts) or "No recordings started yet")
+
+    def hotkey_pressed(self, action: str) -> None:
+        '''
+        Send the command of a hotkey before updating any widgets
+
+        Only the enabled state of the matching control is read, so nothing is
+        redrawn before the command is handed to the hotkey thread. Presses
+        are ignored while the control is disabled.
+
+        Parameters
+        ----------
+        action: str
+            One of HotkeyController.ACTIONS
+
+        See Also
+        --------
+        HotkeyController.press
+        '''
+        control = {"photo": self.photo_button,
+                   "hilight": self.hilight_button}.get(
+                       action, self.recording_switch)
+        if control.cget("state") == "disabled":
+            return
+        self.hotkeys.press(action)
+
+    def hotkey_done(self, result: dict) -> None:
+        '''
+        Show the result of a hotkey press
+
+        Runs on the Tk thread after the GoPro answered.
+
+        Parameters
+        ----------
+        result: dict
+            The result from HotkeyController
+        '''
+        if result["action"] == "record":
+            self.recording_changed(result["recording"])
+        if result["ok"] and result.get("offset") is not None:
+            offset = dt.timedelta(seconds=round(result["offset"]))
+            self.hotkey_status_text.configure(
+                text=f"HiLight at {offset} sent in "
+                f"{result['latency_ms']:.0f} ms")
+        elif result["ok"]:
+            self.hotkey_status_text.configure(
+                text=f"{result['action'].capitalize()} sent in "
+                f"{result['latency_ms']:.0f} ms")
+        else:
+            self.hotkey_status_text.configure(
+                text=f"{result['action'].capitalize()} failed: "
+                f"{result.get('error', 'the GoPro did not accept it')}")
+
+    def recording_changed(self, recording: bool,
+                          battery: float | None = None) -> None:
+        '''
+        Update the recording switch and battery estimator after recording
+        was started or stopped without the switch
+
+        The battery estimator learns from each recording like it does when
+        recording with the switch.
+
+        Parameters
+        ----------
+        recording: bool
+            True if the GoPro is now recording
+        battery: float, optional
+            The battery from 0 to 1 read after the recording stopped. It is
+            read from the GoPro if not given.
+        '''
+        if recording == (self.recording_variable.get() == "on"):
+            return
+        self.show_recording(recording)
+        if recording:
+            self.poll_battery_callback()
+        elif battery is not None or self.session.is_connected():
+            if battery is None:
+                battery = self.session.read_battery_percent()
+            self.battery_estimator.observe(self.battery_key(), battery)
+            self.battery_estimator.end_segment()
+
+    def show_recording(self, recording: bool) -> None:
+        '''
+        Set the recording switch without sending a command
+
+        Parameters
+        ----------
+        recording: bool
+            True if the GoPro is recording
+        '''
+        if recording:
+            self.recording_variable.set("on")
             self.recording_switch.configure(text="Recording",
                                             button_color="red")
             self.zoom_slider.configure(state="disabled")
-            self.gopro.ble_command.set_shutter(shutter=Params.Toggle.ENABLE)
         else:
+            self.recording_variable.set("off")
             self.recording_switch.configure(text="Standby",
                                             button_color="white")
-            self.zoom_slider.configure(state="normal")
-            self.gopro.ble_command.set_shutter(shutter=Params.Toggle.DISABLE)
+            if not self.session.is_fleet():
+                self.zoom_slider.configure(state="normal")
+
+    def export_metrics(self, event=None) -> None:
+        '''
+        Save the GoPro command latencies to the Metrics folder
+
+        Writes the p50, p95, and p99 latency and the error and retry counts of
+        every GoPro command sent so far to a timestamped CSV file and to a
+        Prometheus textfile that is overwritten on each export.
+
+        Parameters
+        ----------
+        event: Event, optional
+            The key press that asked for the export
+
+        See Also
+        --------
+        CommandMetrics
+        '''
+        timestamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+        csv_file = f"../Metrics/{timestamp}_command_metrics.csv"
+        self.session.command_metrics.export_csv(csv_file)
+        self.session.command_metrics.export_prometheus(
+            "../Metrics/command_metrics.prom")
+        messagebox.showinfo(title="Metrics Saved",
+                            message=f"Command metrics saved to {csv_file}")
+
+    def toggle_profiler(self, event=None) -> None:
+        '''
+        Start sampling stacks, or stop and save them
+
+        Parameters
+        ----------
+        event: Event, optional
+            The key press that toggled the profiler
+
+        See Also
+        --------
+        SamplingProfiler
+        '''
+        if not self.profiler.is_running():
+            self.profiler.start()
+            self.hotkey_status_text.configure(
+                text="Profiling, press Ctrl+Shift+P to save")
+            return
+        path = self.profiler.stop()
+        self.hotkey_status_text.configure(text="")
+        messagebox.showinfo(title="Profile Saved",
+                            message=f"Stack samples saved to {path}")
 
     def poll_battery_callback(self) -> None:
         '''
@@ -676,19 +1603,48 @@ class GoProApp(ctk.CTk):
 
         Polls the battery percent and SD card's remaining space to update the
         GUI elements for battery percent, life, and SD card recording room.
+        For the fleet, the indicator shows the lowest battery and SD card room
+        of any GoPro and each GoPro's status is listed under it. While
+        recording, the battery percent is also given to the battery
+        estimator to learn the battery life of the current video settings.
 
         See Also
         --------
         BatteryIndicator.update()
+        BatteryEstimator.observe()
+        '''
+        battery_percent = self.session.read_battery_percent()
+        if self.recording_variable.get() == "on":
+            self.battery_estimator.observe(self.battery_key(),
+                                           battery_percent)
+        self.battery_indicator.update(
+            battery_percent, self.resolution_dropdown.get(),
+            self.frame_rate_dropdown.get(),
+            time_remaining=self.session.read_card_seconds(),
+            fov=self.fov_dropdown.get(), model=self.session.camera_model)
+        if self.session.is_fleet():
+            fleet = self.session.gopro
+            status = fleet.status_summary()
+            if fleet.takes:
+                skew = fleet.takes[-1].ack_skew() * 1000
+                status += f" | Last start skew: {skew:.1f} ms"
+            self.fleet_status_text.configure(text=status)
+        if self.readiness is not None and self.readiness.is_running():
+            self.show_readiness(self.readiness.report())
+
+    def battery_key(self) -> str:
+        '''
+        The name of the current video settings for the battery estimator
+
+        Returns
+        -------
+        str
+            The camera model, resolution, frame rate, and field of view
         '''
-        battery_percent_dict = self.gopro.ble_status.int_batt_per.get_value()
-        battery_percent = list(battery_percent_dict.values())[0] / 100
-        time_remaining_dict = self.gopro.ble_status.video_rem.get_value().data
-        time_remaining = list(time_remaining_dict.values())[0]
-        self.battery_indicator.update(battery_percent,
-                                      self.resolution_dropdown.get(),
-                                      self.frame_rate_dropdown.get(),
-                                      time_remaining=time_remaining)
+        return BatteryEstimator.key(self.session.camera_model,
+                                    self.resolution_dropdown.get(),
+                                    self.frame_rate_dropdown.get(),
+                                    self.fov_dropdown.get())
 
 
 class BatteryIndicator(ctk.CTkFrame):
@@ -697,8 +1653,9 @@ class BatteryIndicator(ctk.CTkFrame):
 
     Shows the remaining battery life and SD recording room. The battery life
     is found by showing the GoPro's battery percentage and a battery life time
-    based on a table of battery life times during constant recording shown in
-    the ReadMe
+    from the battery estimator. The estimator learns the battery life of each
+    video setting and falls back on a table of battery life times during
+    constant recording shown in the ReadMe until it has enough data.
 
     Attributes
     ----------
@@ -706,6 +1663,8 @@ class BatteryIndicator(ctk.CTkFrame):
         Battery life times from GoPro's support site
     PADX: int
         Pixel padding to the left and right of the widgets
+    estimator: BatteryEstimator
+        Estimates the battery life from the battery percent and video settings
     battery_percent_text: CTkLabel
         The text for the percent of the battery left
     battery_percent_bar: CTkProgressBar
@@ -718,17 +1677,22 @@ class BatteryIndicator(ctk.CTkFrame):
         The title for the SD card recording room left
     sd_time_text
         Shows the amount of time you can record with the current settings
+    rendered: Dict[str, str or float]
+        The view state last shown by the widgets
 
     Methods
     -------
-    __init__(*args, **kwargs)
+    __init__(*args, estimator, **kwargs)
         Setup all of the elements of the battery indicator widget
-    update(battery_percent, resolution, fps, time_remaining)
-        Updates all of the GUI elements based on polled values
+    view_state(battery_percent, resolution, fps, time_remaining, fov, model)
+        What the widgets should show for polled values
+    update(battery_percent, resolution, fps, time_remaining, fov, model)
+        Updates the GUI elements that changed based on polled values
 
     See Also
     --------
     GoProApp
+    BatteryEstimator
 
     References
     ----------
@@ -772,12 +1736,22 @@ class BatteryIndicator(ctk.CTkFrame):
     LABEL_FONT = ("Inter", 20)
     WIDGET_FONT = ("Inter", 16)
 
-    def __init__(self, *args, **kwargs) -> None:
+    def __init__(self, *args, estimator: BatteryEstimator | None = None,
+                 **kwargs) -> None:
         '''
         Setup all of the elements of the battery indicator widget
+
+        Parameters
+        ----------
+        estimator: BatteryEstimator, optional
+            The estimator to find the battery life with. If not given, a new
+            estimator is made with BATTERY_RECORDING_TIMES as its fallback.
         '''
         super().__init__(*args, **kwargs)
         self.configure(fg_color="transparent")
+        if estimator is None:
+            estimator = BatteryEstimator(self.BATTERY_RECORDING_TIMES)
+        self.estimator = estimator
 
         # Battery Percentage
         self.battery_percent_text = ctk.CTkLabel(self, text="",
@@ -802,19 +1776,20 @@ class BatteryIndicator(ctk.CTkFrame):
         self.sd_time_text = ctk.CTkLabel(self, text="0 minutes",
                                          font=self.WIDGET_FONT)
         self.sd_time_text.grid(row=1, column=2, padx=self.PADX, sticky="nsew")
+        self.rendered = {}
         self.update(0.0, "", "", 0)
 
-    def update(self, battery_percent: float, resolution: str, fps: str,
-               time_remaining: int) -> None:
+    def view_state(self, battery_percent: float, resolution: str, fps: str,
+                   time_remaining: int, fov: str = "",
+                   model: str = "") -> dict:
         '''
-        Updates all of the GUI elements based on polled values
+        What the widgets should show for polled values
 
-        Takes in the polled values for the battery percent, video parameters,
-        and the amount of recording room left on the SD Card in order to
-        update the appearance of the battery indicator. The color of the
-        percentage bar is affected by the battery percent as well. The time
-        left on the battery is found using the resolution and fps values to
-        reference the BATTERY_RECORDING_TIMES dictionary.
+        The color of the percentage bar is affected by the battery percent.
+        The time left on the battery is found by the battery estimator from
+        the video settings, which uses the BATTERY_RECORDING_TIMES dictionary
+        until it has learned the battery life of those settings. No widget is
+        changed.
 
         Parameters
         ----------
@@ -827,43 +1802,114 @@ class BatteryIndicator(ctk.CTkFrame):
         time_remaining: int
             The time in seconds left to record with the current resolution and
             fps values. This is polled directly from the GoPro
+        fov: str, default=""
+            The selected field of view from the fov_dropdown menu
+        model: str, default=""
+            The model name of the GoPro
+
+        Returns
+        -------
+        Dict[str, str or float]
+            The "bar_color", "bar_value", "percent_text", "battery_time_text",
+            and "sd_time_text" to show
         '''
         # Change the color of the battery percentage bar based on the
         # percentage. High > 60%, 60% > Medium > 20%, Low < 20%
         if battery_percent > 0.6:
-            self.battery_bar.configure(progress_color="green")
+            bar_color = "green"
         elif battery_percent > 0.2:
-            self.battery_bar.configure(progress_color="yellow")
+            bar_color = "yellow"
         else:
-            self.battery_bar.configure(progress_color="red")
-
-        # Display the battery percentage
-        self.battery_percent_text.\
-            configure(text=f"{int(battery_percent*100)}%")
+            bar_color = "red"
 
-        # Find and display the remaining battery time
-        try:
-            time =\
-                self.BATTERY_RECORDING_TIMES[resolution][fps] * battery_percent
-        except KeyError:
-            self.battery_time_text.configure(text="0 minutes")
+        # Find the remaining battery time
+        time = self.estimator.estimate(
+            BatteryEstimator.key(model, resolution, fps, fov), battery_percent)
+        if time is None:
+            battery_time = "0 minutes"
         else:
             minutes = int(time // 1)
             seconds = round(time % 1 * 60)
-            self.battery_time_text.configure(text=f"{minutes}m {seconds}s")
-        self.battery_bar.set(battery_percent)
+            battery_time = f"{minutes}m {seconds}s"
 
         # Show the remaining time to record in hours, minutes, and seconds
         hours, minutes, seconds =\
             str(dt.timedelta(seconds=time_remaining)).split(":")
-        time_on_card = (f"{hours}h {minutes}m {seconds}s")
-        self.sd_time_text.configure(text=time_on_card)
+        return {
+            "bar_color": bar_color,
+            "bar_value": battery_percent,
+            "percent_text": f"{int(battery_percent*100)}%",
+            "battery_time_text": battery_time,
+            "sd_time_text": f"{hours}h {minutes}m {seconds}s",
+        }
+
+    def update(self, battery_percent: float, resolution: str, fps: str,
+               time_remaining: int, fov: str = "", model: str = "") -> None:
+        '''
+        Updates the GUI elements that changed based on polled values
+
+        Takes in the polled values for the battery percent, video parameters,
+        and the amount of recording room left on the SD Card, finds what the
+        battery indicator should show with view_state, and only reconfigures
+        the widgets whose shown value is different from the last update.
+        Every configure redraws its widget, so a poll that reads the same
+        values as the last one does not redraw anything.
+
+        Parameters
+        ----------
+        battery_percent: float
+            The polled battery percentage from the GoPro
+        resolution: str
+            The selected resolution from the resolution_dropdown menu
+        fps: str
+            The selected frame rate from the frame_rate_dropdown menu
+        time_remaining: int
+            The time in seconds left to record with the current resolution and
+            fps values. This is polled directly from the GoPro
+        fov: str, default=""
+            The selected field of view from the fov_dropdown menu
+        model: str, default=""
+            The model name of the GoPro
+
+        See Also
+        --------
+        view_state
+        '''
+        state = self.view_state(battery_percent, resolution, fps,
+                                time_remaining, fov, model)
+        changed = {key for key, value in state.items()
+                   if self.rendered.get(key) != value}
+        if "bar_color" in changed:
+            self.battery_bar.configure(progress_color=state["bar_color"])
+        if "bar_value" in changed:
+            self.battery_bar.set(state["bar_value"])
+        if "percent_text" in changed:
+            self.battery_percent_text.configure(text=state["percent_text"])
+        if "battery_time_text" in changed:
+            self.battery_time_text.configure(
+                text=state["battery_time_text"])
+        if "sd_time_text" in changed:
+            self.sd_time_text.configure(text=state["sd_time_text"])
+        self.rendered = state
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="App to control a GoPro")
+    add_simulator_arguments(parser)
+    parser.add_argument("--control-port", type=int, default=None,
+                        help="accept commands from other programs over HTTP "
+                        "on this localhost port")
+    arguments = parser.parse_args()
+
     # Create app and close the GoPro connection safety when the app is closed
-    app = GoProApp()
+    app = GoProApp(simulator_options_from(arguments), arguments.control_port)
     try:
         app.mainloop()
     finally:
+        app.loop_monitor.stop()
+        app.profiler.stop()
+        if app.control_server is not None:
+            app.control_server.close()
+        app.hotkeys.close()
         app.close_callback()
+        app.battery_estimator.close()
@@ -0,0 +1,419 @@
+import datetime as dt
+import itertools
+import threading
+import time
+
+from instrumentation import append_csv_row
+
+
+def duty_cycle(record_seconds: float, period_seconds: float,
+               count: int | None = None):
+    '''
+    The recording windows of a repeating duty cycle
+
+    Parameters
+    ----------
+    record_seconds: float
+        The seconds recorded in each window
+    period_seconds: float
+        The seconds from the start of one window to the start of the next
+    count: int, optional
+        The number of windows. Repeats forever if not given.
+
+    Returns
+    -------
+    Iterator[Tuple[float, float]]
+        The start and stop of each window in seconds after the schedule
+        starts
+
+    Raises
+    ------
+    ValueError
+        If a window is not shorter than the period
+    '''
+    if not 0 < record_seconds < period_seconds:
+        raise ValueError("The recording must be shorter than the period")
+    windows = itertools.count() if count is None else range(count)
+    return ((index * period_seconds, index * period_seconds + record_seconds)
+            for index in windows)
+
+
+def parse_duty_cycle(text: str) -> tuple:
+    '''
+    Reads a duty cycle written as "<record minutes>/<period minutes>"
+
+    Parameters
+    ----------
+    text: str
+        The duty cycle, such as "5/30" for 5 minutes every 30 minutes
+
+    Returns
+    -------
+    Tuple[float, float]
+        The seconds recorded in each window and the seconds between windows
+
+    Raises
+    ------
+    ValueError
+        If the text is not two numbers separated by a slash
+    '''
+    record, period = text.split("/")
+    return float(record) * 60, float(period) * 60
+
+
+class RecordingScheduler:
+    '''
+    Records in windows from a schedule so long sessions use less battery
+
+    Each window is timed from one monotonic start time, so a late command
+    or a slow reconnection never pushes back the windows after it. The
+    shutter is sent early by the time it took to answer last time, so the
+    GoPro is recording at the scheduled time. Between windows that are far
+    enough apart, the GoPro is put to sleep and woken up again a little
+    before the next window. The battery is read after each recording stops,
+    before the GoPro is put to sleep, and given to the listener with the new
+    state. The scheduled and actual time of every start, stop, sleep, and
+    wake are added to a CSV file.
+
+    Attributes
+    ----------
+    WAKE_LEAD: float
+        The seconds before a window that a sleeping GoPro is woken up
+    SLEEP_MIN_GAP: float
+        The fewest seconds between windows for the GoPro to be put to sleep
+    RETRY_DELAY: float
+        The seconds between attempts to wake up, restart, or stop the GoPro
+    STOP_ATTEMPTS: int
+        The most times the stop of a window is sent before moving on, since
+        a GoPro that is not stopped records until the next window
+    session: CameraSession
+        The connected session the windows are recorded on
+    windows: Iterator[Tuple[float, float]]
+        The start and stop of each window in seconds after the start
+    sleep_between: bool
+        If the GoPro is put to sleep between windows
+    supervisor: ConnectionSupervisor or None
+        Stopped while the GoPro sleeps so it does not wake it up
+    on_change: Callable[[str, float or None], None] or None
+        Called on the scheduler thread with the new state and the battery
+        from 0 to 1 if a recording just stopped, otherwise None
+    log_path: str
+        The CSV file the start and stop times are added to
+    state: str
+        "stopped", "waiting", "recording", "sleeping", or "waking"
+    next_change: float or None
+        The time.monotonic time of the next start or stop
+    windows_recorded: int
+        The number of windows recorded so far
+    battery_percent: float or None
+        The battery from 0 to 1 read after the last recording stopped, or
+        None if it was not read
+    errors: List[str]
+        The commands that failed
+
+    Methods
+    -------
+    __init__(session, windows, sleep_between, supervisor, on_change,
+             log_path)
+        Sets up the scheduler without starting it
+    start()
+        Starts running the windows on a background thread
+    stop()
+        Stops the schedule and stops any recording in progress
+    join(timeout)
+        Waits for the schedule to finish
+    is_running()
+        Check if the schedule is still running
+
+    See Also
+    --------
+    duty_cycle
+    CameraSession.sleep
+    '''
+    WAKE_LEAD = 20.0
+    SLEEP_MIN_GAP = 60.0
+    RETRY_DELAY = 2.0
+    STOP_ATTEMPTS = 5
+
+    def __init__(self, session, windows, sleep_between: bool = True,
+                 supervisor=None, on_change=None,
+                 log_path: str = "../Metrics/recording_schedule.csv") -> None:
+        '''
+        Sets up the scheduler without starting it
+
+        Parameters
+        ----------
+        session: CameraSession
+            The connected session the windows are recorded on
+        windows: Iterable[Tuple[float, float]]
+            The start and stop of each window in seconds after the start, in
+            order, such as from duty_cycle
+        sleep_between: bool, default=True
+            If the GoPro is put to sleep between windows
+        supervisor: ConnectionSupervisor, optional
+            Stopped while the GoPro sleeps and started again once it wakes
+        on_change: Callable[[str, float or None], None], optional
+            Called on the scheduler thread with the new state and the battery
+            from 0 to 1 if a recording just stopped, otherwise None
+        log_path: str, default="../Metrics/recording_schedule.csv"
+            The CSV file the start and stop times are added to
+        '''
+        self.session = session
+        self.windows = iter(windows)
+        self.sleep_between = sleep_between
+        self.supervisor = supervisor
+        self.on_change = on_change
+        self.log_path = log_path
+        self.state = "stopped"
+        self.next_change = None
+        self.windows_recorded = 0
+        self.battery_percent = None
+        self.errors = []
+        self._stopped = threading.Event()
+        self._thread = None
+        self._origin = 0.0
+        self._origin_time = dt.datetime.now()
+        self._start_lead = 0.0
+        self._stop_lead = 0.0
+
+    def start(self) -> None:
+        '''
+        Starts running the windows on a background thread
+
+        The window times are counted from now.
+        '''
+        if self.is_running():
+            return
+        self._stopped.clear()
+        self._origin = time.monotonic()
+        self._origin_time = dt.datetime.now()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="recording-scheduler")
+        self._thread.start()
+
+    def stop(self) -> None:
+        '''
+        Stops the schedule and stops any recording in progress
+        '''
+        self._stopped.set()
+
+    def join(self, timeout: float | None = None) -> None:
+        '''
+        Waits for the schedule to finish
+
+        Parameters
+        ----------
+        timeout: float, optional
+            The most seconds to wait
+        '''
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_running(self) -> bool:
+        '''
+        Check if the schedule is still running
+
+        Returns
+        -------
+        bool
+            True if the scheduler thread is running
+        '''
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        '''
+        Records every window until the schedule ends or is stopped
+        '''
+        try:
+            for index, (start, stop) in enumerate(self.windows):
+                start_at = self._origin + start
+                stop_at = self._origin + stop
+                if time.monotonic() >= stop_at:
+                    self._log(index, "skipped", start_at, time.monotonic())
+                    continue
+                wake_at = start_at - self.WAKE_LEAD
+                if self.sleep_between and\
+                        start_at - time.monotonic() >= self.SLEEP_MIN_GAP:
+                    self._sleep(index, wake_at)
+                if self.state == "sleeping":
+                    if not self._wait_until(wake_at) or\
+                            not self._wake(index, wake_at, stop_at):
+                        break
+                self._set_state("waiting", start_at)
+                if not self._wait_until(start_at - self._start_lead):
+                    break
+                self._record(index, start_at, stop_at)
+                if self._stopped.is_set():
+                    break
+        finally:
+            battery = None
+            if self.state == "recording":
+                if self._shutter(None, False, time.monotonic()):
+                    battery = self._read_battery()
+            elif self.state == "sleeping":
+                self._wake(None, time.monotonic(), time.monotonic())
+            self._set_state("stopped", None, battery)
+
+    def _record(self, index: int, start_at: float, stop_at: float) -> None:
+        '''
+        Records one window, trying again if the GoPro did not start or stop
+        '''
+        while not self._shutter(index, True, start_at):
+            retry_at = min(time.monotonic() + self.RETRY_DELAY, stop_at)
+            if not self._wait_until(retry_at) or retry_at >= stop_at:
+                return
+            self._restore_connection()
+        self._set_state("recording", stop_at)
+        self._wait_until(stop_at - self._stop_lead)
+        for attempt in range(self.STOP_ATTEMPTS):
+            if attempt > 0:
+                if not self._wait_until(time.monotonic() + self.RETRY_DELAY):
+                    # The stop is sent again as the schedule ends
+                    return
+                self._restore_connection()
+            if self._shutter(index, False, stop_at):
+                self.windows_recorded += 1
+                self._set_state("waiting", None, self._read_battery())
+                return
+
+    def _shutter(self, index: int | None, enable: bool,
+                 scheduled: float) -> bool:
+        '''
+        Starts or stops recording and logs when the GoPro answered
+
+        The time the command took is used as the lead of the next one.
+        '''
+        event = "start" if enable else "stop"
+        sent = time.monotonic()
+        try:
+            if enable:
+                take = self.session.start_recording()
+                if take is not None and take.errors:
+                    raise ConnectionError(
+                        f"{', '.join(take.errors)} did not start")
+            else:
+                self.session.stop_recording()
+        except Exception as error:
+            self.errors.append(f"{event}: {error}")
+            self._log(index, f"{event} failed", scheduled, time.monotonic(),
+                      str(error))
+            return False
+        answered = time.monotonic()
+        if enable:
+            self._start_lead = answered - sent
+        else:
+            self._stop_lead = answered - sent
+        self._log(index, event, scheduled, answered)
+        return True
+
+    def _read_battery(self) -> float | None:
+        '''
+        Reads the battery after a recording stopped, or None if it failed
+        '''
+        try:
+            self.battery_percent = self.session.read_battery_percent()
+        except Exception as error:
+            self.errors.append(f"battery: {error}")
+            self.battery_percent = None
+        return self.battery_percent
+
+    def _sleep(self, index: int, wake_at: float) -> None:
+        '''
+        Puts the GoPro to sleep until the next window
+        '''
+        if self.supervisor is not None:
+            self.supervisor.stop()
+        try:
+            self.session.sleep()
+        except Exception as error:
+            self.errors.append(f"sleep: {error}")
+            self._log(index, "sleep failed", time.monotonic(),
+                      time.monotonic(), str(error))
+            if self.supervisor is not None:
+                self.supervisor.start()
+            return
+        self._log(index, "sleep", time.monotonic(), time.monotonic())
+        self._set_state("sleeping", wake_at)
+
+    def _wake(self, index: int | None, scheduled: float,
+              stop_at: float) -> bool:
+        '''
+        Wakes up the GoPro by reconnecting until it answers or the window
+        ends
+
+        The connection supervisor takes over if the GoPro does not wake up
+        in time.
+
+        Returns
+        -------
+        bool
+            False if the schedule was stopped while waking up
+        '''
+        self._set_state("waking", None)
+        while not (woke := self._restore_connection()):
+            retry_at = min(time.monotonic() + self.RETRY_DELAY, stop_at)
+            if not self._wait_until(retry_at) or retry_at >= stop_at:
+                break
+        self._log(index, "wake" if woke else "wake failed", scheduled,
+                  time.monotonic())
+        if self.supervisor is not None:
+            self.supervisor.start()
+        return not self._stopped.is_set()
+
+    def _restore_connection(self) -> bool:
+        '''
+        Reconnects to the GoPro if it is not connected
+        '''
+        if self.session.is_connected():
+            return True
+        try:
+            return self.session.reconnect()
+        except Exception:
+            return False
+
+    def _wait_until(self, deadline: float) -> bool:
+        '''
+        Waits until a time.monotonic time
+
+        Returns
+        -------
+        bool
+            False if the schedule was stopped while waiting
+        '''
+        remaining = deadline - time.monotonic()
+        if remaining > 0:
+            return not self._stopped.wait(remaining)
+        return not self._stopped.is_set()
+
+    def _set_state(self, state: str, next_change: float | None,
+                   battery: float | None = None) -> None:
+        '''
+        Changes the state and tells the listener
+        '''
+        self.state = state
+        self.next_change = next_change
+        if self.on_change is not None:
+            self.on_change(state, battery)
+
+    def _log(self, index: int | None, event: str, scheduled: float,
+             actual: float, error: str = "") -> None:
+        '''
+        Adds an event with its scheduled and actual time to the CSV file
+
+        Both times are counted from the monotonic start of the schedule so
+        changes to the computer clock do not shift them.
+        '''
+        append_csv_row(
+            self.log_path, ["schedule", "window", "event", "scheduled",
+                            "actual", "error_ms", "error"],
+            [self._origin_time.isoformat(), "" if index is None else index,
+             event, self._wall_time(scheduled).isoformat(),
+             self._wall_time(actual).isoformat(),
+             f"{(actual - scheduled) * 1000:.1f}", error])
+
+    def _wall_time(self, monotonic: float) -> dt.datetime:
+        '''
+        The clock time of a time.monotonic time during the schedule
+        '''
+        return self._origin_time + dt.timedelta(
+            seconds=monotonic - self._origin)
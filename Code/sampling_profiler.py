@@ -0,0 +1,178 @@
+import collections
+import datetime as dt
+import os
+import sys
+import threading
+
+
+class SamplingProfiler:
+    '''
+    Samples the stacks of every thread to find where the app spends its time
+
+    A background thread reads the stack of the Tk thread and every worker
+    thread a hundred times a second with sys._current_frames, which does not
+    slow the sampled threads down, and counts how often each stack is seen.
+    Stopping writes the counts in the collapsed stack format read by
+    flamegraph.pl, speedscope, and other flame graph tools, one line per
+    stack with its frames from the thread name down to the innermost call
+    separated by semicolons and followed by its count. The file is named
+    after the session ID so it can be matched with the session's events.
+
+    Samples are of wall time, so threads waiting on the GoPro or a queue
+    show up in their waiting function.
+
+    Attributes
+    ----------
+    INTERVAL: float
+        The default seconds between samples
+    ENVIRONMENT_VARIABLE: str
+        The environment variable that turns profiling on when it is "1"
+    session_id: str
+        The ID of the session in the file name
+    interval: float
+        The seconds between samples
+    directory: str
+        The folder the collapsed stacks are written to
+    samples: int
+        The number of times the threads were sampled so far
+
+    Methods
+    -------
+    __init__(session_id, interval, directory)
+        Sets up the profiler without starting it
+    start()
+        Starts sampling on a background thread
+    stop()
+        Stops sampling and writes the collapsed stacks
+    is_running()
+        Check if the profiler is sampling
+
+    See Also
+    --------
+    profiler_from_environment
+    '''
+    INTERVAL = 0.01
+    ENVIRONMENT_VARIABLE = "GOPRO_PROFILE"
+
+    def __init__(self, session_id: str, interval: float = INTERVAL,
+                 directory: str = "../Metrics/profiles") -> None:
+        '''
+        Sets up the profiler without starting it
+
+        Parameters
+        ----------
+        session_id: str
+            The ID of the session in the file name
+        interval: float, default=INTERVAL
+            The seconds between samples
+        directory: str, default="../Metrics/profiles"
+            The folder the collapsed stacks are written to
+        '''
+        self.session_id = session_id
+        self.interval = interval
+        self.directory = directory
+        self.samples = 0
+        self._stacks = collections.Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        '''
+        Starts sampling on a background thread
+
+        The counts of an earlier run are cleared.
+        '''
+        if self.is_running():
+            return
+        self._stacks.clear()
+        self.samples = 0
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="sampling-profiler")
+        self._thread.start()
+
+    def stop(self) -> str | None:
+        '''
+        Stops sampling and writes the collapsed stacks
+
+        Returns
+        -------
+        str or None
+            The file the stacks were written to, or None if the profiler
+            was not running
+        '''
+        if not self.is_running():
+            return None
+        self._stopped.set()
+        self._thread.join()
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        stamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.directory,
+                            f"profile_{self.session_id}_{stamp}.folded")
+        with open(path, "w") as profile_file:
+            for stack, count in self._stacks.most_common():
+                profile_file.write(f"{stack} {count}\n")
+        return path
+
+    def is_running(self) -> bool:
+        '''
+        Check if the profiler is sampling
+
+        Returns
+        -------
+        bool
+            True if the sampling thread is running
+        '''
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        '''
+        Samples every thread until stopped
+        '''
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name
+                     for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                self._stacks[_collapse(names.get(ident, str(ident)),
+                                       frame)] += 1
+            self.samples += 1
+
+
+def profiler_from_environment(session_id: str) -> SamplingProfiler | None:
+    '''
+    Starts a profiler if the GOPRO_PROFILE environment variable is "1"
+
+    Parameters
+    ----------
+    session_id: str
+        The ID of the session in the file name
+
+    Returns
+    -------
+    SamplingProfiler or None
+        The running profiler, or None if profiling is off
+    '''
+    if os.environ.get(SamplingProfiler.ENVIRONMENT_VARIABLE) != "1":
+        return None
+    profiler = SamplingProfiler(session_id)
+    profiler.start()
+    return profiler
+
+
+def _collapse(thread_name: str, frame) -> str:
+    '''
+    A stack as semicolon separated frames from the thread name inward
+    '''
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} "
+                      f"({os.path.basename(code.co_filename)})")
+        frame = frame.f_back
+    frames.append(thread_name)
+    # Semicolons separate the frames in the format
+    return ";".join(name.replace(";", ",") for name in reversed(frames))
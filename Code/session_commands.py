@@ -0,0 +1,492 @@
+import argparse
+import threading
+import time
+
+from camera_session import CameraSession
+from readiness import ReadinessManager
+from recording_scheduler import RecordingScheduler, duty_cycle
+from timelapse import TimeLapse
+
+# The commands that run in the background with "start" and "stop" actions
+JOB_COMMANDS = ("timelapse", "schedule", "readiness")
+
+
+def run_command(session: CameraSession, arguments: argparse.Namespace) -> dict:
+    '''
+    Runs one short command on a connected session
+
+    Used by the headless command line, its daemon, and the control server,
+    so a command does the same thing however it is sent. The long commands
+    in JOB_COMMANDS are run by BackgroundJobs instead.
+
+    Parameters
+    ----------
+    session: CameraSession
+        The connected session
+    arguments: Namespace
+        The parsed command
+
+    Returns
+    -------
+    dict
+        The result of the command, with "ok" set to whether it worked and
+        "seconds" to how long it took
+
+    Raises
+    ------
+    ValueError
+        If the command is one of the long commands in JOB_COMMANDS
+
+    See Also
+    --------
+    BackgroundJobs
+    headless.build_command_parser
+    '''
+    if arguments.command in JOB_COMMANDS:
+        raise ValueError(f"{arguments.command} runs in the background")
+    start = time.perf_counter()
+    result = {"command": arguments.command, "ok": True}
+    if arguments.command == "record":
+        result["recording"] = (arguments.action == "start"
+                               and arguments.seconds is None)
+    match arguments.command:
+        case "connect" | "status":
+            result["status"] = session.status()
+        case "settings":
+            current = session.desired_settings
+            settings, rejected = session.apply_settings(
+                arguments.resolution or current.get(
+                    "resolution", session.capabilities.resolutions[0]),
+                arguments.fps or current.get("fps", ""),
+                arguments.fov or current.get("fov", "Wide"))
+            result["settings"] = dict(zip(("resolution", "fps", "fov"),
+                                          settings))
+            if rejected is not None:
+                result["ok"] = False
+                result["error"] = f"The GoPro did not accept {rejected}"
+        case "record" if arguments.action == "start":
+            take = session.start_recording()
+            if take is not None:
+                result["ack_skew_ms"] = take.ack_skew() * 1000
+                result["ok"] = not take.errors
+            if arguments.seconds is not None:
+                time.sleep(arguments.seconds)
+                session.stop_recording()
+        case "record":
+            session.stop_recording()
+        case "clock":
+            result["clock"] = session.sync_clock(not arguments.no_set)
+        case "hilight":
+            result["offset"] = session.tag_hilight(getattr(arguments, "at",
+                                                           None))
+        case "photo":
+            latencies = session.take_photo(arguments.count)
+            result["latency_ms"] = latencies
+            if latencies:
+                result["shots_per_second"] = len(latencies) * 1000 /\
+                    latencies[-1]
+        case "offload":
+            local_directory, timestamp = session.save_directory(
+                arguments.group, arguments.timestamp)
+            if session.is_fleet():
+                errors = session.offload_fleet(local_directory, timestamp)
+                result["ok"] = not errors
+                result["errors"] = errors
+            else:
+                result["saved"] = session.offload_files(local_directory,
+                                                        timestamp)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def measure_record_starts(session: CameraSession,
+                          manager: ReadinessManager | None, takes: int,
+                          idle: float, record_seconds: float,
+                          stopped: threading.Event | None = None) -> dict:
+    '''
+    Times record starts after the GoPro has been idle
+
+    Parameters
+    ----------
+    session: CameraSession
+        The connected session
+    manager: ReadinessManager or None
+        Keeps the GoPro ready while idle, or None to leave it alone
+    takes: int
+        The number of recordings to start
+    idle: float
+        The seconds to wait before each recording
+    record_seconds: float
+        The seconds to record each take
+    stopped: Event, optional
+        Ends the takes early once set
+
+    Returns
+    -------
+    dict
+        The milliseconds each start took, their median, and the battery
+        percent used over all of the takes
+    '''
+    battery = session.read_battery_percent()
+    if manager is not None:
+        manager.start()
+    stopped = stopped or threading.Event()
+    latencies = []
+    try:
+        for _ in range(takes):
+            if stopped.wait(idle):
+                break
+            started = time.perf_counter()
+            session.start_recording()
+            latencies.append((time.perf_counter() - started) * 1000)
+            stopped.wait(record_seconds)
+            session.stop_recording()
+    finally:
+        if manager is not None:
+            manager.stop()
+            manager.join()
+    ordered = sorted(latencies)
+    return {
+        "start_ms": latencies,
+        "median_start_ms": ordered[len(ordered) // 2] if ordered else None,
+        "battery_used_percent":
+            (battery - session.read_battery_percent()) * 100,
+    }
+
+
+class RecordStartComparison:
+    '''
+    Compares record starts with and without keeping the GoPro ready
+
+    The takes are first started cold, then with a ReadinessManager sending
+    keep-alives and pre-arming, on a background thread.
+
+    Attributes
+    ----------
+    session: CameraSession
+        The connected session
+    takes: int
+        The recordings started in each mode
+    idle: float
+        The seconds to wait before each recording
+    record_seconds: float
+        The seconds to record each take
+    keep_alive: float
+        The seconds between keep-alives when kept ready
+    results: dict
+        The measurements of each mode that finished, as "cold" and "ready"
+    errors: List[str]
+        The errors that ended the comparison
+
+    Methods
+    -------
+    __init__(session, takes, idle, record_seconds, keep_alive)
+        Sets up the comparison without starting it
+    start()
+        Starts the takes on a background thread
+    stop()
+        Stops after the take in progress
+    join(timeout)
+        Waits for the comparison to finish
+    is_running()
+        Check if the comparison is still running
+
+    See Also
+    --------
+    measure_record_starts
+    '''
+    def __init__(self, session: CameraSession, takes: int, idle: float,
+                 record_seconds: float,
+                 keep_alive: float = ReadinessManager.KEEP_ALIVE_INTERVAL
+                 ) -> None:
+        '''
+        Sets up the comparison without starting it
+
+        Parameters
+        ----------
+        session: CameraSession
+            The connected session
+        takes: int
+            The recordings started in each mode
+        idle: float
+            The seconds to wait before each recording
+        record_seconds: float
+            The seconds to record each take
+        keep_alive: float, default=ReadinessManager.KEEP_ALIVE_INTERVAL
+            The seconds between keep-alives when kept ready
+        '''
+        self.session = session
+        self.takes = takes
+        self.idle = idle
+        self.record_seconds = record_seconds
+        self.keep_alive = keep_alive
+        self.results = {}
+        self.errors = []
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        '''
+        Starts the takes on a background thread
+        '''
+        if self.is_running():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="readiness-comparison")
+        self._thread.start()
+
+    def stop(self) -> None:
+        '''
+        Stops after the take in progress
+        '''
+        self._stopped.set()
+
+    def join(self, timeout: float | None = None) -> None:
+        '''
+        Waits for the comparison to finish
+
+        Parameters
+        ----------
+        timeout: float, optional
+            The most seconds to wait
+        '''
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_running(self) -> bool:
+        '''
+        Check if the comparison is still running
+
+        Returns
+        -------
+        bool
+            True if the comparison thread is running
+        '''
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        '''
+        Measures the cold starts, then the ready ones
+        '''
+        try:
+            for mode in ("cold", "ready"):
+                if self._stopped.is_set():
+                    break
+                manager = None if mode == "cold" else\
+                    ReadinessManager(self.session, self.keep_alive)
+                self.results[mode] = measure_record_starts(
+                    self.session, manager, self.takes, self.idle,
+                    self.record_seconds, self._stopped)
+        except Exception as error:
+            self.errors.append(str(error))
+
+
+class BackgroundJobs:
+    '''
+    Runs the long commands in the background so they do not hold up others
+
+    A time-lapse, a recording schedule, or a readiness comparison can run for
+    hours. Starting one returns straight away and stopping it returns its
+    result, so the short commands, such as a record stop sent through the
+    control server's queue, are never stuck behind it. One job of each kind
+    runs at a time. A job that ends by itself sends its result as an event.
+
+    Attributes
+    ----------
+    session: CameraSession
+        The session the jobs run on
+    on_event: Callable[[dict], None] or None
+        Called with the events of the jobs, such as a time-lapse's errors, a
+        schedule's state changes, and the result of a job that ended by
+        itself as {"event": "job_done", ...}
+
+    Methods
+    -------
+    __init__(session, on_event)
+        Sets up the jobs without starting any
+    run(arguments)
+        Starts or stops the job of a parsed command
+    wait(command)
+        Waits for a job to end by itself and returns its result
+    close()
+        Stops every job
+
+    See Also
+    --------
+    run_command
+    '''
+    def __init__(self, session: CameraSession, on_event=None) -> None:
+        '''
+        Sets up the jobs without starting any
+
+        Parameters
+        ----------
+        session: CameraSession
+            The session the jobs run on
+        on_event: Callable[[dict], None], optional
+            Called with the events of the jobs from their threads
+        '''
+        self.session = session
+        self.on_event = on_event
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def run(self, arguments: argparse.Namespace) -> dict:
+        '''
+        Starts or stops the job of a parsed command
+
+        Parameters
+        ----------
+        arguments: Namespace
+            A command in JOB_COMMANDS with its action, "start" or "stop"
+
+        Returns
+        -------
+        dict
+            For a start, if the job started. For a stop, the result of the
+            job, like its frames or windows recorded.
+        '''
+        start = time.perf_counter()
+        command = arguments.command
+        if arguments.action == "start":
+            result = self._start(arguments)
+        else:
+            with self._lock:
+                job = self._jobs.pop(command, None)
+            if job is None:
+                result = {"command": command, "ok": False,
+                          "error": f"No {command} is running"}
+            else:
+                job.stop()
+                job.join()
+                result = _job_result(command, job)
+        result["action"] = arguments.action
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+    def wait(self, command: str) -> dict:
+        '''
+        Waits for a job to end by itself and returns its result
+
+        The result is returned instead of sent as a "job_done" event, and the
+        job is stopped if waiting is interrupted, such as by Ctrl+C.
+
+        Parameters
+        ----------
+        command: str
+            The command the job was started with
+
+        Returns
+        -------
+        dict
+            The result of the job
+        '''
+        with self._lock:
+            job = self._jobs.pop(command, None)
+        if job is None:
+            return {"command": command, "ok": False,
+                    "error": f"No {command} is running"}
+        try:
+            # Join in steps so Ctrl+C can stop the job
+            while job.is_running():
+                job.join(1.0)
+        finally:
+            job.stop()
+            job.join()
+        return _job_result(command, job)
+
+    def close(self) -> None:
+        '''
+        Stops every job
+        '''
+        with self._lock:
+            jobs, self._jobs = list(self._jobs.values()), {}
+        for job in jobs:
+            job.stop()
+        for job in jobs:
+            job.join()
+
+    def _start(self, arguments: argparse.Namespace) -> dict:
+        '''
+        Starts the job of a parsed command if one is not already running
+        '''
+        command = arguments.command
+        with self._lock:
+            running = self._jobs.get(command)
+            if running is not None and running.is_running():
+                return {"command": command, "ok": False,
+                        "error": f"A {command} is already running"}
+            job = self._make_job(arguments)
+            self._jobs[command] = job
+            job.start()
+        threading.Thread(target=self._report, args=(command, job),
+                         daemon=True, name=f"{command}-job").start()
+        return {"command": command, "ok": True, "running": True}
+
+    def _make_job(self, arguments: argparse.Namespace):
+        '''
+        The job of a parsed command, not yet started
+        '''
+        session = self.session
+        match arguments.command:
+            case "timelapse":
+                local_directory, timestamp = session.save_directory(
+                    arguments.group)
+                return TimeLapse(
+                    session, arguments.interval, arguments.count,
+                    local_directory, timestamp,
+                    free_card=not arguments.keep_on_card,
+                    on_error=lambda message: self._send(
+                        {"event": "error", "error": message}))
+            case "schedule":
+                return RecordingScheduler(
+                    session, duty_cycle(arguments.record_minutes * 60,
+                                        arguments.every_minutes * 60,
+                                        arguments.count),
+                    sleep_between=not arguments.stay_awake,
+                    on_change=lambda state, battery: self._send(
+                        {"event": "schedule", "state": state,
+                         "battery": battery}))
+            case "readiness":
+                return RecordStartComparison(
+                    session, arguments.takes, arguments.idle,
+                    arguments.record_seconds, arguments.keep_alive)
+        raise ValueError(f"{arguments.command} is not a background job")
+
+    def _report(self, command: str, job) -> None:
+        '''
+        Sends the result of a job that ended without being stopped
+        '''
+        job.join()
+        with self._lock:
+            if self._jobs.get(command) is not job:
+                # Stopped, so the stop returned the result
+                return
+            del self._jobs[command]
+        self._send({"event": "job_done", **_job_result(command, job)})
+
+    def _send(self, event: dict) -> None:
+        '''
+        Calls on_event with an event if it is given
+        '''
+        if self.on_event is not None:
+            self.on_event(event)
+
+
+def _job_result(command: str, job) -> dict:
+    '''
+    The result of a finished job
+    '''
+    result = {"command": command, "ok": not job.errors, "errors": job.errors}
+    match command:
+        case "timelapse":
+            result["frames_taken"] = job.frames_taken
+            result["frames_skipped"] = job.frames_skipped
+            result["frames_saved"] = job.frames_saved
+            result["max_jitter_ms"] = job.max_jitter * 1000
+        case "schedule":
+            result["windows_recorded"] = job.windows_recorded
+        case "readiness":
+            result.update(job.results)
+    return result
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+
+# The app's modules are imported by name from the Code folder
+CODE_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE_DIRECTORY)
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    '''
+    Runs a test from a folder inside a temporary folder, so the ../Data,
+    ../State, and ../Metrics files the app writes stay out of the repository
+    '''
+    code = tmp_path / "Code"
+    code.mkdir()
+    monkeypatch.chdir(code)
+    return tmp_path
+
+
+@pytest.fixture
+def connect_simulator(workspace):
+    '''
+    Connects sessions to simulated GoPros that answer at once, and closes
+    them after the test
+
+    Called with any simulator options to change, such as media_count, and
+    optionally the GoPro name to select, such as CameraSession.ALL_GOPROS.
+    '''
+    from camera_session import CameraSession
+    from instrumentation import CommandMetrics
+    sessions = []
+
+    def connect(gopro: str | None = None, **options) -> CameraSession:
+        session = CameraSession({"ble_latency": 0.0, "http_latency": 0.0,
+                                 "connect_latency": 0.0, "jitter": 0.0,
+                                 "seed": 0, **options}, CommandMetrics())
+        if gopro is not None:
+            session.select(gopro)
+        session.connect()
+        sessions.append(session)
+        return session
+    yield connect
+    for session in sessions:
+        session.close()
+        session.journal.close()
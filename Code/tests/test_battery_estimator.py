@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from battery_estimator import BatteryEstimator
+
+KEY = BatteryEstimator.key("HERO10 Black", "4K", "60 fps", "Wide")
+
+
+def _record(estimator: BatteryEstimator, minutes: int,
+            drain_per_minute: float) -> None:
+    for minute in range(minutes + 1):
+        estimator.observe(KEY, 1.0 - drain_per_minute * minute,
+                          timestamp=minute * 60.0)
+
+
+def test_the_fit_learns_the_drain_rate(workspace):
+    estimator = BatteryEstimator({})
+    _record(estimator, 10, 0.01)
+    assert estimator.rate(KEY) == pytest.approx(0.01)
+    assert estimator.estimate(KEY, 0.5) == pytest.approx(50.0)
+
+
+def test_too_little_recording_uses_the_fallback_table(workspace):
+    estimator = BatteryEstimator({"4K": {"60 fps": 90}})
+    _record(estimator, 2, 0.01)
+    assert estimator.rate(KEY) is None
+    assert estimator.estimate(KEY, 0.5) == pytest.approx(45.0)
+
+
+def test_polls_closer_than_the_minimum_interval_are_not_drops(workspace):
+    estimator = BatteryEstimator({})
+    estimator.observe(KEY, 1.0, timestamp=0.0)
+    estimator.observe(KEY, 0.99, timestamp=10.0)
+    assert KEY not in estimator.rates
+
+
+def test_rates_are_saved_at_the_end_of_a_recording(workspace):
+    estimator = BatteryEstimator({})
+    _record(estimator, 10, 0.01)
+    assert not os.path.exists(estimator.path)
+    estimator.end_segment()
+    assert BatteryEstimator({}).rate(KEY) == pytest.approx(0.01)
+
+
+def test_closing_saves_rates_learned_since_the_last_save(workspace):
+    estimator = BatteryEstimator({})
+    _record(estimator, 10, 0.02)
+    estimator.close()
+    assert BatteryEstimator({}).rate(KEY) == pytest.approx(0.02)
@@ -0,0 +1,22 @@
+from benchmark_gui import regressions
+
+
+RESULT = {"median_us": 100.0, "p95_us": 150.0, "draws": 0.0,
+          "configures": 1.0, "menu_rebuilds": 0.0}
+
+
+def test_a_path_missing_from_the_baseline_fails():
+    results = {"set_resolution": RESULT, "poll_battery_callback": RESULT}
+    failures = regressions(results, {"set_resolution": RESULT}, 0.5)
+    assert len(failures) == 1
+    assert failures[0].startswith("poll_battery_callback is not in")
+
+
+def test_more_redraws_fail_but_a_time_without_a_baseline_does_not():
+    baseline = {"set_resolution": {"draws": 0, "configures": 1,
+                                   "menu_rebuilds": 0}}
+    results = {"set_resolution": {**RESULT, "median_us": 1e6}}
+    assert regressions(results, baseline, 0.5) == []
+    results["set_resolution"]["draws"] = 2.0
+    assert regressions(results, baseline, 0.5) == [
+        "set_resolution draws per call went from 0 to 2"]
@@ -0,0 +1,75 @@
+import http.server
+import threading
+
+import pytest
+
+from camera import delete_media
+
+
+@pytest.fixture
+def camera_server():
+    '''
+    A local server that answers like the GoPro's delete endpoint
+    '''
+    requests = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        status = 200
+
+        def do_GET(self):
+            requests.append(self.path)
+            self.send_response(Handler.status)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", requests, Handler
+    server.shutdown()
+    server.server_close()
+
+
+def test_delete_media_calls_the_http_endpoint(camera_server):
+    url, requests, _ = camera_server
+    delete_media("100GOPRO/GOPR0001.JPG", url=url)
+    assert requests == [
+        "/gopro/media/delete/file?path=100GOPRO%2FGOPR0001.JPG"]
+
+
+def test_delete_media_raises_when_the_gopro_refuses(camera_server):
+    url, _, handler = camera_server
+    handler.status = 500
+    with pytest.raises(RuntimeError):
+        delete_media("100GOPRO/GOPR0001.JPG", url=url)
+
+
+def test_delete_files_frees_the_simulated_card(connect_simulator):
+    session = connect_simulator(media_count=2)
+    directory, timestamp = session.save_directory("card")
+    saved = session.offload_files(directory, timestamp)
+    session.delete_files(saved)
+    assert session.gopro.http_command.get_media_list().data["files"] == []
+
+
+def test_delete_files_uses_the_sessions_deleter(connect_simulator):
+    session = connect_simulator(media_count=1)
+    directory, timestamp = session.save_directory("card")
+    saved = session.offload_files(directory, timestamp)
+    deleted = []
+    session.delete_media = deleted.append
+    session.delete_files(saved)
+    assert deleted == [f"100GOPRO/{saved[0]}"]
+
+
+def test_the_sdk_has_every_http_command_the_app_calls():
+    open_gopro = pytest.importorskip("open_gopro")
+    http_commands = pytest.importorskip("open_gopro.api.http_commands")
+    for name in ("get_media_list", "download_file", "set_digital_zoom"):
+        assert hasattr(http_commands.HttpCommands, name)
+    # The SDK cannot delete files, so a real GoPro's session deletes them
+    # with camera.delete_media, which calls the HTTP endpoint
+    assert not hasattr(open_gopro.WirelessGoPro, "delete_media")
@@ -0,0 +1,42 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+from capabilities import CapabilityLibrary
+
+
+def test_the_default_folder_has_the_default_model():
+    library = CapabilityLibrary()
+    assert library.has_model(CapabilityLibrary.DEFAULT_MODEL)
+
+
+def test_the_executable_loads_its_unpacked_data(tmp_path, monkeypatch):
+    shutil.copytree(CapabilityLibrary().directory,
+                    tmp_path / "Capabilities")
+    monkeypatch.setattr(sys, "_MEIPASS", str(tmp_path), raising=False)
+    library = CapabilityLibrary()
+    assert library.directory == os.path.join(str(tmp_path), "Capabilities")
+    assert library.get(CapabilityLibrary.DEFAULT_MODEL).resolutions
+
+
+@pytest.mark.parametrize("combination", [
+    ("1080p", "240 fps", "Horizon Leveling"),
+    ("4K", "120 fps", "Super View"),
+    ("5.3K", "30 fps", "Super View"),
+    ("4K", "60 fps", "Narrow"),
+])
+def test_the_hero10_rejects_fields_of_view_it_cannot_use(combination):
+    capabilities = CapabilityLibrary().get("HERO10 Black")
+    assert not capabilities.is_valid(*combination)
+    resolution, fps, fov = capabilities.resolve(*combination)
+    assert (resolution, fps) == combination[:2]
+    assert fov != combination[2]
+    assert capabilities.is_valid(resolution, fps, fov)
+
+
+def test_the_hero10_keeps_a_field_of_view_it_can_use():
+    capabilities = CapabilityLibrary().get("HERO10 Black")
+    assert capabilities.resolve("1080p", "60 fps", "Horizon Leveling") ==\
+        ("1080p", "60 fps", "Horizon Leveling")
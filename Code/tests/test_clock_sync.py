@@ -0,0 +1,40 @@
+import datetime as dt
+import math
+import time
+import types
+
+from clock_sync import ClockSync
+
+EPOCH = dt.datetime(1970, 1, 1)
+
+
+class _Clock:
+    '''
+    A GoPro whose clock is ahead of the computer's and only shows whole
+    seconds, read halfway through a 10 ms round trip
+    '''
+    def __init__(self, ahead: float) -> None:
+        self.ahead = ahead
+        self.ble_command = types.SimpleNamespace(
+            get_date_time=self.get_date_time)
+
+    def get_date_time(self):
+        time.sleep(0.005)
+        seconds = math.floor(time.time() + self.ahead)
+        time.sleep(0.005)
+        return types.SimpleNamespace(
+            is_ok=True, data=EPOCH + dt.timedelta(seconds=seconds))
+
+
+def test_the_readings_narrow_the_offset_below_a_second(workspace):
+    result = ClockSync().measure(_Clock(2.25), samples=10)
+    assert abs(result["offset"] - 2.25) <= result["uncertainty"] + 0.01
+    # One reading alone only says the offset is within a second
+    assert result["uncertainty"] < 0.15
+    assert result["samples"] >= 5
+
+
+def test_a_single_reading_is_a_second_wide(workspace):
+    result = ClockSync().measure(_Clock(-0.6), samples=1)
+    assert abs(result["offset"] + 0.6) <= result["uncertainty"] + 0.01
+    assert result["uncertainty"] >= 0.5
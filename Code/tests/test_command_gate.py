@@ -0,0 +1,77 @@
+import types
+
+import pytest
+
+from command_gate import CommandGate
+from instrumentation import CommandMetrics
+
+
+class _Status:
+    '''
+    A status answer that is ok with one value
+    '''
+    def __init__(self, value) -> None:
+        self.is_ok = True
+        self.data = {"value": value}
+
+    def values(self):
+        return self.data.values()
+
+
+def _ready_gopro():
+    '''
+    A GoPro that is never busy or encoding
+    '''
+    status = types.SimpleNamespace(
+        system_busy=types.SimpleNamespace(get_value=lambda: _Status(False)),
+        encoding_active=types.SimpleNamespace(
+            get_value=lambda: _Status(False)))
+    return types.SimpleNamespace(ble_status=status)
+
+
+def _answers(*accepted):
+    '''
+    A command that accepts or rejects each attempt in turn
+    '''
+    attempts = []
+
+    def command():
+        attempts.append(len(attempts))
+        return types.SimpleNamespace(is_ok=accepted[len(attempts) - 1])
+    return command, attempts
+
+
+def _retries(metrics: CommandMetrics, name: str) -> int:
+    rows = {row["command"]: row for row in metrics.snapshot()}
+    return rows[name]["retries"] if name in rows else 0
+
+
+def test_a_rejected_command_is_sent_again():
+    metrics = CommandMetrics()
+    gate = CommandGate(metrics, seed=0)
+    gate.BASE_DELAY = gate.MAX_DELAY = 0.001
+    command, attempts = _answers(False, True)
+    gate.send(_ready_gopro(), "ble_command.set_shutter", command)
+    assert len(attempts) == 2
+    assert _retries(metrics, "ble_command.set_shutter") == 1
+
+
+def test_a_command_rejected_every_time_raises():
+    metrics = CommandMetrics()
+    gate = CommandGate(metrics, seed=0)
+    gate.BASE_DELAY = gate.MAX_DELAY = 0.001
+    command, attempts = _answers(*[False] * gate.MAX_ATTEMPTS)
+    with pytest.raises(RuntimeError):
+        gate.send(_ready_gopro(), "ble_command.set_shutter", command)
+    assert len(attempts) == gate.MAX_ATTEMPTS
+    assert _retries(metrics, "ble_command.set_shutter") ==\
+        gate.MAX_ATTEMPTS - 1
+
+
+def test_an_accepted_command_is_sent_once():
+    metrics = CommandMetrics()
+    gate = CommandGate(metrics, seed=0)
+    command, attempts = _answers(True)
+    gate.send(_ready_gopro(), "ble_command.set_shutter", command)
+    assert len(attempts) == 1
+    assert _retries(metrics, "ble_command.set_shutter") == 0
@@ -0,0 +1,67 @@
+import json
+import threading
+
+from connection_cache import ConnectionCache
+from gopro_simulator import SimulatedGoPro
+
+
+class _GoPro:
+    '''
+    A GoPro whose direct connection fails
+    '''
+    def __init__(self, target, opened: list, closed: list) -> None:
+        self.target = target
+        self.opened = opened
+        self.closed = closed
+        self.is_ble_connected = False
+
+    def open(self, timeout=None, retries=None):
+        self.opened.append(self.target)
+        if timeout is not None:
+            raise TimeoutError("The GoPro was not found")
+        self.is_ble_connected = True
+
+    def close(self):
+        self.closed.append(self.target)
+
+
+def test_a_failed_direct_connection_is_closed_before_scanning(workspace):
+    cache = ConnectionCache()
+    cache.entries["GoPro 5990"] = {"target": "GoPro 5990"}
+    opened, closed = [], []
+    gopro = cache.connect(
+        "GoPro 5990", lambda target: _GoPro(target, opened, closed))
+    assert gopro.is_ble_connected
+    assert opened == ["GoPro 5990", "GoPro 5990"]
+    assert closed == ["GoPro 5990"]
+    assert set(cache.last_timings) == {"direct", "scan"}
+
+
+def test_only_the_gopros_description_is_saved(workspace):
+    cache = ConnectionCache()
+    gopro = SimulatedGoPro("GoPro 5990", connect_latency=0.0,
+                           ble_latency=0.0)
+    gopro.open()
+    entry = cache.remember("GoPro 5990", gopro)
+    with open(cache.path, "r") as cache_file:
+        saved = json.load(cache_file)["GoPro 5990"]
+    assert saved == entry
+    assert set(entry) == {"target", "identifier", "model", "serial_number",
+                          "last_connected", "timings"}
+
+
+def test_gopros_connecting_at_once_are_all_saved(workspace):
+    cache = ConnectionCache()
+    gopros = [SimulatedGoPro(f"GoPro {number}", connect_latency=0.0,
+                             ble_latency=0.0) for number in range(8)]
+    for gopro in gopros:
+        gopro.open()
+    threads = [threading.Thread(target=cache.remember,
+                                args=(gopro.target, gopro))
+               for gopro in gopros]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(ConnectionCache().entries) == sorted(
+        gopro.target for gopro in gopros)
@@ -0,0 +1,90 @@
+import argparse
+import http.client
+import json
+import queue
+import time
+
+import pytest
+
+from control_server import CommandQueue, ControlServer
+
+
+def test_a_timed_recording_does_not_hold_up_the_queue(connect_simulator):
+    session = connect_simulator()
+    command_queue = CommandQueue(session.command_metrics)
+    results = queue.Queue()
+    command_queue.add_result_listener(results.put)
+    try:
+        _, started = command_queue.submit_command(session, argparse.Namespace(
+            command="record", action="start", seconds=0.5))
+        assert started.result(timeout=5)["recording"] is True
+        assert started.result()["stops_after"] == 0.5
+        # Another command runs while the recording is still going
+        sent = time.perf_counter()
+        _, status = command_queue.submit_command(
+            session, argparse.Namespace(command="status"))
+        status.result(timeout=5)
+        assert time.perf_counter() - sent < 0.5
+        assert session.recording
+
+        for _ in range(3):
+            stopped = results.get(timeout=5)
+        assert stopped["command"] == "record"
+        assert stopped["recording"] is False
+        assert not session.recording
+    finally:
+        command_queue.close()
+
+
+def test_closing_the_queue_cancels_waiting_stops(connect_simulator):
+    session = connect_simulator()
+    command_queue = CommandQueue(session.command_metrics)
+    _, started = command_queue.submit_command(session, argparse.Namespace(
+        command="record", action="start", seconds=0.2))
+    started.result(timeout=5)
+    command_queue.close()
+    time.sleep(0.4)
+    assert session.recording
+
+
+@pytest.fixture
+def server(connect_simulator):
+    server = ControlServer(connect_simulator(), port=0)
+    yield server
+    server.close()
+
+
+def _post(server: ControlServer, path: str, headers: dict) -> tuple:
+    connection = http.client.HTTPConnection("127.0.0.1", server.port,
+                                            timeout=5)
+    try:
+        connection.request("POST", path, body=json.dumps({}),
+                           headers=headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+
+def test_a_local_json_post_is_run(server):
+    status, result = _post(server, "/photo",
+                           {"Content-Type": "application/json"})
+    assert status == 200
+    assert result["command"] == "photo"
+
+
+@pytest.mark.parametrize("headers, expected", [
+    # A simple cross-origin post from a web page
+    ({"Content-Type": "text/plain", "Origin": "http://example.com"},
+     403),
+    ({"Content-Type": "application/json", "Origin": "null"}, 403),
+    # A DNS name pointed at 127.0.0.1
+    ({"Content-Type": "application/json", "Host": "example.com:8765"}, 403),
+    ({"Content-Type": "text/plain"}, 415),
+    ({}, 415),
+])
+def test_requests_web_pages_can_send_are_refused(server, headers, expected):
+    status, result = _post(server, "/record", headers)
+    assert status == expected
+    assert result["ok"] is False
+    assert not server.session.recording
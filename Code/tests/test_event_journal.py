@@ -0,0 +1,87 @@
+import json
+import time
+
+import pytest
+
+from event_journal import EventJournal, read_events
+
+
+@pytest.fixture
+def journal(workspace):
+    journal = EventJournal()
+    yield journal
+    journal.close()
+
+
+def test_events_that_could_not_be_written_are_kept(journal, monkeypatch):
+    write = journal._write
+
+    def full_disk(events):
+        raise OSError("No space left on device")
+    journal.log("record_start", gopro="GoPro 5990")
+    monkeypatch.setattr(journal, "_write", full_disk)
+    with pytest.raises(OSError):
+        journal.flush()
+    journal.log("record_stop", gopro="GoPro 5990")
+    monkeypatch.setattr(journal, "_write", write)
+    journal.flush()
+    assert [record["e"] for record in read_events()] == ["record_start",
+                                                         "record_stop"]
+    assert journal.dropped == 0
+
+
+def test_the_oldest_events_are_dropped_past_the_limit(journal, monkeypatch):
+    monkeypatch.setattr(journal, "MAX_PENDING", 2)
+
+    def full_disk(events):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(journal, "_write", full_disk)
+    for index in range(3):
+        journal.log("photo", index=index)
+    with pytest.raises(OSError):
+        journal.flush()
+    assert journal.dropped == 1
+    assert [fields["index"] for _, _, fields in journal._pending] == [1, 2]
+    journal._pending.clear()
+
+
+def test_fields_cannot_replace_the_time_or_type(journal):
+    with pytest.raises(ValueError):
+        journal.log("setting", t=1)
+    with pytest.raises(ValueError):
+        journal.log("setting", e="other")
+
+
+def _blocks(journal: EventJournal) -> list:
+    with open(journal.path[:-len(".jsonl")] + ".idx") as index_file:
+        return [json.loads(line) for line in index_file]
+
+
+def test_read_events_only_reads_the_blocks_that_can_match(journal):
+    journal.log("connect", gopro="GoPro 5990")
+    journal.flush()
+    # Start the second block on a later millisecond than the first ends on
+    time.sleep(0.01)
+    journal.log("record_start", gopro="GoPro 5990")
+    journal.log("hilight", offset=1.5)
+    journal.flush()
+    first, second = _blocks(journal)
+    # Break the first block, so reading it would fail
+    with open(journal.path, "r+b") as journal_file:
+        journal_file.seek(first["offset"])
+        journal_file.write(b"{" * (first["length"] - 1))
+
+    assert [record["e"] for record in read_events(events=["hilight"])] ==\
+        ["hilight"]
+    assert [record["e"] for record in read_events(start=second["first"])] ==\
+        ["record_start", "hilight"]
+    assert list(read_events(start=second["last"] + 1)) == []
+
+
+def test_read_events_filters_the_events_in_a_block(journal):
+    journal.log("setting", resolution="4K")
+    journal.log("record_start", gopro="GoPro 5990")
+    journal.flush()
+    records = list(read_events(events=["setting"]))
+    assert records == [{"t": records[0]["t"], "e": "setting",
+                        "resolution": "4K"}]
@@ -0,0 +1,32 @@
+import time
+
+from camera_session import CameraSession
+
+
+def test_a_gopro_that_stays_busy_is_not_fired(connect_simulator):
+    session = connect_simulator(CameraSession.ALL_GOPROS)
+    fleet = session.gopro
+    fleet.ARM_TIMEOUT = 0.2
+    busy, ready = CameraSession.FLEET
+    fleet.cameras[busy].gopro._busy_until = time.monotonic() + 60
+    take = fleet.synchronized_start(session.params.PresetGroup.VIDEO,
+                                    session.params.Toggle.ENABLE, lead=0.05)
+    assert list(take.errors) == [busy]
+    assert list(take.sends) == [ready]
+    assert not fleet.pre_arm(session.params.PresetGroup.VIDEO)
+
+
+def test_every_ready_gopro_is_fired(connect_simulator):
+    session = connect_simulator(CameraSession.ALL_GOPROS)
+    take = session.gopro.synchronized_start(
+        session.params.PresetGroup.VIDEO, session.params.Toggle.ENABLE,
+        lead=0.05)
+    assert take.errors == {}
+    assert sorted(take.sends) == sorted(CameraSession.FLEET)
+
+
+def test_a_closed_fleet_does_not_reconnect(connect_simulator):
+    session = connect_simulator(CameraSession.ALL_GOPROS)
+    fleet = session.gopro
+    fleet.close()
+    assert fleet.reconnect() is False
@@ -0,0 +1,52 @@
+import calendar
+import json
+import time
+
+import pytest
+
+from hilight_index import HilightIndex
+
+
+@pytest.fixture
+def new_york(monkeypatch):
+    '''
+    Runs a test in a time zone hours away from UTC
+    '''
+    monkeypatch.setenv("TZ", "America/New_York")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _tagged_take(index: HilightIndex) -> float:
+    index.start_take()
+    index.tag()
+    index.end_take()
+    return index.takes[0]["started"]
+
+
+def test_creation_times_are_local_before_the_clock_is_synced(workspace,
+                                                              new_york):
+    index = HilightIndex()
+    started = _tagged_take(index)
+    # The GoPro's clock is on local time, which "cre" counts as UTC
+    created = calendar.timegm(time.localtime(started))
+    video = workspace / "GX010001.MP4"
+    attached = index.attach([{"n": "GX010001.MP4", "cre": str(created)}],
+                            {"GX010001.MP4": str(video)})
+    assert list(attached) == ["GX010001.MP4"]
+    assert index.takes == []
+    with open(str(video) + ".hilights.json") as sidecar:
+        assert json.load(sidecar)["file"] == "GX010001.MP4"
+
+
+def test_creation_times_use_the_synced_offset(workspace, new_york):
+    index = HilightIndex()
+    started = _tagged_take(index)
+    index.clock_offset = 3600.0
+    video = workspace / "GX010001.MP4"
+    attached = index.attach(
+        [{"n": "GX010001.MP4", "cre": str(int(started + 3600))}],
+        {"GX010001.MP4": str(video)})
+    assert list(attached) == ["GX010001.MP4"]
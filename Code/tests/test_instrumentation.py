@@ -0,0 +1,47 @@
+import csv
+
+import pytest
+
+from instrumentation import LatencyHistogram, append_csv_row
+
+
+def test_append_csv_row_writes_the_header_once(workspace):
+    path = "../Metrics/rows.csv"
+    append_csv_row(path, ["time", "value"], ["09:00", 1])
+    append_csv_row(path, ["time", "value"], ["09:01", 2])
+    with open(path, newline="") as csv_file:
+        assert list(csv.reader(csv_file)) == [["time", "value"],
+                                              ["09:00", "1"], ["09:01", "2"]]
+
+
+def test_percentiles_are_within_a_bucket_of_the_latency():
+    histogram = LatencyHistogram()
+    for milliseconds in range(1, 101):
+        histogram.record(milliseconds / 1000)
+    for fraction in (0.5, 0.95, 0.99):
+        latency = fraction * 100 / 1000
+        assert latency <= histogram.percentile(fraction) <= latency * 1.13
+    assert histogram.percentile(1.0) == pytest.approx(0.1)
+
+
+def test_latencies_past_the_last_bucket_report_the_longest():
+    histogram = LatencyHistogram()
+    histogram.record(0.01)
+    histogram.record(500.0)
+    assert histogram.counts[-1] == 1
+    assert histogram.percentile(0.99) == 500.0
+    assert histogram.minimum == 0.01
+
+
+def test_an_empty_histogram_has_no_latency():
+    assert LatencyHistogram().percentile(0.5) == 0.0
+
+
+def test_bucket_bounds_grow_by_the_same_factor():
+    bounds = LatencyHistogram.BOUNDS
+    assert bounds[0] == pytest.approx(0.0001)
+    assert bounds[-1] == pytest.approx(100.0)
+    ratios = [high / low for low, high in zip(bounds, bounds[1:])]
+    assert max(ratios) == pytest.approx(min(ratios))
+    assert ratios[0] == pytest.approx(
+        10 ** (1 / LatencyHistogram.BUCKETS_PER_DECADE))
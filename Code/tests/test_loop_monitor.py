@@ -0,0 +1,98 @@
+import csv
+
+import pytest
+
+import loop_monitor
+from instrumentation import CommandMetrics
+from loop_monitor import LoopMonitor
+
+
+class _Clock:
+    '''
+    A time.perf_counter that only moves when the test moves it
+    '''
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def perf_counter(self) -> float:
+        return self.now
+
+
+class _Root:
+    '''
+    A Tk root that keeps the callbacks scheduled with after
+    '''
+    def __init__(self) -> None:
+        self.scheduled = []
+
+    def after(self, ms: int, function) -> None:
+        self.scheduled.append((ms, function))
+
+
+class _Journal:
+    def __init__(self) -> None:
+        self.events = []
+
+    def log(self, event: str, **fields) -> None:
+        self.events.append((event, fields))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(loop_monitor, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def monitor(workspace, clock):
+    monitor = LoopMonitor(_Root(), CommandMetrics(), threshold=0.2,
+                          journal=_Journal(), log_path="loop_stalls.csv")
+    # The first beat only starts the timing
+    monitor._beat()
+    return monitor
+
+
+def _beat_on_time(monitor: LoopMonitor, clock: _Clock) -> None:
+    clock.now += monitor.HEARTBEAT_MS / 1000
+    monitor._beat()
+
+
+def _stalls(monitor: LoopMonitor) -> list:
+    try:
+        with open(monitor.log_path, "r", newline="") as log_file:
+            return list(csv.DictReader(log_file))
+    except FileNotFoundError:
+        return []
+
+
+def test_a_slow_callback_is_logged_as_one_stall(monitor, clock):
+    def save_settings():
+        clock.now += 0.5
+    monitor.call(save_settings)
+    _beat_on_time(monitor, clock)
+    _beat_on_time(monitor, clock)
+    assert monitor.stalls == 1
+    stalls = _stalls(monitor)
+    assert [row["callback"] for row in stalls] == ["save_settings"]
+    assert float(stalls[0]["seconds"]) == pytest.approx(0.5)
+    assert [(event, fields["callback"])
+            for event, fields in monitor.journal.events] ==\
+        [("loop_stall", "save_settings")]
+
+
+def test_time_in_a_messagebox_is_not_counted(monitor, clock):
+    def ask_to_save():
+        clock.now += 0.01
+        # A messagebox runs the loop until the user answers
+        for _ in range(100):
+            _beat_on_time(monitor, clock)
+        clock.now += 0.03
+    monitor.call(ask_to_save)
+    _beat_on_time(monitor, clock)
+    assert monitor.stalls == 0
+    assert _stalls(monitor) == []
+    times = {row["command"]: row
+             for row in monitor.metrics.snapshot()}
+    assert times["tk.ask_to_save"]["sum"] == pytest.approx(0.03)
+    assert times["tk.heartbeat"]["max"] < monitor.threshold
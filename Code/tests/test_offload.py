@@ -0,0 +1,92 @@
+import os
+import time
+
+import pytest
+
+from gopro_simulator import FakeCameraServer, SimulatedGoPro
+from offload import CameraEndpoint, DiskBandwidthBalancer, OffloadScheduler
+
+
+FILE_SIZE = 256 * 1024
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    '''
+    Starts fake GoPros that each serve two files, one for each download
+    speed given, and stops them after the test
+    '''
+    monkeypatch.setattr(CameraEndpoint, "CHUNK_SIZE", 64 * 1024)
+    servers = []
+
+    def serve(*download_rates: float) -> list:
+        endpoints = []
+        for number, download_rate in enumerate(download_rates):
+            gopro = SimulatedGoPro(media_count=2, file_size=FILE_SIZE)
+            servers.append(FakeCameraServer(gopro, download_rate))
+            endpoints.append(CameraEndpoint(f"FAKE{number}",
+                                            servers[-1].url))
+        return endpoints
+    yield serve
+    for server in servers:
+        server.close()
+
+
+def test_gopros_are_saved_in_about_the_time_of_the_slowest(serve, tmp_path):
+    rates = [1e6, 1.5e6, 2e6]
+    scheduler = OffloadScheduler(serve(*rates))
+    started = time.perf_counter()
+    report = scheduler.offload(str(tmp_path))
+    elapsed = time.perf_counter() - started
+    slowest = 2 * FILE_SIZE / min(rates)
+    one_at_a_time = sum(2 * FILE_SIZE / rate for rate in rates)
+    # The server sleeps after sending each chunk, so the last sleep of a
+    # file is not waited for
+    assert slowest / 2 < elapsed < min(slowest + 0.3, one_at_a_time)
+    for serial, result in report.items():
+        assert result["error"] is None
+        assert result["files"] == 2
+        assert result["bytes"] == 2 * FILE_SIZE
+        assert sorted(os.listdir(tmp_path / serial)) == sorted(
+            result["saved"])
+
+
+def test_saved_files_are_skipped(serve, tmp_path):
+    endpoints = serve(50e6, 50e6)
+    scheduler = OffloadScheduler(endpoints)
+    first = scheduler.offload(str(tmp_path))
+    assert scheduler.offload(str(tmp_path))["FAKE0"]["files"] == 0
+
+    saved = {("FAKE1", first["FAKE1"]["saved"][0])}
+    again = scheduler.offload(str(tmp_path / "again"),
+                              is_saved=lambda serial, name:
+                              (serial, name) in saved)
+    assert again["FAKE0"]["files"] == 2
+    assert again["FAKE1"]["saved"] == first["FAKE1"]["saved"][1:]
+
+
+def test_the_disk_limit_is_shared_between_the_gopros(serve, tmp_path):
+    limit = 4e6
+    scheduler = OffloadScheduler(serve(50e6, 50e6),
+                                 DiskBandwidthBalancer(limit))
+    report = scheduler.offload(str(tmp_path))
+    # Each GoPro gets half of the limit, so both take as long as all of
+    # the bytes at the limit, less the first write that is not held back
+    shared = 4 * FILE_SIZE / limit
+    for result in report.values():
+        assert result["error"] is None
+        assert shared * 0.7 < result["seconds"] < shared + 0.3
+
+
+def test_a_stopped_download_leaves_no_partial_file(serve, tmp_path):
+    endpoint = serve(50e6)[0]
+    directory, file = endpoint.media_list()[0]
+
+    class FullDisk:
+        def throttle(self, stream: str, size: int) -> None:
+            raise OSError("No space left on device")
+
+    local_file = str(tmp_path / file["n"])
+    with pytest.raises(OSError):
+        endpoint.download(directory, file["n"], local_file, FullDisk())
+    assert os.listdir(tmp_path) == []
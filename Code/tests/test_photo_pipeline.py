@@ -0,0 +1,34 @@
+import time
+
+
+def test_queued_photos_share_one_switch_to_photo_mode(connect_simulator,
+                                                       monkeypatch):
+    session = connect_simulator()
+    commands = session.gopro.gopro.ble_command
+    sent = []
+    for name in ("load_preset_group", "set_shutter"):
+        command = getattr(commands, name)
+
+        def spy(*args, command=command, name=name, **kwargs):
+            sent.append((name, *kwargs.values()))
+            return command(*args, **kwargs)
+        monkeypatch.setattr(commands, name, spy)
+
+    finished = []
+    futures = session.photo_pipeline.request(2) +\
+        session.photo_pipeline.request(1)
+    for index, future in enumerate(futures):
+        future.add_done_callback(lambda _, index=index: finished.append(index))
+    for future in futures:
+        future.result(timeout=5)
+    # The switch back to video mode is sent after the last photo
+    give_up = time.monotonic() + 5
+    while len(sent) < 5 and time.monotonic() < give_up:
+        time.sleep(0.01)
+
+    photo = session.params.PresetGroup.PHOTO
+    video = session.params.PresetGroup.VIDEO
+    enable = session.params.Toggle.ENABLE
+    assert sent == [("load_preset_group", photo)] +\
+        [("set_shutter", enable)] * 3 + [("load_preset_group", video)]
+    assert finished == [0, 1, 2]
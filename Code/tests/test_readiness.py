@@ -0,0 +1,110 @@
+import threading
+import time
+
+from readiness import ReadinessManager
+
+
+def _wait_for(condition, timeout: float = 5.0) -> bool:
+    give_up = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > give_up:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_nothing_is_sent_while_a_recording_starts(connect_simulator):
+    session = connect_simulator()
+    manager = ReadinessManager(session, keep_alive_interval=0.05)
+    manager.CHECK_INTERVAL = 0.02
+    # Held by start_recording until the GoPro answers
+    with session.recording_lock:
+        manager.start()
+        time.sleep(0.2)
+        assert manager.keep_alives == 0
+        assert manager.arms == 0
+        assert not session.armed
+    try:
+        assert _wait_for(lambda: manager.arms == 1)
+        assert _wait_for(lambda: manager.keep_alives >= 2)
+    finally:
+        manager.stop()
+        manager.join()
+    assert list(manager.errors) == []
+
+
+def test_an_armed_start_only_sends_the_shutter(connect_simulator):
+    session = connect_simulator()
+    manager = ReadinessManager(session, keep_alive_interval=None)
+    manager.CHECK_INTERVAL = 0.02
+    manager.start()
+    try:
+        assert _wait_for(lambda: session.armed)
+    finally:
+        manager.stop()
+        manager.join()
+    session.start_recording()
+    session.stop_recording()
+    starts = {row["command"]: row["count"]
+              for row in session.command_metrics.snapshot()}
+    assert starts["record_start.armed"] == 1
+    assert "record_start.cold" not in starts
+
+
+def test_a_recording_starts_without_waiting_for_arming(connect_simulator):
+    session = connect_simulator()
+    arming, release, armed = (threading.Event() for _ in range(3))
+
+    def slow_pre_arm():
+        # Arming that finishes after the recording started
+        arming.set()
+        release.wait(5)
+        session.armed = True
+        armed.set()
+    session.pre_arm = slow_pre_arm
+    manager = ReadinessManager(session, keep_alive_interval=None)
+    manager.CHECK_INTERVAL = 0.02
+    manager.start()
+    try:
+        assert arming.wait(5)
+        start = threading.Thread(target=session.start_recording)
+        start.start()
+        start.join(2)
+        assert not start.is_alive()
+        release.set()
+        assert armed.wait(5)
+        time.sleep(0.1)
+        # The recording was started cold, so arming did not count
+        assert manager.arms == 0
+        assert not session.armed
+    finally:
+        release.set()
+        manager.stop()
+        manager.join()
+    session.stop_recording()
+    starts = {row["command"]: row["count"]
+              for row in session.command_metrics.snapshot()}
+    assert starts["record_start.cold"] == 1
+
+
+def test_a_failing_pre_arm_is_tried_less_often(connect_simulator,
+                                               monkeypatch):
+    session = connect_simulator()
+    attempts = []
+
+    def failing_pre_arm():
+        attempts.append(time.monotonic())
+        raise TimeoutError("The GoPro stayed busy")
+    session.pre_arm = failing_pre_arm
+    monkeypatch.setattr(ReadinessManager, "MAX_ERRORS", 3)
+    manager = ReadinessManager(session, keep_alive_interval=None)
+    manager.CHECK_INTERVAL = 0.01
+    manager.start()
+    time.sleep(0.5)
+    manager.stop()
+    manager.join()
+    # Waits of 0.01, 0.02, 0.04, 0.08, 0.16, and 0.32 seconds at most
+    assert 3 <= len(attempts) <= 7
+    waits = [after - before for before, after in zip(attempts, attempts[1:])]
+    assert waits == sorted(waits)
+    assert len(manager.errors) == 3
@@ -0,0 +1,41 @@
+from recording_scheduler import RecordingScheduler, duty_cycle
+
+
+def test_a_failed_stop_is_sent_again(connect_simulator):
+    session = connect_simulator()
+    stop_recording = session.stop_recording
+    failures = []
+
+    def flaky_stop():
+        if len(failures) < 2:
+            failures.append("stop")
+            raise ConnectionError("The GoPro did not answer")
+        stop_recording()
+    session.stop_recording = flaky_stop
+    scheduler = RecordingScheduler(session, duty_cycle(0.1, 1.0, 1),
+                                   sleep_between=False)
+    scheduler.RETRY_DELAY = 0.05
+    scheduler.start()
+    scheduler.join(5)
+    assert not scheduler.is_running()
+    assert scheduler.windows_recorded == 1
+    assert len(scheduler.errors) == 2
+    assert not session.recording
+
+
+def test_the_battery_is_given_with_the_state_after_a_stop(connect_simulator):
+    session = connect_simulator()
+    changes = []
+    scheduler = RecordingScheduler(
+        session, duty_cycle(0.1, 0.3, 2), sleep_between=False,
+        on_change=lambda state, battery: changes.append((state, battery)))
+    scheduler.start()
+    scheduler.join(5)
+    assert not scheduler.is_running()
+    assert scheduler.windows_recorded == 2
+    after_stops = [battery for (before, _), (state, battery)
+                   in zip(changes, changes[1:]) if before == "recording"]
+    assert len(after_stops) == 2
+    assert all(0 < battery <= 1 for battery in after_stops)
+    assert all(battery is None for state, battery in changes
+               if state == "recording")
@@ -0,0 +1,45 @@
+import os
+import re
+import threading
+import time
+
+from sampling_profiler import SamplingProfiler, profiler_from_environment
+
+
+def _spin_for_the_profiler(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_a_busy_thread_is_written_as_collapsed_stacks(tmp_path):
+    profiler = SamplingProfiler("abc123", interval=0.005,
+                                directory=str(tmp_path / "profiles"))
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin_for_the_profiler, args=(stop,),
+                              name="busy-worker")
+    profiler.start()
+    worker.start()
+    time.sleep(0.3)
+    stop.set()
+    worker.join()
+    path = profiler.stop()
+    assert not profiler.is_running()
+    assert profiler.samples > 0
+    assert os.path.basename(path).startswith("profile_abc123_")
+    assert path.endswith(".folded")
+
+    with open(path, "r") as profile_file:
+        lines = profile_file.read().splitlines()
+    stack_line = re.compile(r"^[^;]+(;[^;]+ \([^;()]+\))+ \d+$")
+    assert lines and all(stack_line.match(line) for line in lines)
+    busy = [line for line in lines if line.startswith("busy-worker;")]
+    assert busy
+    assert any("_spin_for_the_profiler (test_sampling_profiler.py)" in line
+               for line in busy)
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in busy) <=\
+        profiler.samples
+
+
+def test_profiling_is_off_without_the_environment_variable(monkeypatch):
+    monkeypatch.delenv(SamplingProfiler.ENVIRONMENT_VARIABLE, raising=False)
+    assert profiler_from_environment("abc123") is None
@@ -0,0 +1,67 @@
+import argparse
+import queue
+import time
+
+import pytest
+
+from control_server import CommandQueue
+from session_commands import BackgroundJobs, run_command
+
+
+def _timelapse(action: str, **options) -> argparse.Namespace:
+    return argparse.Namespace(command="timelapse", action=action,
+                              **options)
+
+
+def test_a_job_does_not_hold_up_the_queue(connect_simulator):
+    session = connect_simulator()
+    jobs = BackgroundJobs(session)
+    command_queue = CommandQueue(session.command_metrics)
+    try:
+        sent = time.perf_counter()
+        started = jobs.run(_timelapse("start", interval=0.05, count=None,
+                                      group="", keep_on_card=True))
+        assert started["ok"] and started["running"]
+        _, status = command_queue.submit_command(
+            session, argparse.Namespace(command="status"))
+        assert status.result(timeout=5)["ok"]
+        assert time.perf_counter() - sent < 1
+        time.sleep(0.2)
+
+        stopped = jobs.run(_timelapse("stop"))
+        assert stopped["action"] == "stop"
+        assert stopped["frames_taken"] > 0
+        assert not jobs.run(_timelapse("stop"))["ok"]
+    finally:
+        jobs.close()
+        command_queue.close()
+
+
+def test_a_job_that_ends_by_itself_sends_its_result(connect_simulator):
+    session = connect_simulator()
+    events = queue.Queue()
+    jobs = BackgroundJobs(session, events.put)
+    try:
+        jobs.run(_timelapse("start", interval=0.01, count=2, group="",
+                            keep_on_card=True))
+        while (event := events.get(timeout=5))["event"] != "job_done":
+            pass
+        assert event["command"] == "timelapse"
+        assert event["frames_taken"] + event["frames_skipped"] == 2
+    finally:
+        jobs.close()
+
+
+def test_only_one_job_of_a_kind_runs(connect_simulator):
+    jobs = BackgroundJobs(connect_simulator())
+    try:
+        options = dict(interval=1.0, count=None, group="", keep_on_card=True)
+        assert jobs.run(_timelapse("start", **options))["ok"]
+        assert not jobs.run(_timelapse("start", **options))["ok"]
+    finally:
+        jobs.close()
+
+
+def test_run_command_refuses_a_job(connect_simulator):
+    with pytest.raises(ValueError):
+        run_command(connect_simulator(), _timelapse("stop"))
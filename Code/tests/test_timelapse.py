@@ -0,0 +1,89 @@
+import os
+import time
+
+import pytest
+
+from camera_session import CameraSession
+from gopro_simulator import FakeCameraServer, SimulatedGoPro
+from offload import CameraEndpoint
+from timelapse import TimeLapse
+
+
+def _run(session: CameraSession, **options) -> TimeLapse:
+    timelapse = TimeLapse(session, **options)
+    timelapse.start()
+    timelapse.join(10)
+    assert not timelapse.is_running()
+    return timelapse
+
+
+def test_a_slow_gopro_skips_frames_instead_of_falling_behind(
+        connect_simulator):
+    session = connect_simulator(ble_latency=0.15)
+    started = time.perf_counter()
+    timelapse = _run(session, interval=0.05, count=10)
+    elapsed = time.perf_counter() - started
+    assert timelapse.frames_skipped > 0
+    assert timelapse.frames_taken + timelapse.frames_skipped == 10
+    # Frames are sent on time or skipped, never queued up to be sent late
+    assert timelapse.max_jitter < 0.05
+    assert elapsed < 10 * 0.05 + 1.0
+
+
+def test_only_the_runs_frames_are_deleted_after_each_save(
+        connect_simulator, monkeypatch):
+    # New files go in 101GOPRO and 102GOPRO, so the deletes need the folder
+    monkeypatch.setattr(SimulatedGoPro, "FILES_PER_FOLDER", 2)
+    session = connect_simulator(media_count=3)
+    gopro = session.gopro.gopro
+    videos = [file["n"] for file in gopro.media]
+    local_directory, _ = session.save_directory("Time-Lapse")
+    timelapse = _run(session, interval=0.1, count=8,
+                     local_directory=local_directory, offload_every=1)
+    assert timelapse.errors == []
+    assert timelapse.frames_taken > 0
+    assert timelapse.frames_saved == timelapse.frames_taken
+    assert [file["n"] for file in gopro.media] == videos
+    saved = os.listdir(local_directory)
+    assert len([name for name in saved if name.endswith(".JPG")]) ==\
+        timelapse.frames_taken
+    deletes = {row["command"]: row
+               for row in session.command_metrics.snapshot()}
+    assert deletes["http_command.delete_file"]["count"] ==\
+        timelapse.frames_taken
+
+
+def test_the_frames_are_kept_on_the_card_if_asked(connect_simulator):
+    session = connect_simulator()
+    local_directory, _ = session.save_directory("Time-Lapse")
+    timelapse = _run(session, interval=0.1, count=3,
+                     local_directory=local_directory, offload_every=1,
+                     free_card=False)
+    assert timelapse.frames_saved == timelapse.frames_taken
+    assert len(session.gopro.gopro.media) == timelapse.frames_taken
+
+
+@pytest.fixture
+def fleet(connect_simulator):
+    session = connect_simulator(CameraSession.ALL_GOPROS, media_count=1)
+    servers = {}
+    for number, name in enumerate(CameraSession.FLEET):
+        servers[name] = FakeCameraServer(session.gopro.cameras[name].gopro)
+        session.offload_endpoints[name] = CameraEndpoint(
+            f"FAKE{number}", servers[name].url)
+    yield session
+    for server in servers.values():
+        server.close()
+
+
+def test_the_frames_of_every_fleet_gopro_are_saved_and_deleted(fleet):
+    local_directory, _ = fleet.save_directory("Time-Lapse")
+    timelapse = _run(fleet, interval=0.1, count=6,
+                     local_directory=local_directory, offload_every=1)
+    assert timelapse.errors == []
+    assert timelapse.frames_taken > 0
+    assert timelapse.frames_saved ==\
+        len(CameraSession.FLEET) * timelapse.frames_taken
+    for name in CameraSession.FLEET:
+        media = fleet.gopro.cameras[name].gopro.media
+        assert [file["n"][-4:] for file in media] == [".MP4"]
@@ -0,0 +1,357 @@
+import concurrent.futures
+import datetime as dt
+import itertools
+import threading
+import time
+
+from instrumentation import append_csv_row
+
+
+class TimeLapse:
+    '''
+    Takes photos at a fixed interval and saves them while the run continues
+
+    Every frame is timed from one perf_counter start time, so a late frame
+    never shifts the frames after it, and the thread sleeps until just
+    before each frame and then checks the clock in a loop so the interval
+    stays within a few milliseconds. Photos go through the photo pipeline,
+    which stays in photo mode for the whole run. If the GoPro is still busy
+    or the last frame has not finished when a frame is due, the frame is
+    skipped and logged instead of being queued behind it. Every few frames
+    the new photos are saved on another thread, and can be deleted from the
+    GoPro once saved so the SD card does not fill up during long runs. Only
+    the files that were not on the SD card when the run started are counted
+    as frames and deleted, so the videos already on it are left alone.
+
+    Attributes
+    ----------
+    SPIN: float
+        The seconds before a frame that the thread stops sleeping and checks
+        the clock in a loop
+    session: CameraSession
+        The connected session the photos are taken on
+    interval: float
+        The seconds between frames
+    count: int or None
+        The number of frames, or None to run until stopped
+    local_directory: str or None
+        The folder frames are saved into, or None to leave them on the GoPro
+    timestamp: str
+        The timestamp added to the front of the saved file names
+    offload_every: int
+        The number of frames taken between saves
+    free_card: bool
+        If frames are deleted from the GoPro once they are saved, from every
+        GoPro in a fleet
+    on_frame: Callable[[dict], None] or None
+        Called with the result of every frame, on the photo pipeline thread
+        for taken frames and on the time-lapse thread for skipped frames
+    on_finish: Callable[[], None] or None
+        Called on the time-lapse thread once the run ends and is saved
+    on_error: Callable[[str], None] or None
+        Called with every error as soon as it happens, on the thread that
+        hit it, so a GoPro whose card is not being freed is noticed
+    log_path: str
+        The CSV file every frame is added to
+    frames_taken: int
+        The number of photos taken so far
+    frames_skipped: int
+        The number of frames skipped because the GoPro was busy
+    frames_saved: int
+        The number of the run's photos saved so far
+    max_jitter: float
+        The most seconds a frame was sent after it was due
+    errors: List[str]
+        The frames and saves that failed
+
+    Methods
+    -------
+    __init__(session, interval, count, local_directory, timestamp,
+             offload_every, free_card, on_frame, on_finish, on_error,
+             log_path)
+        Sets up the time-lapse without starting it
+    start()
+        Starts taking frames on a background thread
+    stop()
+        Stops taking frames
+    join(timeout)
+        Waits for the time-lapse to finish
+    is_running()
+        Check if the time-lapse is still running
+
+    See Also
+    --------
+    PhotoPipeline
+    '''
+    SPIN = 0.002
+
+    def __init__(self, session, interval: float, count: int | None = None,
+                 local_directory: str | None = None, timestamp: str = "",
+                 offload_every: int = 50, free_card: bool = True,
+                 on_frame=None, on_finish=None, on_error=None,
+                 log_path: str = "../Metrics/timelapse.csv") -> None:
+        '''
+        Sets up the time-lapse without starting it
+
+        Parameters
+        ----------
+        session: CameraSession
+            The connected session the photos are taken on
+        interval: float
+            The seconds between frames
+        count: int, optional
+            The number of frames. Runs until stopped if not given.
+        local_directory: str, optional
+            The folder frames are saved into. If not given, the frames are
+            left on the GoPro.
+        timestamp: str, default=""
+            The timestamp added to the front of the saved file names
+        offload_every: int, default=50
+            The number of frames taken between saves
+        free_card: bool, default=True
+            If frames are deleted from the GoPro once they are saved
+        on_frame: Callable[[dict], None], optional
+            Called with the result of every frame
+        on_finish: Callable[[], None], optional
+            Called once the run ends and is saved
+        on_error: Callable[[str], None], optional
+            Called with every error as soon as it happens
+        log_path: str, default="../Metrics/timelapse.csv"
+            The CSV file every frame is added to
+
+        Raises
+        ------
+        ValueError
+            If the interval is not positive
+        '''
+        if interval <= 0:
+            raise ValueError("The interval must be more than 0 seconds")
+        self.session = session
+        self.interval = interval
+        self.count = count
+        self.local_directory = local_directory
+        self.timestamp = timestamp
+        self.offload_every = offload_every
+        self.free_card = free_card
+        self.on_frame = on_frame
+        self.on_finish = on_finish
+        self.on_error = on_error
+        self.log_path = log_path
+        self.frames_taken = 0
+        self.frames_skipped = 0
+        self.frames_saved = 0
+        self.max_jitter = 0.0
+        self.errors = []
+        self._stopped = threading.Event()
+        self._thread = None
+        self._log_lock = threading.Lock()
+        self._offload_thread = None
+        self._started = dt.datetime.now()
+        self._card_before = None
+        self._frames_saved = set()
+
+    def start(self) -> None:
+        '''
+        Starts taking frames on a background thread
+
+        The first frame is taken straight away.
+        '''
+        if self.is_running():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="timelapse")
+        self._thread.start()
+
+    def stop(self) -> None:
+        '''
+        Stops taking frames
+
+        The frames already taken are still saved.
+        '''
+        self._stopped.set()
+
+    def join(self, timeout: float | None = None) -> None:
+        '''
+        Waits for the time-lapse to finish
+
+        Parameters
+        ----------
+        timeout: float, optional
+            The most seconds to wait
+        '''
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_running(self) -> bool:
+        '''
+        Check if the time-lapse is still running
+
+        Returns
+        -------
+        bool
+            True if the time-lapse thread is running
+        '''
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        '''
+        Takes every frame on time until the run ends or is stopped
+        '''
+        pipeline = self.session.photo_pipeline
+        pipeline.hold_photo_mode(True)
+        frames = itertools.count() if self.count is None else\
+            range(self.count)
+        last_frame = None
+        taken_at_offload = 0
+        self._started = dt.datetime.now()
+        if self.local_directory is not None:
+            try:
+                self._card_before = self.session.card_files()
+            except Exception as error:
+                self._error("offload: the files on the SD card could not be "
+                            f"listed, so no frames are counted or deleted, "
+                            f"{error}")
+        origin = time.perf_counter()
+        try:
+            for frame in frames:
+                due = origin + frame * self.interval
+                if not self._wait_until(due):
+                    break
+                sent = time.perf_counter()
+                jitter = sent - due
+                if last_frame is not None and not last_frame.done():
+                    self._frame_done(frame, due, jitter, None,
+                                     "skipped", "the last frame is not done")
+                    continue
+                self.max_jitter = max(self.max_jitter, jitter)
+                last_frame = pipeline.request(wait_for_ready=False)[0]
+                last_frame.add_done_callback(
+                    lambda future, frame=frame, due=due, jitter=jitter:
+                        self._photo_done(frame, due, jitter, future))
+                if self.local_directory is not None and\
+                        self.frames_taken - taken_at_offload >=\
+                        self.offload_every:
+                    taken_at_offload = self.frames_taken
+                    self._start_offload()
+        finally:
+            if last_frame is not None:
+                concurrent.futures.wait([last_frame])
+            pipeline.hold_photo_mode(False)
+            if self._offload_thread is not None:
+                self._offload_thread.join()
+            if self.local_directory is not None:
+                self._offload()
+            if self.on_finish is not None:
+                self.on_finish()
+
+    def _photo_done(self, frame: int, due: float, jitter: float,
+                    future) -> None:
+        '''
+        Counts and logs a frame once the photo pipeline finished it
+        '''
+        try:
+            latency = future.result()
+        except TimeoutError:
+            self._frame_done(frame, due, jitter, None, "skipped",
+                             "the GoPro was busy")
+        except Exception as error:
+            self._error(f"frame {frame}: {error}")
+            self._frame_done(frame, due, jitter, None, "failed", str(error))
+        else:
+            self.frames_taken += 1
+            self._frame_done(frame, due, jitter, latency, "taken")
+
+    def _frame_done(self, frame: int, due: float, jitter: float,
+                    latency: float | None, status: str,
+                    reason: str = "") -> None:
+        '''
+        Adds a frame to the CSV file and tells the listener
+        '''
+        if status == "skipped":
+            self.frames_skipped += 1
+        result = {"frame": frame, "status": status,
+                  "jitter_ms": jitter * 1000, "latency_ms": latency,
+                  "reason": reason}
+        with self._log_lock:
+            append_csv_row(
+                self.log_path, ["run", "frame", "due", "status", "jitter_ms",
+                                "latency_ms", "reason"],
+                [self._started.isoformat(), frame,
+                 (self._started + dt.timedelta(
+                     seconds=frame * self.interval)).isoformat(),
+                 status, f"{jitter * 1000:.3f}",
+                 "" if latency is None else f"{latency:.1f}", reason])
+        if self.on_frame is not None:
+            self.on_frame(result)
+
+    def _start_offload(self) -> None:
+        '''
+        Saves the new frames on another thread unless a save is running
+        '''
+        if self._offload_thread is not None and\
+                self._offload_thread.is_alive():
+            return
+        self._offload_thread = threading.Thread(
+            target=self._offload, daemon=True, name="timelapse-offload")
+        self._offload_thread.start()
+
+    def _offload(self) -> None:
+        '''
+        Saves the new frames and deletes them from the GoPro if asked
+        '''
+        session = self.session
+        try:
+            if session.is_fleet():
+                for error in session.offload_fleet(self.local_directory,
+                                                   self.timestamp):
+                    self._error(f"offload: {error}")
+            else:
+                session.offload_files(self.local_directory, self.timestamp)
+            if self._card_before is None:
+                return
+            # Only the files the run added to the card are its frames
+            frames = session.card_files() - self._card_before
+        except Exception as error:
+            self._error(f"offload: {error}")
+            return
+        saved = {frame for frame in frames if session.is_saved(*frame)}
+        self.frames_saved += len(saved - self._frames_saved)
+        self._frames_saved |= saved
+        if not self.free_card:
+            return
+        names = {}
+        for serial, name in saved:
+            names.setdefault(serial, []).append(name)
+        for serial, files in names.items():
+            try:
+                session.delete_files(sorted(files), serial)
+            except Exception as error:
+                # The card keeps filling up, so the operator has to know now
+                self._error(f"delete: the SD card is not being freed, "
+                            f"{error}")
+
+    def _error(self, message: str) -> None:
+        '''
+        Keeps an error and tells the listener
+        '''
+        self.errors.append(message)
+        if self.on_error is not None:
+            self.on_error(message)
+
+    def _wait_until(self, deadline: float) -> bool:
+        '''
+        Sleeps until just before a perf_counter time, then checks the clock
+        in a loop until it is reached
+
+        Returns
+        -------
+        bool
+            False if the time-lapse was stopped while waiting
+        '''
+        remaining = deadline - time.perf_counter() - self.SPIN
+        if remaining > 0 and self._stopped.wait(remaining):
+            return False
+        while time.perf_counter() < deadline:
+            pass
+        return not self._stopped.is_set()
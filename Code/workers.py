@@ -0,0 +1,77 @@
+import queue
+
+
+class TkDispatcher:
+    '''
+    Runs functions from background threads on the Tk thread
+
+    Tk widgets can only be changed safely from the thread running the main
+    loop. Background threads hand functions to the dispatcher, which runs them
+    the next time the main loop checks its queue.
+
+    Attributes
+    ----------
+    POLL_MS: int
+        The milliseconds between checks of the queue
+    root: CTk
+        The app whose main loop runs the functions
+    monitor: LoopMonitor or None
+        Times every function run so slow ones can be found
+
+    Methods
+    -------
+    __init__(root, monitor)
+        Starts checking the queue from the main loop
+    call(function, *args, **kwargs)
+        Runs a function on the Tk thread
+    '''
+    POLL_MS = 50
+
+    def __init__(self, root, monitor=None) -> None:
+        '''
+        Starts checking the queue from the main loop
+
+        Parameters
+        ----------
+        root: CTk
+            The app whose main loop runs the functions
+        monitor: LoopMonitor, optional
+            Times every function run so slow ones can be found
+        '''
+        self.root = root
+        self.monitor = monitor
+        self._queue = queue.SimpleQueue()
+        self.root.after(self.POLL_MS, self._drain)
+
+    def call(self, function, *args, **kwargs) -> None:
+        '''
+        Runs a function on the Tk thread
+
+        Can be called from any thread.
+
+        Parameters
+        ----------
+        function: Callable
+            The function to run
+        *args
+            The arguments to run the function with
+        **kwargs
+            The keyword arguments to run the function with
+        '''
+        self._queue.put((function, args, kwargs))
+
+    def _drain(self) -> None:
+        '''
+        Runs every queued function and checks again later
+        '''
+        try:
+            while True:
+                function, args, kwargs = self._queue.get_nowait()
+                if self.monitor is None:
+                    function(*args, **kwargs)
+                else:
+                    self.monitor.call(function, *args, **kwargs)
+        except queue.Empty:
+            pass
+        finally:
+            self.root.after(self.POLL_MS, self._drain)